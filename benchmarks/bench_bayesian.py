@@ -0,0 +1,67 @@
+# Compares the row by row DataFrame.apply Bayesian average with the vectorized MathUtils implementation
+# Run from the root directory: python benchmarks/bench_bayesian.py
+import os
+import sys
+import time
+import argparse
+
+import numpy as np
+import pandas as pd
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "src"))
+
+from utils.MathUtils import MathUtils  # noqa: E402
+
+
+def apply_bayesian_average(frame):
+    system_ratings_avg = frame["RatingsRatio"].mean()
+    system_num_ratings_avg = frame["TotalRatings"].mean()
+
+    def calculate(row):
+        n = row["TotalRatings"]
+        return ((n / (n + system_num_ratings_avg)) * row["RatingsRatio"]) + (
+            (system_num_ratings_avg / (n + system_num_ratings_avg)) * system_ratings_avg)
+
+    frame['BayesianAverage'] = list(frame.apply(calculate, axis = 1))
+    return frame
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--rows", type = int, default = 1000000)
+    parser.add_argument("--chunk-size", type = int, default = 100000)
+    args = parser.parse_args()
+
+    rng = np.random.default_rng(0)
+    frame = pd.DataFrame({
+        "Name": [f"Game {i}" for i in range(args.rows)],
+        "TotalRatings": rng.integers(0, 100000, size = args.rows),
+        "RatingsRatio": rng.uniform(0, 100, size = args.rows),
+        "HoursOnRecord": rng.integers(0, 1000, size = args.rows)
+    })
+
+    start = time.perf_counter()
+    expected = apply_bayesian_average(frame.copy())
+    apply_time = time.perf_counter() - start
+
+    start = time.perf_counter()
+    result = MathUtils.add_bayesian_average_to_gamespy_dataframe(frame.copy())
+    vectorized_time = time.perf_counter() - start
+
+    chunks = [frame.iloc[i:i + args.chunk_size] for i in range(0, args.rows, args.chunk_size)]
+    start = time.perf_counter()
+    prior_mean, prior_weight = MathUtils.calculate_system_priors(chunks)
+    for chunk in MathUtils.add_bayesian_average_to_chunks((c.copy() for c in chunks), prior_mean, prior_weight):
+        pass
+    chunked_time = time.perf_counter() - start
+
+    assert np.array_equal(expected["BayesianAverage"].to_numpy(), result["BayesianAverage"].to_numpy())
+
+    print(f"{args.rows} rows")
+    print(f"DataFrame.apply: {apply_time:8.3f} s")
+    print(f"Vectorized:      {vectorized_time:8.3f} s ({apply_time / vectorized_time:.0f}x)")
+    print(f"Chunked ({args.chunk_size}): {chunked_time:8.3f} s")
+
+
+if __name__ == "__main__":
+    main()
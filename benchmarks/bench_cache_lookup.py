@@ -0,0 +1,98 @@
+# Compares the old per-row Name scan of the SteamSpy cache with the AppId index lookup
+# Run from the root directory: python benchmarks/bench_cache_lookup.py
+import os
+import sys
+import time
+import argparse
+import tempfile
+
+import numpy as np
+import pandas as pd
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "src"))
+
+from steam.SteamSpyQuery import SteamSpyQuery  # noqa: E402
+from steam.SteamSpyCache import SqliteSteamSpyCache  # noqa: E402
+
+
+def make_cache(size, rng):
+    appids = rng.choice(np.arange(10, size * 20, 10), size = size, replace = False)
+    positive = rng.integers(0, 100000, size = size)
+    negative = rng.integers(0, 10000, size = size)
+    total = positive + negative
+    cache = pd.DataFrame({
+        'AppId': appids,
+        'Name': [f"Game {appid}" for appid in appids],
+        'Positive': positive,
+        'Negative': negative,
+        'TotalRatings': total,
+        'RatingsRatio': np.where(total > 0, positive / np.maximum(total, 1) * 100, 0),
+        'UserScore': 0,
+        'AvgForever': rng.integers(0, 1000, size = size),
+        'Avg2Weeks': 0,
+        'MedForever': rng.integers(0, 1000, size = size),
+        'Med2Weeks': 0
+    })
+    return cache.set_index("AppId")
+
+
+def make_library(cache, size, rng):
+    appids = rng.choice(cache.index.to_numpy(), size = size, replace = False)
+    return pd.DataFrame({
+        'AppId': appids,
+        'Name': [f"Game {appid}" for appid in appids],
+        'HoursOnRecord': rng.integers(0, 500, size = size)
+    }).set_index("AppId")
+
+
+def name_scan(cache, library):
+    missing = []
+    for index, row in library.iterrows():
+        if cache.loc[cache['Name'] == row['Name']].empty:
+            missing.append(index)
+    return missing
+
+
+def index_difference(cache, library):
+    return library.index.difference(cache.index, sort = False)
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--cache-size", type = int, default = 50000)
+    parser.add_argument("--library-size", type = int, default = 10000)
+    parser.add_argument("--scan-sample", type = int, default = 500,
+                        help = "Number of games to time the old scan on, the result is extrapolated")
+    args = parser.parse_args()
+
+    rng = np.random.default_rng(0)
+    cache = make_cache(args.cache_size, rng)
+    library = make_library(cache, args.library_size, rng)
+
+    sample = library.iloc[:args.scan_sample]
+    start = time.perf_counter()
+    name_scan(cache, sample)
+    scan_time = (time.perf_counter() - start) * len(library) / len(sample)
+
+    start = time.perf_counter()
+    missing = index_difference(cache, library)
+    index_time = time.perf_counter() - start
+    assert len(missing) == 0
+
+    # Full cache-only pass through SteamSpyQuery, no request goes to the network
+    with tempfile.TemporaryDirectory() as directory:
+        backend = SqliteSteamSpyCache(f"{directory}/steam_spy_cache.sqlite")
+        backend.upsert(cache.reset_index().itertuples(index = False, name = None))
+        start = time.perf_counter()
+        SteamSpyQuery(directory, cache = backend).get_data_for_games(library.copy())
+        query_time = time.perf_counter() - start
+        backend.close()
+
+    print(f"cache={args.cache_size} library={args.library_size}")
+    print(f"Name scan (extrapolated): {scan_time:10.3f} s")
+    print(f"Index difference:         {index_time:10.3f} s ({scan_time / index_time:.0f}x)")
+    print(f"get_data_for_games:       {query_time:10.3f} s (includes the cache load)")
+
+
+if __name__ == "__main__":
+    main()
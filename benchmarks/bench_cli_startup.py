@@ -0,0 +1,73 @@
+# Measures the cold start of every main.py command and which heavy modules it loads, against the cost of importing
+# everything up front like main.py used to. Nothing touches the network: the library XML and the SteamSpy cache of a
+# synthetic library are prepared first so fetch finds everything cached.
+# Run from the root directory: python benchmarks/bench_cli_startup.py
+import os
+import re
+import sys
+import time
+import argparse
+import tempfile
+import subprocess
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, os.path.join(ROOT, "src"))
+sys.path.insert(0, os.path.join(ROOT, "tests"))
+
+from steam_stub_server import make_games_xml  # noqa: E402
+from bench_pipeline import cache_record  # noqa: E402
+
+MAIN = os.path.join(ROOT, "src", "main.py")
+HEAVY_MODULES = ["requests", "numpy", "pandas", "pyarrow", "bokeh"]
+# rank and render are forced so every repeat does the work, run comes last and finds nothing left to do
+COMMANDS = [["fetch"], ["rank", "--force"], ["render", "--force"], ["report"], ["run"]]
+
+
+def prepare(directory, games):
+    from steam.SteamSpyCache import SqliteSteamSpyCache
+
+    # main.py keeps its data in <cwd>\\data
+    data_directory = f"{directory}\\data"
+    os.makedirs(data_directory, exist_ok = True)
+    with open(f"{data_directory}\\steam_id.dat", "w", encoding = "utf-8") as id_file:
+        id_file.write("someone")
+    with open(f"{data_directory}\\someone_steam_games.xml", "w", encoding = "utf-8") as xml_file:
+        xml_file.write(make_games_xml(games))
+    cache = SqliteSteamSpyCache(f"{data_directory}/steam_spy_cache.sqlite")
+    cache.upsert([cache_record(appid) for appid in range(10, (games + 1) * 10, 10)])
+    cache.close()
+
+
+# Returns the wall time of a fresh interpreter running arguments and the heavy modules it imported
+def run(arguments, directory):
+    start = time.perf_counter()
+    result = subprocess.run([sys.executable, "-X", "importtime"] + arguments, cwd = directory,
+                            check = True, capture_output = True, text = True)
+    seconds = time.perf_counter() - start
+    imported = set(re.findall(r"\|\s+(\w+)$", result.stderr, flags = re.MULTILINE))
+    return seconds, [module for module in HEAVY_MODULES if module in imported]
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--games", type = int, default = 1000)
+    parser.add_argument("--repeat", type = int, default = 3)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as parent:
+        directory = os.path.join(parent, "work")
+        os.makedirs(directory)
+        prepare(directory, args.games)
+
+        runs = [("import pandas, bokeh, requests", ["-c", "import pandas, bokeh.plotting, requests"])]
+        runs += [(" ".join(["main.py"] + command), [MAIN] + command) for command in COMMANDS]
+
+        print(f"{'command':32} {'seconds':>8}  heavy modules imported")
+        for name, arguments in runs:
+            results = [run(arguments, directory) for _ in range(args.repeat)]
+            seconds = min(seconds for seconds, _ in results)
+            print(f"{name:32} {seconds:8.3f}  {', '.join(results[-1][1]) or '-'}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,75 @@
+# Compares save/load times and file sizes of the CSV, Parquet and Arrow IPC storage formats
+# Run from the root directory: python benchmarks/bench_frame_storage.py (Parquet and Arrow require pyarrow)
+import os
+import sys
+import time
+import argparse
+import tempfile
+
+import numpy as np
+import pandas as pd
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "src"))
+
+from utils.FrameStorage import FrameStorage  # noqa: E402
+
+
+# Same columns as decorated_game_infos
+def make_decorated_game_infos(rows, rng):
+    appids = np.arange(10, (rows + 1) * 10, 10)
+    positive = rng.integers(0, 100000, size = rows)
+    negative = rng.integers(0, 10000, size = rows)
+    total = positive + negative
+    return pd.DataFrame({
+        'AppId': appids,
+        'LogoLink': [f"https://cdn.cloudflare.steamstatic.com/steam/apps/{appid}/capsule_184x69.jpg" for appid in appids],
+        'StoreLink': [f"https://steamcommunity.com/app/{appid}" for appid in appids],
+        'HoursLast2Weeks': rng.integers(0, 20, size = rows),
+        'HoursOnRecord': rng.integers(0, 2000, size = rows),
+        'StatsLink': [f"https://steamcommunity.com/id/someone/stats/{appid}" for appid in appids],
+        'GlobalStatsLink': [f"https://steamcommunity.com/stats/{appid}/achievements/" for appid in appids],
+        'Name': [f"Synthetic Game {appid}" for appid in appids],
+        'Positive': positive,
+        'Negative': negative,
+        'TotalRatings': total,
+        'RatingsRatio': np.where(total > 0, positive / np.maximum(total, 1) * 100, 0),
+        'UserScore': 0,
+        'AvgForever': rng.integers(0, 1000, size = rows),
+        'Avg2Weeks': 0,
+        'MedForever': rng.integers(0, 1000, size = rows),
+        'Med2Weeks': 0,
+        'BayesianAverage': rng.uniform(0, 100, size = rows)
+    }).set_index("AppId")
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--rows", type = int, default = 100000)
+    args = parser.parse_args()
+
+    frame = make_decorated_game_infos(args.rows, np.random.default_rng(0))
+    formats = ["csv"] + (["parquet", "arrow"] if FrameStorage.columnar_available() else [])
+
+    print(f"{args.rows} rows")
+    with tempfile.TemporaryDirectory() as directory:
+        for format in formats:
+            filename = FrameStorage.filename(os.path.join(directory, "decorated_game_infos"), format)
+
+            start = time.perf_counter()
+            FrameStorage.save(frame, filename)
+            save_time = time.perf_counter() - start
+
+            start = time.perf_counter()
+            FrameStorage.load(filename)
+            load_time = time.perf_counter() - start
+
+            start = time.perf_counter()
+            FrameStorage.load(filename, columns = ["HoursOnRecord", "BayesianAverage"])
+            projected_time = time.perf_counter() - start
+
+            print(f"{format:8} save {save_time:6.3f} s  load {load_time:6.3f} s  "
+                  f"load 2 columns {projected_time:6.3f} s  size {os.path.getsize(filename) / (1024 * 1024):6.1f} MB")
+
+
+if __name__ == "__main__":
+    main()
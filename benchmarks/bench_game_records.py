@@ -0,0 +1,85 @@
+# Compares the memory used by the game infos and SteamSpy data of a library before and after the compact layout
+# (int32 counts, float32 ratios, interned names, links derived from the AppId instead of stored).
+# Run from the root directory: python benchmarks/bench_game_records.py
+import os
+import sys
+import argparse
+import tempfile
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "src"))
+
+import numpy as np  # noqa: E402
+
+from bench_xml_parse import write_games_xml  # noqa: E402
+from steam.SteamXmlProcessor import SteamXmlProcessor  # noqa: E402
+from steam.SteamSpyCache import records_to_cache_frame  # noqa: E402
+
+# Layout of the frames before the compact layout
+LEGACY_GAME_DTYPES = {
+    'Name': "object",
+    'LogoLink': "object",
+    'StoreLink': "object",
+    'HoursLast2Weeks': "int64",
+    'HoursOnRecord': "int64",
+    'StatsLink': "object",
+    'GlobalStatsLink': "object"
+}
+
+LEGACY_CACHE_DTYPES = {
+    'Positive': "int64",
+    'Negative': "int64",
+    'TotalRatings': "int64",
+    'RatingsRatio': "float64",
+    'UserScore': "int64",
+    'AvgForever': "int64",
+    'Avg2Weeks': "int64",
+    'MedForever': "int64",
+    'Med2Weeks': "int64"
+}
+
+
+def megabytes(frame):
+    return (frame.memory_usage(index = True, deep = True).sum()) / (1024 * 1024)
+
+
+def steam_spy_records(appids):
+    rng = np.random.default_rng(0)
+    positive = rng.integers(0, 100000, size = len(appids))
+    negative = rng.integers(0, 10000, size = len(appids))
+    return [(int(appid), f"Synthetic Game {appid}", int(p), int(n), int(p + n), p / max(p + n, 1) * 100, 0, 10, 1, 5, 0)
+            for appid, p, n in zip(appids, positive, negative)]
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--games", type = int, default = 100000)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as directory:
+        filename = os.path.join(directory, "games.xml")
+        write_games_xml(filename, args.games)
+        processor = SteamXmlProcessor.from_file(filename, streaming = True)
+        game_infos = processor.get_game_infos()
+
+    legacy_game_infos = SteamXmlProcessor.add_links(game_infos, processor.steam_id)
+    legacy_game_infos = legacy_game_infos[list(LEGACY_GAME_DTYPES)].astype(LEGACY_GAME_DTYPES)
+    legacy_game_infos.index = legacy_game_infos.index.astype("int64")
+
+    steam_spy_data = records_to_cache_frame(steam_spy_records(game_infos.index))
+    legacy_steam_spy_data = steam_spy_data.astype(LEGACY_CACHE_DTYPES)
+    legacy_steam_spy_data.index = legacy_steam_spy_data.index.astype("int64")
+
+    decorated = game_infos.drop("Name", axis = 1).join(steam_spy_data)
+    legacy_decorated = legacy_game_infos.drop("Name", axis = 1).join(legacy_steam_spy_data)
+
+    scale = 100000 / args.games
+    print(f"{args.games} games, MB per 100k games")
+    print(f"{'frame':16} {'before':>8} {'after':>8}")
+    for name, before, after in [("game infos", legacy_game_infos, game_infos),
+                                ("SteamSpy data", legacy_steam_spy_data, steam_spy_data),
+                                ("decorated", legacy_decorated, decorated)]:
+        print(f"{name:16} {megabytes(before) * scale:8.1f} {megabytes(after) * scale:8.1f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,152 @@
+# Measures the throughput of every stage of the pipeline on synthetic libraries, entirely offline: the Steam Community
+# XML and SteamSpy are served by the local stub server of the tests, with configurable latency and rate limits.
+# Run from the root directory: python benchmarks/bench_pipeline.py
+# Save the results with --json and compare later runs against them with --baseline to catch regressions, the script
+# exits with 1 when a stage got slower than the baseline by more than --tolerance.
+import os
+import sys
+import json
+import time
+import argparse
+import tempfile
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "src"))
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "tests"))
+
+from steam_stub_server import SteamStubServer, make_app_details, make_games_xml  # noqa: E402
+from main import add_rankings  # noqa: E402
+from simplehttp.SimpleHttpClient import SimpleHttpClient  # noqa: E402
+from steam.SteamXmlProcessor import SteamXmlProcessor  # noqa: E402
+from steam.SteamSpyQuery import SteamSpyQuery  # noqa: E402
+from steam.SteamSpyCache import SqliteSteamSpyCache  # noqa: E402
+from graphing.SteamDataBokehGraphGenerator import SteamDataBokehGraphGenerator  # noqa: E402
+from utils.Instrumentation import Instrumentation  # noqa: E402
+
+SIZES = [1000, 10000, 100000]
+
+
+def cache_record(appid):
+    details = make_app_details(appid)
+    total = details["positive"] + details["negative"]
+    return (appid, details["name"], details["positive"], details["negative"], total,
+            details["positive"] / total * 100, details["userscore"], details["average_forever"],
+            details["average_2weeks"], details["median_forever"], details["median_2weeks"])
+
+
+# Runs the pipeline once for a library of games games, only fetch of them miss the SteamSpy cache.
+# Returns stage -> (seconds, items processed).
+def run_size(games, fetch, stub, args, directory):
+    username = f"user{games}"
+    instrumentation = Instrumentation()
+    http_client = SimpleHttpClient(pool_size = args.max_in_flight)
+    results = {}
+
+    def timed(stage, items, function):
+        start = time.perf_counter()
+        with instrumentation.stage(stage):
+            value = function()
+        results[stage] = (time.perf_counter() - start, items)
+        return value
+
+    xml_file = os.path.join(directory, f"{username}_steam_games.xml")
+    timed("xml_fetch", games, lambda: SteamXmlProcessor.from_username(
+        username, xml_file, http_client, streaming = True, community_url = stub.url))
+    # Downloading again an unchanged library only costs a 304
+    timed("xml_refresh", games, lambda: SteamXmlProcessor.from_username(
+        username, xml_file, http_client, streaming = True, community_url = stub.url))
+    game_infos = timed("xml_parse", games,
+                       lambda: SteamXmlProcessor.from_file(xml_file, streaming = True).get_game_infos())
+
+    # Everything but the last fetch games is already cached
+    cache = SqliteSteamSpyCache(os.path.join(directory, f"{username}_cache.sqlite"))
+    cache.upsert([cache_record(int(appid)) for appid in game_infos.index[:games - fetch]])
+    steam_spy_query = SteamSpyQuery(directory, requests_per_second = args.requests_per_second,
+                                    burst = args.max_in_flight, max_in_flight = args.max_in_flight,
+                                    api_url = stub.api_url, cache = cache, http_client = http_client)
+    steam_spy_data = timed("steam_spy", games, lambda: steam_spy_query.get_data_for_games(game_infos[["Name"]]))
+    results["steam_spy_fetch"] = (instrumentation.stages["steam_spy"]["seconds"] -
+                                  steam_spy_query.stats["cache_read_seconds"], steam_spy_query.stats["fetched"])
+
+    decorated = add_rankings(game_infos, steam_spy_data, instrumentation)
+    for stage in ["join", "bayesian", "sort"]:
+        results[stage] = (instrumentation.stages[stage]["seconds"], games)
+
+    generator = SteamDataBokehGraphGenerator(decorated, directory)
+    for chart_method, seconds in generator.render_all().items():
+        results[f"chart:{chart_method}"] = (seconds, games)
+
+    results["end_to_end"] = (sum(seconds for stage, (seconds, _) in results.items()
+                                 if stage not in ("steam_spy_fetch", "xml_refresh")), games)
+    return results
+
+
+def compare(results, baseline, tolerance):
+    regressions = []
+    for size, stages in results.items():
+        for stage, result in stages.items():
+            previous = baseline.get(size, {}).get(stage)
+            if previous is None or result["per_second"] == 0:
+                continue
+            if result["per_second"] < previous["per_second"] * (1 - tolerance):
+                regressions.append(f"{size} games, {stage}: {result['per_second']:.0f}/s "
+                                   f"vs {previous['per_second']:.0f}/s")
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--sizes", type = int, nargs = "+", default = SIZES,
+                        help = "Library sizes to run, 1k, 10k and 100k games by default")
+    parser.add_argument("--fetch", type = int, default = 500,
+                        help = "Games per library missing from the SteamSpy cache, fetched from the stub")
+    parser.add_argument("--latency", type = float, default = 0.0,
+                        help = "Seconds the stub server waits before every response")
+    parser.add_argument("--quota", type = int,
+                        help = "Requests per second the stub server allows before answering 429")
+    parser.add_argument("--requests-per-second", type = float, default = 1000.0,
+                        help = "Rate limit of the SteamSpy client")
+    parser.add_argument("--max-in-flight", type = int, default = 8)
+    parser.add_argument("--repeat", type = int, default = 3,
+                        help = "Runs per library size, the fastest time of each stage is kept")
+    parser.add_argument("--json", help = "Write the results to this file")
+    parser.add_argument("--baseline", help = "Results of an earlier run (see --json) to compare against")
+    parser.add_argument("--tolerance", type = float, default = 0.2,
+                        help = "Slowdown allowed compared to the baseline before a stage counts as a regression")
+    args = parser.parse_args()
+
+    libraries = {f"user{games}": make_games_xml(games) for games in args.sizes}
+    results: dict = {}
+    with SteamStubServer(libraries = libraries, latency = args.latency, quota_requests = args.quota) as stub:
+        for games in args.sizes:
+            # Best of several runs so short stages aren't flagged because of noise
+            stages: dict = {}
+            for _ in range(args.repeat):
+                with tempfile.TemporaryDirectory() as directory:
+                    for stage, (seconds, items) in run_size(games, min(args.fetch, games), stub, args, directory).items():
+                        if stage not in stages or seconds < stages[stage][0]:
+                            stages[stage] = (seconds, items)
+
+            print(f"\n{games} games")
+            print(f"{'stage':58} {'seconds':>9} {'items/s':>12}")
+            results[str(games)] = {}
+            for stage, (seconds, items) in stages.items():
+                per_second = items / seconds if seconds > 0 else 0.0
+                results[str(games)][stage] = {"seconds": seconds, "items": items, "per_second": per_second}
+                print(f"{stage:58} {seconds:9.3f} {per_second:12.0f}")
+
+    if args.json:
+        with open(args.json, "w", encoding = "utf-8") as json_file:
+            json.dump(results, json_file, indent = 2)
+
+    if args.baseline:
+        with open(args.baseline, "r", encoding = "utf-8") as baseline_file:
+            regressions = compare(results, json.load(baseline_file), args.tolerance)
+        for regression in regressions:
+            print(f"REGRESSION {regression}")
+        if regressions:
+            sys.exit(1)
+        print("\nNo regressions")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,55 @@
+# Compares full sorts with the partial selection and precomputed orders of RankingIndex for the top 50 queries the
+# charts make. Run from the root directory: python benchmarks/bench_ranking.py
+import os
+import sys
+import timeit
+import argparse
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "src"))
+
+import numpy as np  # noqa: E402
+import pandas as pd  # noqa: E402
+
+from utils.RankingIndex import RankingIndex  # noqa: E402
+
+
+def make_frame(games):
+    rng = np.random.default_rng(0)
+    hours = rng.integers(0, 300, size = games).astype(np.int32)
+    hours[::3] = 0
+    return pd.DataFrame({
+        "HoursOnRecord": hours,
+        "RatingsRatio": rng.uniform(0, 100, size = games).astype(np.float32),
+        "BayesianAverage": rng.uniform(0, 100, size = games)
+    })
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--games", type = int, nargs = "+", default = [10000, 100000, 1000000])
+    parser.add_argument("--top", type = int, default = 50)
+    parser.add_argument("--repeat", type = int, default = 20)
+    args = parser.parse_args()
+
+    for games in args.games:
+        frame = make_frame(games)
+        unplayed = frame["HoursOnRecord"].to_numpy() == 0
+        ratings = frame["BayesianAverage"].to_numpy()
+        mask = unplayed & (ratings != 0) & (ratings != 100)
+        index = RankingIndex(frame)
+        precomputed = RankingIndex(frame, precompute = True)
+
+        candidates = {
+            "sort_values + head": lambda: frame[mask].sort_values("BayesianAverage", ascending = False).head(args.top),
+            "nlargest": lambda: frame["BayesianAverage"][mask].nlargest(args.top),
+            "top_k partial selection": lambda: index.top_k("BayesianAverage", args.top, mask),
+            "top_k precomputed order": lambda: precomputed.top_k("BayesianAverage", args.top, mask)
+        }
+        print(f"\n{games} games, top {args.top} unplayed by BayesianAverage")
+        for name, query in candidates.items():
+            seconds = min(timeit.repeat(query, number = 1, repeat = args.repeat))
+            print(f"{name:26} {seconds * 1000:9.3f} ms")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,105 @@
+# Load test of the ranking server on a synthetic library: client threads keep one connection each and send a mix of
+# top, unplayed-best and app queries for a while, then the throughput and latency percentiles are printed along with
+# the time the same lookups take in process, without HTTP.
+# Run from the root directory: python benchmarks/bench_ranking_server.py
+import os
+import sys
+import time
+import random
+import timeit
+import argparse
+import threading
+import http.client
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, os.path.join(ROOT, "src"))
+sys.path.insert(0, os.path.join(ROOT, "tests"))
+
+import numpy as np  # noqa: E402
+
+from server.RankingServer import RankingServer  # noqa: E402
+from test_graph_generator import make_decorated_game_infos  # noqa: E402
+
+
+def make_paths(appids, count, seed):
+    rng = random.Random(seed)
+    paths = []
+    for _ in range(count):
+        kind = rng.random()
+        if kind < 0.4:
+            metric = rng.choice(["BayesianAverage", "RatingsRatio", "HoursOnRecord"])
+            query_filter = rng.choice(["all", "played", "unplayed", "recent"])
+            paths.append(f"/top?metric={metric}&k={rng.choice([10, 50])}&filter={query_filter}")
+        elif kind < 0.6:
+            paths.append(f"/unplayed-best?k={rng.choice([10, 50])}")
+        else:
+            paths.append(f"/app/{rng.choice(appids)}")
+    return paths
+
+
+# Sends paths over one keep-alive connection until deadline, appending the latency of every request to latencies
+def client(host, port, paths, deadline, latencies):
+    connection = http.client.HTTPConnection(host, port)
+    i = 0
+    while time.perf_counter() < deadline:
+        start = time.perf_counter()
+        connection.request("GET", paths[i % len(paths)])
+        response = connection.getresponse()
+        response.read()
+        latencies.append(time.perf_counter() - start)
+        i += 1
+    connection.close()
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--games", type = int, default = 20000)
+    parser.add_argument("--clients", type = int, nargs = "+", default = [1, 4, 16])
+    parser.add_argument("--duration", type = float, default = 3.0)
+    parser.add_argument("--paths", type = int, default = 2000,
+                        help = "Number of distinct queries the clients cycle through")
+    args = parser.parse_args()
+
+    games = make_decorated_game_infos(args.games)
+    appids = [int(appid) for appid in games.index]
+
+    start = time.perf_counter()
+    server = RankingServer(lambda: games, port = 0).start()
+    print(f"{args.games} games loaded in {time.perf_counter() - start:.3f} s")
+
+    # The lookups behind the responses, without HTTP nor the response cache
+    dataset = server.dataset
+    lookups = {
+        "top 50 all": lambda: dataset.top("BayesianAverage", 50),
+        "top 50 unplayed": lambda: dataset.top("BayesianAverage", 50, "unplayed"),
+        "unplayed-best 50": lambda: dataset.unplayed_best("BayesianAverage", 50),
+        "app": lambda: dataset.app(appids[len(appids) // 2])
+    }
+    print(f"\n{'in process lookup':20} {'ms':>8}")
+    for name, lookup in lookups.items():
+        print(f"{name:20} {min(timeit.repeat(lookup, number = 1, repeat = 50)) * 1000:8.3f}")
+
+    host, port = server._server.server_address[:2]
+    print(f"\n{'clients':>7} {'requests':>9} {'req/s':>9} {'p50 ms':>8} {'p99 ms':>8}")
+    for clients in args.clients:
+        deadline = time.perf_counter() + args.duration
+        results = [[] for _ in range(clients)]
+        threads = [threading.Thread(target = client,
+                                    args = (host, port, make_paths(appids, args.paths, i), deadline, results[i]))
+                   for i in range(clients)]
+        start = time.perf_counter()
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        seconds = time.perf_counter() - start
+
+        latencies = np.concatenate([np.array(result) for result in results]) * 1000
+        print(f"{clients:7} {len(latencies):9} {len(latencies) / seconds:9.0f} "
+              f"{np.percentile(latencies, 50):8.3f} {np.percentile(latencies, 99):8.3f}")
+
+    server.shutdown()
+
+
+if __name__ == "__main__":
+    main()
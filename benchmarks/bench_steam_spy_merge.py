@@ -0,0 +1,102 @@
+# Compares how get_data_for_games merged SteamSpy data into the library, a list of tuples turned into a frame, cast,
+# concatenated with the cache and joined, with the typed column buffers it fills as records arrive now. Records
+# "arrive" from a list prepared up front, the time and peak memory of everything after are measured.
+# Run from the root directory: python benchmarks/bench_steam_spy_merge.py
+import os
+import sys
+import time
+import argparse
+import tracemalloc
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "src"))
+
+import pandas as pd  # noqa: E402
+
+from bench_game_records import steam_spy_records  # noqa: E402
+from steam.SteamSpyCache import records_to_cache_frame  # noqa: E402
+from steam.SteamSpyRecordBuffer import SteamSpyRecordBuffer  # noqa: E402
+
+
+# Each way is split in what happens as the records arrive, overlapped with the network in a real crawl, and the merge
+# done once the last one arrived
+
+def legacy_ingest(arriving):
+    new_cache_data = []
+    for record in arriving:
+        new_cache_data.append(record)
+    return new_cache_data
+
+
+def legacy_merge(game_infos, cache, new_cache_data):
+    new_cache = records_to_cache_frame(new_cache_data)
+    final_cache = pd.concat([cache, new_cache])
+    # The old code dropped Name from the caller's frame in place, a copy stands in for it here
+    game_infos = game_infos.copy()
+    game_infos.drop("Name", axis = 1, inplace = True)
+    return game_infos.join(final_cache, on = "AppId", how = "left")
+
+
+def buffered_ingest(arriving):
+    buffer = SteamSpyRecordBuffer(len(arriving))
+    for record in arriving:
+        buffer.append(record)
+    return buffer
+
+
+def buffered_merge(game_infos, cache, buffer):
+    columns = {column: game_infos[column].to_numpy() for column in game_infos.columns if column != "Name"}
+    columns.update(buffer.align(game_infos.index, cache))
+    return pd.DataFrame(columns, index = game_infos.index)
+
+
+# Returns the best seconds of ingest and of merge, the peak memory of both and the merged frame
+def measure(ingest, merge, game_infos, cache, arriving, repeat):
+    ingest_seconds = []
+    merge_seconds = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        ingested = ingest(arriving)
+        ingest_seconds.append(time.perf_counter() - start)
+        start = time.perf_counter()
+        merge(game_infos, cache, ingested)
+        merge_seconds.append(time.perf_counter() - start)
+
+    tracemalloc.start()
+    result = merge(game_infos, cache, ingest(arriving))
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return min(ingest_seconds), min(merge_seconds), peak / (1024 * 1024), result
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--games", type = int, default = 100000)
+    parser.add_argument("--fetched", type = float, default = 0.5,
+                        help = "Share of the games fetched rather than found in the cache")
+    parser.add_argument("--repeat", type = int, default = 5)
+    args = parser.parse_args()
+
+    appids = list(range(10, (args.games + 1) * 10, 10))
+    game_infos = pd.DataFrame({
+        "AppId": appids,
+        "Name": [f"Synthetic Game {appid}" for appid in appids],
+        "HoursOnRecord": [appid % 997 for appid in appids]
+    }).set_index("AppId")
+    records = steam_spy_records(appids)
+    cached_count = int(args.games * (1 - args.fetched))
+    cache = records_to_cache_frame(records[:cached_count])
+    arriving = records[cached_count:]
+
+    print(f"{args.games} games, {len(arriving)} fetched")
+    print(f"{'way':20} {'ingest s':>9} {'merge s':>9} {'peak MB':>9}")
+    results = []
+    for name, ingest, merge in [("list + concat + join", legacy_ingest, legacy_merge),
+                                ("column buffers", buffered_ingest, buffered_merge)]:
+        ingest_seconds, merge_seconds, peak, result = measure(ingest, merge, game_infos, cache, arriving, args.repeat)
+        results.append(result)
+        print(f"{name:20} {ingest_seconds:9.3f} {merge_seconds:9.3f} {peak:9.1f}")
+    pd.testing.assert_frame_equal(results[0], results[1])
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,75 @@
+# Compares peak memory and wall time of the in-memory and streaming Steam games XML parsers
+# Run from the root directory: python benchmarks/bench_xml_parse.py
+# Each parser runs in its own process so peak RSS measurements don't interfere (RSS is measured with the resource
+# module which is not available on Windows).
+import os
+import sys
+import json
+import time
+import argparse
+import resource
+import tempfile
+import subprocess
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "src"))
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "tests"))
+
+from steam_stub_server import iter_games_xml  # noqa: E402
+
+
+def write_games_xml(filename, games):
+    with open(filename, "w", encoding = "utf-8") as xml_file:
+        xml_file.writelines(iter_games_xml(games))
+
+
+def peak_rss_mb():
+    # ru_maxrss is in kilobytes on Linux and bytes on macOS
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return peak / (1024 * 1024) if sys.platform == "darwin" else peak / 1024
+
+
+def run_mode(mode, filename):
+    from steam.SteamXmlProcessor import SteamXmlProcessor
+
+    baseline = peak_rss_mb()
+    start = time.perf_counter()
+    rows = 0
+    if mode == "legacy":
+        rows = len(SteamXmlProcessor.from_file(filename).get_game_infos())
+    elif mode == "streaming":
+        rows = len(SteamXmlProcessor.from_file(filename, streaming = True).get_game_infos())
+    elif mode == "batches":
+        for batch in SteamXmlProcessor.from_file(filename, streaming = True).iter_game_batches():
+            rows += len(batch["AppId"])
+    elapsed = time.perf_counter() - start
+
+    print(json.dumps({"mode": mode, "rows": rows, "seconds": elapsed,
+                      "peak_rss_mb": peak_rss_mb(), "baseline_rss_mb": baseline}))
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--games", type = int, default = 100000)
+    parser.add_argument("--mode", choices = ["legacy", "streaming", "batches"])
+    parser.add_argument("--file")
+    args = parser.parse_args()
+
+    if args.mode:
+        run_mode(args.mode, args.file)
+        return
+
+    with tempfile.TemporaryDirectory() as directory:
+        filename = os.path.join(directory, "games.xml")
+        write_games_xml(filename, args.games)
+        print(f"{args.games} games, {os.path.getsize(filename) / (1024 * 1024):.1f} MB of XML")
+
+        for mode in ["legacy", "streaming", "batches"]:
+            output = subprocess.run([sys.executable, __file__, "--mode", mode, "--file", filename],
+                                    check = True, capture_output = True, text = True).stdout
+            result = json.loads(output)
+            print(f"{mode:10} {result['seconds']:7.2f} s  peak RSS {result['peak_rss_mb']:7.1f} MB "
+                  f"(+{result['peak_rss_mb'] - result['baseline_rss_mb']:.1f} MB over imports)")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,18 @@
+# The charts SteamDataBokehGraphGenerator renders, kept apart so they can be listed without importing bokeh
+
+# Bump when the chart code changes so existing charts get rendered again
+CHART_VERSION = 2
+
+# Generator method -> (output file, columns of the decorated game infos the chart reads)
+CHARTS = {
+    "generate_most_played_games_graph":
+        ("MostPlayed.html", ["Name", "HoursOnRecord", "BayesianAverage"]),
+    "generate_most_played_games_2weeks_graph":
+        ("MostPlayedLast2Weeks.html", ["Name", "HoursLast2Weeks"]),
+    "generate_most_played_games_versus_rating_graph":
+        ("MostPlayedVsRating.html", ["Name", "HoursOnRecord", "BayesianAverage"]),
+    "generate_best_unplayed_games_average":
+        ("UnplayedPlainRating.html", ["Name", "HoursOnRecord", "RatingsRatio"]),
+    "generate_best_unplayed_games_bayesian_average":
+        ("UnplayedBayesian.html", ["Name", "HoursOnRecord", "BayesianAverage"])
+}
@@ -0,0 +1,56 @@
+# Renders the charts of one or more decorated libraries in a pool of processes
+import os
+import time
+import logging
+import tempfile
+from typing import Any
+from concurrent.futures import ProcessPoolExecutor
+
+from graphing.ChartCatalog import CHARTS
+from utils.NpyColumnStore import NpyColumnStore
+
+# Frames already mapped by this worker process, keyed by store directory
+_frames: dict[str, Any] = {}
+
+
+def _render_chart(store_directory, output_directory, chart_method):
+    # Imported here so the parent process doesn't need bokeh to submit jobs
+    from graphing.SteamDataBokehGraphGenerator import SteamDataBokehGraphGenerator
+
+    if store_directory not in _frames:
+        _frames[store_directory] = NpyColumnStore.load(store_directory)
+
+    # Every chart is saved to its own file and bokeh document, nothing is shared between jobs
+    start = time.perf_counter()
+    generator = SteamDataBokehGraphGenerator(_frames[store_directory], output_directory)
+    getattr(generator, chart_method)()
+    return output_directory, chart_method, time.perf_counter() - start
+
+
+class ParallelChartRenderer:
+
+    # max_workers defaults to the number of CPUs
+    def __init__(self, max_workers = None):
+        self.max_workers = max_workers
+
+    # libraries maps each output directory to the decorated game infos to chart into it.
+    # Each frame is written once to a memory-mapped column store that the workers read, then every chart of every
+    # library is a separate job. chart_methods optionally maps output directories to the charts to render.
+    # Returns the seconds each chart took in a dict of output directory -> chart method -> seconds.
+    def render(self, libraries, chart_methods = None):
+        timings: dict[str, dict[str, float]] = {output_directory: {} for output_directory in libraries}
+        with tempfile.TemporaryDirectory() as work_directory:
+            jobs = []
+            for position, (output_directory, decorated_game_infos) in enumerate(libraries.items()):
+                store_directory = os.path.join(work_directory, str(position))
+                NpyColumnStore.save(decorated_game_infos, store_directory)
+                methods = CHARTS if chart_methods is None else chart_methods[output_directory]
+                jobs += [(store_directory, output_directory, method) for method in methods]
+
+            with ProcessPoolExecutor(max_workers = self.max_workers) as executor:
+                futures = [executor.submit(_render_chart, *job) for job in jobs]
+                for future in futures:
+                    output_directory, chart_method, seconds = future.result()
+                    timings[output_directory][chart_method] = seconds
+                    logging.debug(f"Rendered {chart_method} into {output_directory}")
+        return timings
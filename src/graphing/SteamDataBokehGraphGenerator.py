@@ -1,36 +1,100 @@
+import time
 import logging
-import pandas as pd
+import numpy as np
 
-from bokeh.plotting import figure, save, output_file
-from bokeh.models import ColumnDataSource, HoverTool, LabelSet
+from bokeh.plotting import figure, save
+from bokeh.models import ColumnDataSource, HoverTool, LabelSet, LogColorMapper
 from bokeh.palettes import Turbo256 as palette
+from bokeh.resources import CDN
 from bokeh.transform import linear_cmap
 from bokeh.util import logconfig
 
+from graphing.ChartCatalog import CHARTS
+from utils.RankingIndex import RankingIndex
+
+TOP_N = 50
+
+# Above this many games, the most played vs rating chart draws the density of the games as an image instead of one
+# glyph per game, so the HTML stays small and the browser responsive
+DENSITY_THRESHOLD = 5000
+# Bins of the density image on each axis
+DENSITY_BINS = 200
+# Games played for more than LABEL_MIN_HOURS are named on the most played vs rating chart, the MAX_LABELS most played
+LABEL_MIN_HOURS = 75
+MAX_LABELS = 200
+
 
 class SteamDataBokehGraphGenerator:
 
-    def __init__(self, decorated_game_infos, output_directory = "."):
+    # ranking_index can be shared with other users of the same decorated_game_infos, one is built otherwise
+    # density_threshold is the number of games from which the most played vs rating chart is binned, see DENSITY_THRESHOLD
+    def __init__(self, decorated_game_infos, output_directory = ".", ranking_index = None,
+                 density_threshold = DENSITY_THRESHOLD):
         self.decorated_game_infos = decorated_game_infos
         self.output_directory = output_directory
+        self.density_threshold = density_threshold
+        self._views = None
+        self._ranking_index = ranking_index
 
         # Make bokeh log to file
         logconfig.basicConfig(level = logging.DEBUG, filename = "output.log")
 
+    @property
+    def ranking_index(self):
+        if self._ranking_index is None:
+            self._ranking_index = RankingIndex(self.decorated_game_infos)
+        return self._ranking_index
+
+    # Row masks shared by the charts, computed once from the columns without copying the frame
+    @property
+    def views(self):
+        if self._views is None:
+            hours = self.decorated_game_infos["HoursOnRecord"].to_numpy()
+            recent_hours = self.decorated_game_infos["HoursLast2Weeks"].to_numpy()
+            self._views = {
+                "played": hours != 0,
+                "recent": recent_hours != 0,
+                "unplayed": hours == 0
+            }
+        return self._views
+
+    def __column(self, name, positions = None):
+        values = self.decorated_game_infos[name].to_numpy()
+        return values if positions is None else values[positions]
+
+    # Positions of the n largest values of colName among mask, in ascending order for horizontal bar charts
+    def __top_n_ascending(self, colName, mask, n = TOP_N):
+        return self.ranking_index.top_k(colName, n, mask)[::-1]
+
+    # Only the columns a chart uses go into its data source
+    def __data_source(self, positions, columns):
+        return ColumnDataSource(data = {
+            column: self.__column(column, positions) for column in columns
+        })
+
+    def __save(self, p, filename, title):
+        save(p, filename = f"{self.output_directory}/{filename}",
+             resources = CDN, title = title)
+
+    # Render every chart in one go, or only chart_methods (see ChartCatalog.CHARTS).
+    # Returns the seconds each chart took.
+    def render_all(self, chart_methods = None):
+        timings = {}
+        for method in CHARTS if chart_methods is None else chart_methods:
+            start = time.perf_counter()
+            getattr(self, method)()
+            timings[method] = time.perf_counter() - start
+        return timings
+
     def generate_most_played_games_graph(self):
         # Plot most played games (ignore non played games)
         colName = "HoursOnRecord"
-        output_file(f"{self.output_directory}/MostPlayed.html")
 
-        most_played_games = pd.DataFrame.copy(self.decorated_game_infos)
-        most_played_games.drop(
-            most_played_games[most_played_games[colName] == 0].index,
-            inplace = True)
-
-        # Take just top 30
-        most_played_games = most_played_games.nlargest(50, colName)
-        most_played_games = most_played_games.sort_values(by = [colName],
-                                                          ascending = True)
+        # Take just top 50
+        positions = self.__top_n_ascending(colName, self.views["played"])
+        if len(positions) == 0:
+            logging.warning("No played games, skipping most played graph")
+            return
 
         tooltips = [('Game', '@Name'), ('Hours Played', '@HoursOnRecord'),
                     ('Rating', '@BayesianAverage')]
@@ -39,23 +103,23 @@ class SteamDataBokehGraphGenerator:
             'box_select', 'lasso_select', 'poly_select', 'tap', 'reset'
         ]
 
+        values = self.__column(colName, positions)
         color_mapper = linear_cmap(field_name = colName,
                                    palette = palette,
-                                   low = min(most_played_games[colName]),
-                                   high = max(most_played_games[colName]))
+                                   low = values.min(),
+                                   high = values.max())
 
         # Weird issue here where the text in LabelSet must be a string or it won't work, so decorate the data with strings
-        most_played_games[f"{colName}Text"] = most_played_games[colName].apply(
-            lambda x: str(x))
-        data_source = ColumnDataSource(most_played_games)
+        data_source = self.__data_source(positions, ["Name", colName, "BayesianAverage"])
+        data_source.data[f"{colName}Text"] = values.astype(str)
 
         p = figure(
-            y_range = most_played_games["Name"],
+            y_range = list(data_source.data["Name"]),
             width = 2000,
             height = 1250,
             title = "Most Played Games of All Time",
             tools = select_tools,
-            x_range = (0, max(most_played_games[colName] + 20)),
+            x_range = (0, values.max() + 20),
         )
 
         p.title.text_font_size = '32pt'
@@ -81,27 +145,25 @@ class SteamDataBokehGraphGenerator:
                           source = data_source)
 
         p.add_layout(labels)
-        save(p)
+        self.__save(p, CHARTS["generate_most_played_games_graph"][0], "Most Played Games of All Time")
 
     def generate_most_played_games_2weeks_graph(self):
         # Plot most played games in last 2 weeks
         colName = "HoursLast2Weeks"
-        output_file(f"{self.output_directory}/MostPlayedLast2Weeks.html")
 
-        most_played_games_2w = pd.DataFrame.copy(self.decorated_game_infos)
-        most_played_games_2w.drop(
-            most_played_games_2w[most_played_games_2w[colName] == 0].index,
-            inplace = True)
-        most_played_games_2w = most_played_games_2w.sort_values(
-            by = [colName], ascending = False)
+        # Every game gets a category on the axis, so only the top 50 are shown
+        positions = self.ranking_index.top_k(colName, TOP_N, self.views["recent"])
+        if len(positions) == 0:
+            logging.warning("No games played in the last 2 weeks, skipping graph")
+            return
+        values = self.__column(colName, positions)
 
         # Weird issue here where the text in LabelSet must be a string or it won't work, so decorate the data with strings
-        most_played_games_2w[f"{colName}Text"] = most_played_games_2w[
-            colName].apply(lambda x: "{:.2f}".format(x))
-        data_source = ColumnDataSource(most_played_games_2w)
+        data_source = self.__data_source(positions, ["Name", colName])
+        data_source.data[f"{colName}Text"] = np.char.mod("%.2f", values.astype(np.float64))
 
-        p = figure(x_range = most_played_games_2w["Name"],
-                   y_range = (0, max(most_played_games_2w[colName] + 20)),
+        p = figure(x_range = list(data_source.data["Name"]),
+                   y_range = (0, values.max() + 20),
                    width = 2000,
                    title = "Most Played Games in Last 2 Weeks")
 
@@ -122,31 +184,29 @@ class SteamDataBokehGraphGenerator:
                           source = data_source)
 
         p.add_layout(labels)
-        save(p)
+        self.__save(p, CHARTS["generate_most_played_games_2weeks_graph"][0], "Most Played Games in Last 2 Weeks")
 
     def generate_most_played_games_versus_rating_graph(self):
         # Plot most played games versus their rating
         colName = "HoursOnRecord"
-        output_file(f"{self.output_directory}/MostPlayedVsRating.html")
-
-        most_played_games = pd.DataFrame.copy(self.decorated_game_infos)
-        most_played_games = most_played_games.sort_values(by = [colName],
-                                                          ascending = False)
+        values = self.__column(colName)
+        if len(values) == 0:
+            logging.warning("No games, skipping most played vs rating graph")
+            return
 
         tooltips = [('Game', '@Name'), ('Hours Played', '@HoursOnRecord'),
                     ('Rating', '@BayesianAverage')]
 
         color_mapper = linear_cmap(field_name = colName,
                                    palette = palette,
-                                   low = min(most_played_games[colName]),
-                                   high = max(most_played_games[colName]))
+                                   low = values.min(),
+                                   high = values.max())
 
         select_tools = ['tap', 'reset', 'box_zoom']
 
-        # For the most played and highest rated games, add names as labels.
-        most_played_games["DisplayName"] = most_played_games.apply(
-            axis = 1, func = lambda x: x["Name"] if x[colName] > 75 else "")
-        data_source = ColumnDataSource(most_played_games)
+        # For the most played and highest rated games, add names as labels, from their own small data source
+        labeled = self.ranking_index.top_k(colName, MAX_LABELS, values > LABEL_MIN_HOURS)
+        label_source = self.__data_source(labeled, ["Name", colName, "BayesianAverage"])
 
         labels = LabelSet(x = colName,
                           y = "BayesianAverage",
@@ -154,73 +214,91 @@ class SteamDataBokehGraphGenerator:
                           text_color = 'black',
                           x_offset = 10,
                           y_offset = -5,
-                          text = "DisplayName",
-                          source = data_source,
+                          text = "Name",
+                          source = label_source,
                           text_font_size = "8pt")
 
+        # WebGL draws the glyphs on the GPU, the canvas backend slows down with thousands of them
         p = figure(height = 1000,
                    width = 2000,
                    title = "Most played vs ranking",
                    tools = select_tools,
-                   x_range = (0, max(most_played_games[colName]) + 50))
-
-        p.circle(x = colName,
-                 y = "BayesianAverage",
-                 color = color_mapper,
-                 source = data_source,
-                 size = 10)
+                   x_range = (0, values.max() + 50),
+                   output_backend = "webgl")
+
+        if len(values) > self.density_threshold:
+            # Only the named games are drawn one by one, on top of the density of all of them
+            self.__add_density_image(p, colName, "BayesianAverage", (0, values.max() + 50))
+            data_source = label_source
+        else:
+            data_source = self.__data_source(None, ["Name", colName, "BayesianAverage"])
+
+        scatter = p.circle(x = colName,
+                           y = "BayesianAverage",
+                           color = color_mapper,
+                           source = data_source,
+                           size = 10)
 
         p.xaxis[0].axis_label = 'Hours Played'
         p.yaxis[
             0].axis_label = 'Positive vs Negative Rating % Adjusted Using a Bayesian average'
 
-        p.add_tools(HoverTool(tooltips = tooltips))
+        p.add_tools(HoverTool(tooltips = tooltips, renderers = [scatter]))
         p.add_layout(labels)
-        save(p)
-
-    def generate_best_unplayed_games_average(self):
-        # Plot best ranked unplayed games
-        colName = "RatingsRatio"
-        output_file(f"{self.output_directory}/UnplayedPlainRating.html")
-
-        tooltips = [('Game', '@Name'), ('Rating', '@RatingsRatio')]
+        self.__save(p, CHARTS["generate_most_played_games_versus_rating_graph"][0], "Most played vs ranking")
+
+    # Draws the number of games in each of DENSITY_BINS x DENSITY_BINS bins of x_column and y_column as an image,
+    # on a log scale so a few games stand out next to thousands. The HTML holds the bins, not the games.
+    def __add_density_image(self, p, x_column, y_column, x_range):
+        x = self.__column(x_column).astype(np.float64)
+        y = self.__column(y_column).astype(np.float64)
+        valid = ~np.isnan(x) & ~np.isnan(y)
+        if not valid.any():
+            return
+        x, y = x[valid], y[valid]
+        y_range = (y.min(), y.max() if y.max() > y.min() else y.min() + 1)
+
+        counts, _, _ = np.histogram2d(x, y, bins = DENSITY_BINS, range = [x_range, y_range])
+        # Rows of an image go along y, empty bins are left transparent. float32 halves the size of the HTML.
+        density = counts.T.astype(np.float32)
+        density[density == 0] = np.nan
+        mapper = LogColorMapper(palette = palette, low = 1, high = max(2.0, np.nanmax(density)), nan_color = (0, 0, 0, 0))
+
+        image = p.image(image = [density], x = x_range[0], y = y_range[0], dw = x_range[1] - x_range[0],
+                        dh = y_range[1] - y_range[0], color_mapper = mapper)
+        p.add_tools(HoverTool(tooltips = [('Games', '@image')], renderers = [image]))
+
+    # Shared by both best unplayed graphs, only the rating column differs
+    def __generate_best_unplayed_games_graph(self, colName, filename, axis_label):
+        tooltips = [('Game', '@Name'), ('Rating', f'@{colName}')]
 
         select_tools = [
             'box_select', 'lasso_select', 'poly_select', 'tap', 'reset'
         ]
 
-        best_unplayed_games = pd.DataFrame.copy(self.decorated_game_infos)
-        best_unplayed_games.drop(best_unplayed_games[
-            best_unplayed_games["HoursOnRecord"] != 0].index,
-                                 inplace = True)
-
         # Remove DLC and tools (0% and 100% rated)
-        best_unplayed_games.drop(
-            best_unplayed_games[best_unplayed_games[colName] == 0].index,
-            inplace = True)
-        best_unplayed_games.drop(
-            best_unplayed_games[best_unplayed_games[colName] == 100].index,
-            inplace = True)
-
-        # Take just top 30
-        best_unplayed_games = best_unplayed_games.nlargest(50, colName)
-        best_unplayed_games = best_unplayed_games.sort_values(by = [colName],
-                                                              ascending = True)
+        ratings = self.__column(colName)
+        mask = self.views["unplayed"] & (ratings != 0) & (ratings != 100)
+
+        # Take just top 50
+        positions = self.__top_n_ascending(colName, mask)
+        if len(positions) == 0:
+            logging.warning(f"No rated unplayed games, skipping {filename}")
+            return
+        values = self.__column(colName, positions)
 
         color_mapper = linear_cmap(field_name = colName,
                                    palette = palette,
-                                   low = min(best_unplayed_games[colName]),
-                                   high = max(best_unplayed_games[colName]))
+                                   low = values.min(),
+                                   high = values.max())
 
         # Weird issue here where the text in LabelSet must be a string or it won't work, so decorate the data with strings
-        best_unplayed_games[f"{colName}Text"] = best_unplayed_games[
-            colName].apply(lambda x: "{:.2f}".format(x))
+        data_source = self.__data_source(positions, ["Name", colName])
+        data_source.data[f"{colName}Text"] = np.char.mod("%.2f", values.astype(np.float64))
 
-        data_source = ColumnDataSource(best_unplayed_games)
-
-        min_range = int(min(best_unplayed_games[colName]) - 1)
-        max_range = int(max(best_unplayed_games[colName]) + 2)
-        p = figure(y_range = best_unplayed_games["Name"],
+        min_range = int(values.min() - 1)
+        max_range = int(values.max() + 2)
+        p = figure(y_range = list(data_source.data["Name"]),
                    x_range = (min_range, max_range),
                    width = 2000,
                    height = 1250,
@@ -230,7 +308,7 @@ class SteamDataBokehGraphGenerator:
         p.title.text_font_size = '32pt'
         p.yaxis.major_label_text_font_size = "12pt"
         p.xaxis.major_label_text_font_size = "12pt"
-        p.xaxis[0].axis_label = 'Positive vs. Negative Ratings %'
+        p.xaxis[0].axis_label = axis_label
 
         p.hbar(y = "Name",
                left = 0,
@@ -251,80 +329,16 @@ class SteamDataBokehGraphGenerator:
         p.add_layout(labels)
 
         p.add_tools(HoverTool(tooltips = tooltips))
-        save(p)
+        self.__save(p, filename, "Best unplayed games")
 
-    def generate_best_unplayed_games_bayesian_average(self):
+    def generate_best_unplayed_games_average(self):
         # Plot best ranked unplayed games
-        colName = "BayesianAverage"
-        output_file(f"{self.output_directory}/UnplayedBayesian.html")
-
-        tooltips = [('Game', '@Name'), ('Rating', '@BayesianAverage')]
-
-        select_tools = [
-            'box_select', 'lasso_select', 'poly_select', 'tap', 'reset'
-        ]
-
-        best_unplayed_games = pd.DataFrame.copy(self.decorated_game_infos)
-        best_unplayed_games.drop(best_unplayed_games[
-            best_unplayed_games["HoursOnRecord"] != 0].index,
-                                 inplace = True)
-
-        # Remove DLC and tools (0% and 100% rated)
-        best_unplayed_games.drop(
-            best_unplayed_games[best_unplayed_games[colName] == 0].index,
-            inplace = True)
-        best_unplayed_games.drop(
-            best_unplayed_games[best_unplayed_games[colName] == 100].index,
-            inplace = True)
-
-        # Take just top 30
-        best_unplayed_games = best_unplayed_games.nlargest(50, colName)
-        best_unplayed_games = best_unplayed_games.sort_values(by = [colName],
-                                                              ascending = True)
-
-        color_mapper = linear_cmap(field_name = colName,
-                                   palette = palette,
-                                   low = min(best_unplayed_games[colName]),
-                                   high = max(best_unplayed_games[colName]))
-
-        # Weird issue here where the text in LabelSet must be a string or it won't work, so decorate the data with strings
-        best_unplayed_games[f"{colName}Text"] = best_unplayed_games[
-            colName].apply(lambda x: "{:.2f}".format(x))
-
-        data_source = ColumnDataSource(best_unplayed_games)
+        self.__generate_best_unplayed_games_graph(
+            "RatingsRatio", CHARTS["generate_best_unplayed_games_average"][0],
+            'Positive vs. Negative Ratings %')
 
-        min_range = int(min(best_unplayed_games[colName]) - 1)
-        max_range = int(max(best_unplayed_games[colName]) + 2)
-        p = figure(y_range = best_unplayed_games["Name"],
-                   x_range = (min_range, max_range),
-                   width = 2000,
-                   height = 1250,
-                   title = "Best unplayed games",
-                   tools = select_tools)
-
-        p.title.text_font_size = '32pt'
-        p.yaxis.major_label_text_font_size = "12pt"
-        p.xaxis.major_label_text_font_size = "12pt"
-        p.xaxis[
-            0].axis_label = 'Positive vs. Negative Ratings % Adjusted Using a Bayesian Average'
-
-        p.hbar(y = "Name",
-               left = 0,
-               right = colName,
-               height = 0.5,
-               source = data_source,
-               color = color_mapper)
-
-        labels = LabelSet(x = colName,
-                          y = "Name",
-                          level = 'annotation',
-                          text_color = 'black',
-                          x_offset = 5,
-                          y_offset = -6,
-                          text = f"{colName}Text",
-                          source = data_source)
-
-        p.add_layout(labels)
-
-        p.add_tools(HoverTool(tooltips = tooltips))
-        save(p)
+    def generate_best_unplayed_games_bayesian_average(self):
+        # Plot best ranked unplayed games
+        self.__generate_best_unplayed_games_graph(
+            "BayesianAverage", CHARTS["generate_best_unplayed_games_bayesian_average"][0],
+            'Positive vs. Negative Ratings % Adjusted Using a Bayesian Average')
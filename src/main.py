@@ -1,19 +1,31 @@
 import os
+import sys
 import logging
+import argparse
+from concurrent.futures import ThreadPoolExecutor
 
-import pandas as pd
+from graphing.ChartCatalog import CHARTS, CHART_VERSION
+from utils.FrameStorage import FrameStorage, DEFAULT_FORMAT
+from utils.RunManifest import RunManifest
+from utils.Instrumentation import Instrumentation
+from steam.FetchScheduler import FetchScheduler, PRIORITY_COLUMNS
 
-from steam.SteamXmlProcessor import SteamXmlProcessor
-from utils.MathUtils import MathUtils
-from steam.SteamSpyQuery import SteamSpyQuery
-from graphing.SteamDataBokehGraphGenerator import SteamDataBokehGraphGenerator
+# pandas, bokeh and the modules built on them are imported in the functions that need them, so a rerun with nothing
+# to do only reads the manifest, the library XML and the SteamSpy cache
 
+MANIFEST_FILE = "run_manifest.json"
+REPORT_FILE = "run_report.json"
 
-def query_steam_data_for_user(directory = ""):
+# Bump when add_rankings or the decorated outputs change so the next run ranks again
+RANK_VERSION = 2
+
+
+# Path of the library XML of username, downloaded if it isn't there yet or refresh is set.
+# Without download, a missing library is an error instead.
+def library_file_for_user(directory = "", http_client = None, username = '', refresh = False, download = True):
     # Note, your 'Game details' must be set to 'Public' for this to work.
     # This is done in your profile -> Edit Profile -> Privacy Settings -> Game details
     # To find your username, check your profile under General -> Custom URL
-    username = ''
     if username == '':
         if os.path.exists(f"{directory}\\steam_id.dat"):
             logging.info('Reading steam ID from file')
@@ -25,15 +37,181 @@ def query_steam_data_for_user(directory = ""):
             raise Exception("Missing steam id")
 
     cache_file = f"{directory}\\{username}_steam_games.xml"
-    if os.path.exists(cache_file):
-        xmlProcessor = SteamXmlProcessor.from_file(cache_file)
+    if not download:
+        if not os.path.exists(cache_file):
+            logging.critical(f"{cache_file} is missing")
+            raise Exception(f"{cache_file} is missing, run the fetch command first")
+    elif refresh or not os.path.exists(cache_file):
+        from steam.SteamXmlProcessor import SteamXmlProcessor
+        SteamXmlProcessor.from_username(username, cache_file, http_client,
+                                        streaming = True)
+    return cache_file
+
+
+# Returns the game infos of the library and the steamID64 of the profile, needed to build the stats links
+def query_steam_data_for_user(directory = "", http_client = None, username = '', download = True):
+    from steam.SteamXmlProcessor import SteamXmlProcessor
+
+    cache_file = library_file_for_user(directory, http_client, username, download = download)
+    processor = SteamXmlProcessor.from_file(cache_file, streaming = True)
+    game_infos = processor.get_game_infos()
+    return game_infos, processor.steam_id
+
+
+# Fetch and parse the libraries of several users in parallel, returns a dict of username -> (game infos, steam ID).
+# Users whose library can't be read, e.g. private or misspelled profiles, are logged and left out.
+def query_steam_data_for_users(usernames, directory = "", http_client = None, max_workers = 4):
+    with ThreadPoolExecutor(max_workers = max_workers) as executor:
+        futures = {username: executor.submit(query_steam_data_for_user, directory, http_client, username)
+                   for username in usernames}
+
+    libraries = {}
+    for username, future in futures.items():
+        try:
+            libraries[username] = future.result()
+        except Exception as e:
+            logging.error(f"Skipping {username}, the library couldn't be read: {e!r}")
+    return libraries
+
+
+def add_rankings(game_infos, steam_spy_data, instrumentation = None):
+    from utils.MathUtils import MathUtils
+    from utils.RankingIndex import RankingIndex
+
+    instrumentation = instrumentation if instrumentation is not None else Instrumentation()
+
+    # Add the SteamSpy columns to the library, drop Names since they're duplicated otherwise, as well as the library
+    # columns steam_spy_data may have kept (see SteamSpyQuery.get_data_for_games)
+    with instrumentation.stage("join"):
+        decorated_game_infos = game_infos.drop("Name", axis = 1)
+        decorated_game_infos = decorated_game_infos.join(
+            steam_spy_data.drop(columns = decorated_game_infos.columns, errors = "ignore"), how = 'left')
+    with instrumentation.stage("bayesian"):
+        decorated_game_infos = MathUtils.add_bayesian_average_to_gamespy_dataframe(
+            decorated_game_infos)
+
+    with instrumentation.stage("sort"):
+        # Do any filtering or re-arranging you want to here
+        # DLCs have no ratings, drop them from the list
+        decorated_game_infos = decorated_game_infos[decorated_game_infos["RatingsRatio"].to_numpy() != 0]
+
+        # Best rated first, games missing from SteamSpy last
+        ranking_index = RankingIndex(decorated_game_infos, ["BayesianAverage"])
+        decorated_game_infos = decorated_game_infos.take(ranking_index.order("BayesianAverage"))
+    return decorated_game_infos
+
+
+# Files a chart wrote on the last run, none when it was skipped for lack of data
+def chart_outputs(manifest, output_directory, chart_method):
+    entry = manifest.get(chart_method) or {}
+    return [os.path.join(output_directory, entry["output"])] if entry.get("output") else []
+
+
+# True when the chart was rendered by the current chart code and its file is still there
+def chart_is_current(manifest, output_directory, chart_method):
+    entry = manifest.get(chart_method)
+    return (entry is not None and entry.get("version") == CHART_VERSION and
+            all(os.path.exists(output) for output in chart_outputs(manifest, output_directory, chart_method)))
+
+
+# libraries maps each output directory to its decorated game infos, manifests each output directory to its
+# RunManifest. A chart is only rendered again when the columns it reads changed, it's missing or force is set.
+# The time each chart took is added to instrumentation as a chart:<method> stage.
+def render_charts(libraries, manifests, render_workers = None, force = False, instrumentation = None):
+    instrumentation = instrumentation if instrumentation is not None else Instrumentation()
+    stale: dict[str, dict[str, str]] = {}
+    with instrumentation.stage("chart_fingerprints"):
+        for output_directory, decorated_game_infos in libraries.items():
+            manifest = manifests[output_directory]
+            stale[output_directory] = {}
+            for chart_method, (filename, columns) in CHARTS.items():
+                fingerprint = RunManifest.fingerprint(
+                    CHART_VERSION, RunManifest.frame_fingerprint(decorated_game_infos[columns]))
+                outputs = chart_outputs(manifest, output_directory, chart_method)
+                if force or not manifest.is_fresh(chart_method, fingerprint, outputs):
+                    stale[output_directory][chart_method] = fingerprint
+            logging.info(f"{len(stale[output_directory])} of {len(CHARTS)} charts to render in {output_directory}")
+
+    timings: dict[str, dict[str, float]] = {}
+    if any(stale.values()) and render_workers:
+        from graphing.ParallelChartRenderer import ParallelChartRenderer
+        with instrumentation.stage("charts"):
+            timings = ParallelChartRenderer(render_workers).render(libraries, stale)
+    elif any(stale.values()):
+        with instrumentation.stage("charts"):
+            from graphing.SteamDataBokehGraphGenerator import SteamDataBokehGraphGenerator
+            for output_directory, decorated_game_infos in libraries.items():
+                graph_generator = SteamDataBokehGraphGenerator(decorated_game_infos,
+                                                               output_directory)
+                timings[output_directory] = graph_generator.render_all(stale[output_directory])
+
+    for charts in timings.values():
+        for chart_method, seconds in charts.items():
+            instrumentation.add_time(f"chart:{chart_method}", seconds)
+
+    for output_directory, fingerprints in stale.items():
+        for chart_method, fingerprint in fingerprints.items():
+            filename = CHARTS[chart_method][0]
+            rendered = os.path.exists(os.path.join(output_directory, filename))
+            manifests[output_directory].record(chart_method, fingerprint, version = CHART_VERSION,
+                                               output = filename if rendered else None)
+        manifests[output_directory].save()
+
+
+def decorated_file(output_directory, output_format):
+    return FrameStorage.filename(os.path.join(output_directory, "decorated_game_infos"), output_format)
+
+
+# Format the decorated game infos were last written as according to the manifest of their directory, CSV if they
+# never were
+def output_format_of(manifest):
+    entry = manifest.get("outputs")
+    return entry["format"] if entry is not None else DEFAULT_FORMAT
+
+
+# libraries maps each output directory to its decorated game infos, steam_ids each output directory to the steamID64
+# of its profile. The decorated game infos are written as output_format, the format of the last run by default (see
+# output_format_of()), along with the links of the XML, see SteamXmlProcessor.add_links(). export_csv adds a CSV copy.
+# With render_workers, the charts are rendered by that many processes instead of one after another.
+# Charts whose data didn't change since the last run are kept unless force is set, none are rendered without charts.
+def generate_reports(libraries, render_workers = None, output_format = None, export_csv = False,
+                     manifests = None, force = False, instrumentation = None, charts = True, steam_ids = None):
+    from steam.SteamXmlProcessor import SteamXmlProcessor
+
+    instrumentation = instrumentation if instrumentation is not None else Instrumentation()
+    steam_ids = steam_ids or {}
+    if manifests is None:
+        manifests = {output_directory: RunManifest(os.path.join(output_directory, MANIFEST_FILE))
+                     for output_directory in libraries}
+    with instrumentation.stage("save_outputs"):
+        for output_directory, decorated_game_infos in libraries.items():
+            # Remembered so the commands reading the outputs later find them without being told the format again
+            format = output_format or output_format_of(manifests[output_directory])
+            manifests[output_directory].record("outputs", RunManifest.fingerprint(format), format = format)
+
+            # Write to file for easy access, the links are only built here since nothing else reads them
+            with_links = SteamXmlProcessor.add_links(decorated_game_infos, steam_ids.get(output_directory))
+            FrameStorage.save(with_links, decorated_file(output_directory, format))
+            if export_csv and format != "csv":
+                FrameStorage.save(with_links, decorated_file(output_directory, "csv"))
+
+    if charts:
+        render_charts(libraries, manifests, render_workers, force, instrumentation)
     else:
-        xmlProcessor = SteamXmlProcessor.from_username(username, cache_file)
+        for manifest in manifests.values():
+            manifest.save()
+
 
-    return xmlProcessor.get_game_infos()
+# Adds the HTTP and SteamSpy counters to the report and writes it to report_file
+def save_report(instrumentation, report_file, http_client, steam_spy_query):
+    instrumentation.add_section("http", http_client.stats.as_dict())
+    instrumentation.add_section("steam_spy", steam_spy_query.stats)
+    instrumentation.save(report_file)
+    logging.info(f"HTTP stats: {http_client.stats.as_dict()}")
+    logging.info(f"Run report written to {report_file}")
 
 
-def main():
+def setup():
     logging.basicConfig(
         filename = 'output.log',
         format = '%(asctime)s - %(filename)s - %(levelname)s - %(message)s',
@@ -44,40 +222,353 @@ def main():
 
     # Work from pwd
     pwd = os.getcwd()
-    data_directory = f"{pwd}\\data"
-
-    # Decorate our steam library info with ranking info from SteamSpy
-    game_infos = query_steam_data_for_user(data_directory)
-    decorated_game_infos = pd.DataFrame.copy(game_infos)
-
-    steam_spy_query = SteamSpyQuery(data_directory)
-    decorated_game_infos = steam_spy_query.get_data_for_games(
-        decorated_game_infos)
-    decorated_game_infos = MathUtils.add_bayesian_average_to_gamespy_dataframe(
-        decorated_game_infos)
-
-    # Do any filtering or re-arranging you want to here
-    decorated_game_infos = decorated_game_infos.sort_values(
-        by = ['BayesianAverage'], ascending = False)
-
-    # DLCs have no ratings, drop them from the list
-    decorated_game_infos.drop(
-        decorated_game_infos[decorated_game_infos["RatingsRatio"] == 0].index,
-        inplace = True)
-
-    # Write to file for easy access
-    decorated_game_infos.to_csv(f"{data_directory}\\decorated_game_infos.csv")
-
-    graph_generator = SteamDataBokehGraphGenerator(decorated_game_infos,
-                                                   data_directory)
-    graph_generator.generate_most_played_games_graph()
-    graph_generator.generate_most_played_games_2weeks_graph()
-    graph_generator.generate_most_played_games_versus_rating_graph()
-    graph_generator.generate_best_unplayed_games_average()
-    graph_generator.generate_best_unplayed_games_bayesian_average()
+    return f"{pwd}\\data"
+
+
+# Stages whose inputs didn't change since the last run are skipped: the library XML is only parsed when it changed,
+# SteamSpy is only queried and the games ranked when the library or the cached SteamSpy data changed or games are
+# left to fetch, and charts are only rendered when their data changed. force runs every stage.
+# The time spent in each stage, the HTTP and cache counters and the peak memory are written as JSON to report_file
+# (data/run_report.json by default). The stages in profile_stages are also profiled with cProfile into data/.
+# Without fetch, nothing is downloaded: the library XML must be there already and games missing from the SteamSpy
+# cache are ranked without SteamSpy data. Without charts, the ranking is saved and nothing is rendered.
+# At most request_budget games are fetched from SteamSpy, the most played first (see FetchScheduler), the others are
+# left for later runs.
+def main(render_workers = None, output_format = None, export_csv = False, force = False,
+         profile_stages = (), report_file = None, fetch = True, charts = True, request_budget = None):
+    from simplehttp.SimpleHttpClient import SimpleHttpClient
+
+    data_directory = setup()
+    instrumentation = Instrumentation(profile_stages, data_directory)
+    manifest = RunManifest(os.path.join(data_directory, MANIFEST_FILE))
+    output_format = output_format or output_format_of(manifest)
+
+    # One client for every request so connections to Steam and SteamSpy are reused
+    http_client = SimpleHttpClient()
 
+    with instrumentation.stage("xml_fetch"):
+        library_file = library_file_for_user(data_directory, http_client, download = fetch)
+    with instrumentation.stage("manifest"):
+        library_fingerprint = RunManifest.file_fingerprint(library_file)
+    game_infos = None
+    steam_id = None
+    if force or not manifest.is_fresh("library", library_fingerprint):
+        with instrumentation.stage("xml_parse"):
+            game_infos, steam_id = query_steam_data_for_user(data_directory, http_client, download = fetch)
+        manifest.record("library", library_fingerprint, appids = [int(appid) for appid in game_infos.index])
+    appids = manifest.get("library")["appids"]
+
+    from steam.SteamSpyQuery import SteamSpyQuery
+    steam_spy_query = SteamSpyQuery(data_directory, http_client = http_client,
+                                    scheduler = FetchScheduler(request_budget = request_budget))
+
+    def rank_fingerprint():
+        with instrumentation.stage("manifest"):
+            return RunManifest.fingerprint(RANK_VERSION, library_fingerprint,
+                                           steam_spy_query.cache.fingerprint(appids))
+
+    # Games missing from the cache, e.g. left over by the request budget or by a rank without fetching, and failures
+    # due for a retry aren't part of the fingerprint, the ranking is redone for them as long as there are some
+    pending = []
+    if fetch:
+        with instrumentation.stage("manifest"):
+            pending = steam_spy_query.pending_appids(appids)
+        logging.info(f"{len(pending)} games to fetch from SteamSpy")
+
+    outputs = [decorated_file(data_directory, output_format)]
+    if export_csv:
+        outputs.append(decorated_file(data_directory, "csv"))
+
+    if force or pending or not manifest.is_fresh("rank", rank_fingerprint(), outputs):
+        if game_infos is None:
+            with instrumentation.stage("xml_parse"):
+                game_infos, steam_id = query_steam_data_for_user(data_directory, http_client, download = fetch)
+
+        # Decorate our steam library info with ranking info from SteamSpy
+        with instrumentation.stage("steam_spy"):
+            steam_spy_data = steam_spy_query.get_data_for_games(game_infos[["Name"] + PRIORITY_COLUMNS],
+                                                                fetch_missing = fetch)
+        decorated_game_infos = add_rankings(game_infos, steam_spy_data, instrumentation)
+
+        # Fingerprinted after the fetch so the entries just cached count as the input of this ranking
+        manifest.record("rank", rank_fingerprint())
+        generate_reports({data_directory: decorated_game_infos}, render_workers,
+                         output_format, export_csv, {data_directory: manifest}, force, instrumentation, charts,
+                         steam_ids = {data_directory: steam_id})
+    else:
+        logging.info("Library and SteamSpy data unchanged, skipping the ranking")
+        if not charts:
+            manifest.save()
+        elif all(chart_is_current(manifest, data_directory, chart_method) for chart_method in CHARTS):
+            logging.info("Charts are up to date")
+            manifest.save()
+        else:
+            with instrumentation.stage("load_outputs"):
+                decorated_game_infos = FrameStorage.load(outputs[0])
+            render_charts({data_directory: decorated_game_infos}, {data_directory: manifest},
+                          render_workers, force, instrumentation)
+
+    save_report(instrumentation, report_file or os.path.join(data_directory, REPORT_FILE),
+                http_client, steam_spy_query)
     print("Finished!")
 
 
+# Same as main() for a list of users sharing the SteamSpy cache, each game is queried once whoever owns it.
+# The outputs of each user are written to data/<username>.
+def main_batch(usernames, render_workers = None, output_format = None, export_csv = False, force = False,
+               profile_stages = (), report_file = None, charts = True, request_budget = None):
+    import pandas as pd
+    from steam.SteamSpyQuery import SteamSpyQuery
+    from simplehttp.SimpleHttpClient import SimpleHttpClient
+
+    data_directory = setup()
+    instrumentation = Instrumentation(profile_stages, data_directory)
+    http_client = SimpleHttpClient()
+
+    with instrumentation.stage("xml_fetch_parse"):
+        parsed = query_steam_data_for_users(usernames, data_directory, http_client)
+    skipped = [username for username in usernames if username not in parsed]
+    if skipped:
+        print(f"Skipping {', '.join(skipped)}, see output.log")
+    if not parsed:
+        raise Exception("None of the libraries could be read")
+    libraries = {username: game_infos for username, (game_infos, _) in parsed.items()}
+
+    # Union of all libraries so every game is fetched once, with the hours of every owner added up so the games most
+    # played by the group are fetched first
+    all_games = pd.concat([game_infos[["Name"] + PRIORITY_COLUMNS] for game_infos in libraries.values()])
+    all_games = all_games.groupby(level = 0, sort = False).agg(
+        {"Name": "first", **{column: "sum" for column in PRIORITY_COLUMNS}})
+    total_games = sum(len(game_infos) for game_infos in libraries.values())
+    logging.info(f"{len(usernames)} users own {total_games} games, {len(all_games)} unique")
+
+    steam_spy_query = SteamSpyQuery(data_directory, http_client = http_client,
+                                    scheduler = FetchScheduler(request_budget = request_budget))
+    with instrumentation.stage("steam_spy"):
+        steam_spy_data = steam_spy_query.get_data_for_games(all_games)
+
+    reports = {}
+    steam_ids = {}
+    for username, game_infos in libraries.items():
+        user_directory = os.path.join(data_directory, username)
+        os.makedirs(user_directory, exist_ok = True)
+        reports[user_directory] = add_rankings(game_infos, steam_spy_data, instrumentation)
+        steam_ids[user_directory] = parsed[username][1]
+
+    print(f"Generating reports for {len(reports)} users")
+    generate_reports(reports, render_workers, output_format, export_csv, force = force,
+                     instrumentation = instrumentation, charts = charts, steam_ids = steam_ids)
+
+    save_report(instrumentation, report_file or os.path.join(data_directory, REPORT_FILE),
+                http_client, steam_spy_query)
+    print("Finished!")
+
+
+# Downloads the library XML and the SteamSpy data of its games missing from the cache, nothing is ranked or
+# rendered. Only requests, sqlite and the XML parser are loaded, pandas and bokeh never are.
+# See main() for request_budget.
+def fetch(refresh = False, bulk_prefetch = False, profile_stages = (), report_file = None, request_budget = None):
+    from steam.SteamXmlProcessor import SteamXmlProcessor
+    from steam.SteamSpyQuery import SteamSpyQuery
+    from simplehttp.SimpleHttpClient import SimpleHttpClient
+
+    data_directory = setup()
+    instrumentation = Instrumentation(profile_stages, data_directory)
+    http_client = SimpleHttpClient()
+
+    with instrumentation.stage("xml_fetch"):
+        library_file = library_file_for_user(data_directory, http_client, refresh = refresh)
+    with instrumentation.stage("xml_parse"):
+        games = SteamXmlProcessor.from_file(library_file, streaming = True).get_game_details(["Name"] + PRIORITY_COLUMNS)
+
+    steam_spy_query = SteamSpyQuery(data_directory, http_client = http_client,
+                                    scheduler = FetchScheduler(request_budget = request_budget))
+    with instrumentation.stage("steam_spy"):
+        fetched = steam_spy_query.fetch_missing(games, bulk_prefetch)
+
+    save_report(instrumentation, report_file or os.path.join(data_directory, REPORT_FILE),
+                http_client, steam_spy_query)
+    stats = steam_spy_query.stats
+    print(f"Fetched {fetched} games, {stats['cache_hits']} of {len(games)} were cached, "
+          f"{stats['failed']} failed and {stats['skipped']} were skipped since they failed recently")
+    if stats["deferred"]:
+        print(f"{stats['deferred']} games are left for the next runs, the request budget was reached")
+    if stats["shared"]:
+        print(f"{stats['shared']} games were fetched by other processes sharing the cache")
+
+
+def load_decorated_game_infos(data_directory, manifest, output_format = None):
+    filename = decorated_file(data_directory, output_format or output_format_of(manifest))
+    if not os.path.exists(filename):
+        logging.critical(f"{filename} is missing")
+        raise Exception(f"{filename} is missing, run the rank command first")
+    return FrameStorage.load(filename)
+
+
+# Renders the charts of the last ranking, only the ones whose data changed unless force is set
+def render(render_workers = None, output_format = None, force = False):
+    data_directory = setup()
+    manifest = RunManifest(os.path.join(data_directory, MANIFEST_FILE))
+    decorated_game_infos = load_decorated_game_infos(data_directory, manifest, output_format)
+    render_charts({data_directory: decorated_game_infos}, {data_directory: manifest}, render_workers, force)
+    print("Finished!")
+
+
+# Prints the top games of the last ranking, the same lists the charts show
+def report(top = 10, output_format = None):
+    from utils.RankingIndex import RankingIndex
+
+    data_directory = setup()
+    manifest = RunManifest(os.path.join(data_directory, MANIFEST_FILE))
+    decorated_game_infos = load_decorated_game_infos(data_directory, manifest, output_format)
+    ranking_index = RankingIndex(decorated_game_infos)
+    names = decorated_game_infos["Name"].to_numpy()
+    hours = decorated_game_infos["HoursOnRecord"].to_numpy()
+    recent_hours = decorated_game_infos["HoursLast2Weeks"].to_numpy()
+    ratings = decorated_game_infos["BayesianAverage"].to_numpy()
+
+    tables = [
+        ("Most played games", "HoursOnRecord", hours != 0),
+        ("Most played games in the last 2 weeks", "HoursLast2Weeks", recent_hours != 0),
+        ("Best unplayed games", "BayesianAverage", (hours == 0) & (ratings != 0) & (ratings != 100))
+    ]
+    for title, metric, mask in tables:
+        positions = ranking_index.top_k(metric, top, mask)
+        values = decorated_game_infos[metric].to_numpy()[positions]
+        print(f"\n{title}")
+        for rank, (name, value) in enumerate(zip(names[positions], values), start = 1):
+            print(f"{rank:4}. {name} ({metric} {value:.6g})")
+
+
+# Serves the rankings over HTTP from memory (see server.RankingServer), ranked from the library XML and the SteamSpy
+# cache again whenever one of them changes, e.g. after a fetch in another terminal. Nothing is downloaded.
+def serve(host = "127.0.0.1", port = 8000, reload_interval = 1.0):
+    from steam.SteamSpyQuery import SteamSpyQuery
+    from server.RankingServer import RankingServer
+    from simplehttp.SimpleHttpClient import SimpleHttpClient
+
+    data_directory = setup()
+    http_client = SimpleHttpClient()
+    library_file = library_file_for_user(data_directory, http_client, download = False)
+
+    def load_frame():
+        game_infos, _ = query_steam_data_for_user(data_directory, http_client, download = False)
+        # Reloads happen in the server's watcher thread and SQLite connections can't change threads, so every load
+        # opens its own
+        steam_spy_query = SteamSpyQuery(data_directory, http_client = http_client)
+        try:
+            steam_spy_data = steam_spy_query.get_data_for_games(game_infos[["Name"]], fetch_missing = False)
+        finally:
+            steam_spy_query.cache.close()
+        return add_rankings(game_infos, steam_spy_data)
+
+    server = RankingServer(load_frame, [library_file, f"{data_directory}/steam_spy_cache.sqlite"],
+                           host, port, reload_interval)
+    print(f"Serving {server.dataset.length} games on {server.url}, press Ctrl+C to stop")
+    server.serve_forever()
+
+
+COMMANDS = ["run", "fetch", "rank", "render", "report", "serve"]
+
+
+# Running without a command is the same as the run command, so `main.py user1 user2` still works
+def parse_arguments(argv):
+    output_options = argparse.ArgumentParser(add_help = False)
+    output_options.add_argument("--output-format", choices = ["arrow", "parquet", "csv"],
+                                help = "Format of decorated_game_infos (arrow and parquet need pyarrow), the one of the "
+                                       "last run by default and csv at first")
+
+    force_options = argparse.ArgumentParser(add_help = False)
+    force_options.add_argument("--force", action = "store_true",
+                               help = "Run every stage even if its inputs didn't change since the last run")
+
+    render_options = argparse.ArgumentParser(add_help = False)
+    render_options.add_argument("--render-workers", type = int,
+                                help = "Render the charts in this many processes")
+
+    report_options = argparse.ArgumentParser(add_help = False)
+    report_options.add_argument("--profile", action = "append", default = [], metavar = "STAGE",
+                                help = "Profile a stage (e.g. steam_spy, xml_parse, charts) with cProfile into "
+                                       "data/<stage>.prof (<stage>-2.prof... when it runs again), all profiles every stage. "
+                                       "Can be repeated")
+    report_options.add_argument("--report",
+                                help = "Where to write the JSON report of the run, data/run_report.json by default")
+
+    csv_options = argparse.ArgumentParser(add_help = False)
+    csv_options.add_argument("--csv", action = "store_true",
+                             help = "Also export decorated_game_infos as CSV")
+
+    budget_options = argparse.ArgumentParser(add_help = False)
+    budget_options.add_argument("--budget", type = int, metavar = "GAMES",
+                                help = "Fetch at most this many games from SteamSpy, recently and most played first, "
+                                       "the next runs fetch the rest")
+
+    parser = argparse.ArgumentParser(description = "Rank Steam libraries with SteamSpy data",
+                                     epilog = "Without a command, run is assumed")
+    commands = parser.add_subparsers(dest = "command")
+
+    run_parser = commands.add_parser("run", help = "Fetch, rank and render, the default",
+                                     parents = [output_options, force_options, render_options, report_options,
+                                                csv_options, budget_options])
+    run_parser.add_argument("usernames", nargs = "*",
+                            help = "Steam usernames to process in one batch, data/steam_id.dat is used if none are given")
+    run_parser.add_argument("--users-file",
+                            help = "File with one Steam username per line")
+    run_parser.add_argument("--no-charts", action = "store_true",
+                            help = "Only rank, don't render any chart")
+
+    fetch_parser = commands.add_parser("fetch", help = "Download the library and the SteamSpy data missing from the cache",
+                                       parents = [report_options, budget_options])
+    fetch_parser.add_argument("--refresh", action = "store_true",
+                              help = "Download the library XML again if it changed since the last download")
+    fetch_parser.add_argument("--bulk", action = "store_true",
+                              help = "Pull the paginated SteamSpy 'all' pages first, 1000 apps per request")
+
+    commands.add_parser("rank", help = "Rank the library with the cached SteamSpy data, nothing is downloaded",
+                        parents = [output_options, force_options, report_options, csv_options])
+    commands.add_parser("render", help = "Render the charts of the last ranking",
+                        parents = [output_options, force_options, render_options])
+
+    report_parser = commands.add_parser("report", help = "Print the top games of the last ranking",
+                                        parents = [output_options])
+    report_parser.add_argument("--top", type = int, default = 10,
+                               help = "Number of games per list")
+
+    serve_parser = commands.add_parser("serve", help = "Answer ranking queries over HTTP, reloaded when the data changes")
+    serve_parser.add_argument("--host", default = "127.0.0.1",
+                              help = "Address to listen on")
+    serve_parser.add_argument("--port", type = int, default = 8000,
+                              help = "Port to listen on")
+    serve_parser.add_argument("--reload-interval", type = float, default = 1.0,
+                              help = "Seconds between checks of the library XML and the SteamSpy cache for changes")
+
+    if not argv or (argv[0] not in COMMANDS and argv[0] not in ("-h", "--help")):
+        argv = ["run"] + list(argv)
+    return parser.parse_args(argv)
+
+
 if __name__ == "__main__":
-    main()
+    args = parse_arguments(sys.argv[1:])
+
+    if args.command == "fetch":
+        fetch(args.refresh, args.bulk, args.profile, args.report, args.budget)
+    elif args.command == "rank":
+        main(None, args.output_format, args.csv, args.force, args.profile, args.report, fetch = False, charts = False)
+    elif args.command == "render":
+        render(args.render_workers, args.output_format, args.force)
+    elif args.command == "report":
+        report(args.top, args.output_format)
+    elif args.command == "serve":
+        serve(args.host, args.port, args.reload_interval)
+    else:
+        usernames = list(args.usernames)
+        if args.users_file:
+            with open(args.users_file, "r", encoding = "utf-8") as users_file:
+                usernames += [line.strip() for line in users_file if line.strip()]
+
+        if usernames:
+            main_batch(list(dict.fromkeys(usernames)), args.render_workers, args.output_format, args.csv,
+                       args.force, args.profile, args.report, charts = not args.no_charts, request_budget = args.budget)
+        else:
+            main(args.render_workers, args.output_format, args.csv, args.force, args.profile, args.report,
+                 charts = not args.no_charts, request_budget = args.budget)
@@ -0,0 +1,83 @@
+# The decorated game infos of a library held in memory in the shape RankingServer answers from
+from typing import Optional
+
+from utils.RankingIndex import RankingIndex, RANKED_METRICS
+
+# Games rated exactly 0% or 100% are DLCs and tools, left out of the best unplayed games like in the charts
+EXCLUDED_RATINGS = (0, 100)
+
+
+class RankingDataset:
+
+    # frame is indexed by AppId and has the columns of main.add_rankings()
+    def __init__(self, frame):
+        self.length = len(frame)
+        self.metrics = [metric for metric in RANKED_METRICS if metric in frame]
+        self.ranking_index = RankingIndex(frame, self.metrics, precompute = True)
+
+        # Plain Python values so building a response doesn't go through numpy, missing values become None for JSON
+        self.appids = [int(appid) for appid in frame.index]
+        self.positions = {appid: position for position, appid in enumerate(self.appids)}
+        self.columns = {str(column): self.__to_list(frame[column]) for column in frame.columns}
+
+        hours = frame["HoursOnRecord"].to_numpy()
+        recent_hours = frame["HoursLast2Weeks"].to_numpy()
+        self.filters = {
+            "all": None,
+            "played": hours != 0,
+            "unplayed": hours == 0,
+            "recent": recent_hours != 0
+        }
+        self.unplayed_rated = {}
+        for metric in self.metrics:
+            values = frame[metric].to_numpy()
+            mask = self.filters["unplayed"].copy()
+            for rating in EXCLUDED_RATINGS:
+                mask &= values != rating
+            self.unplayed_rated[metric] = mask
+        self.ranks = {metric: self.__ranks(metric) for metric in self.metrics}
+
+    @staticmethod
+    def __to_list(series):
+        return [None if value != value else value for value in series.tolist()]
+
+    def row(self, position):
+        row = {"AppId": self.appids[position]}
+        for column, values in self.columns.items():
+            row[column] = values[position]
+        return row
+
+    def __check_metric(self, metric):
+        if metric not in self.metrics:
+            raise ValueError(f"Unknown metric {metric}, use one of {', '.join(self.metrics)}")
+
+    # The k best games by metric among filter (see filters), best first
+    def top(self, metric, k, filter = "all"):
+        self.__check_metric(metric)
+        if filter not in self.filters:
+            raise ValueError(f"Unknown filter {filter}, use one of {', '.join(self.filters)}")
+        return [self.row(position) for position in self.ranking_index.top_k(metric, k, self.filters[filter])]
+
+    # The k best unplayed games by metric, without DLCs and tools
+    def unplayed_best(self, metric, k):
+        self.__check_metric(metric)
+        return [self.row(position) for position in self.ranking_index.top_k(metric, k, self.unplayed_rated[metric])]
+
+    # Row of appid along with its rank for every metric, None if the library doesn't have it
+    def app(self, appid):
+        position = self.positions.get(appid)
+        if position is None:
+            return None
+        row = self.row(position)
+        row["Ranks"] = {metric: self.rank(metric, position) for metric in self.metrics}
+        return row
+
+    # 1 for the best game, None when the game has no value for metric
+    def rank(self, metric, position):
+        return self.ranks[metric][position]
+
+    def __ranks(self, metric):
+        ranks: list[Optional[int]] = [None] * self.length
+        for rank, position in enumerate(self.ranking_index.top_k(metric).tolist(), start = 1):
+            ranks[position] = rank
+        return ranks
@@ -0,0 +1,180 @@
+# Local HTTP server answering ranking queries from memory, reloaded when its data files change
+#
+# GET /top?metric=BayesianAverage&k=50&filter=unplayed   k best games by metric, filter is all, played, unplayed or recent
+# GET /unplayed-best?metric=BayesianAverage&k=50         k best unplayed games, without DLCs and tools
+# GET /app/<appid>                                       one game with its rank for every metric
+# GET /status                                            number of games and when they were loaded
+import os
+import json
+import time
+import logging
+import threading
+from typing import Optional
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import urlparse, parse_qs
+
+from server.RankingDataset import RankingDataset
+
+DEFAULT_TOP_K = 50
+MAX_TOP_K = 1000
+
+# Responses are kept until the next reload, up to this many
+RESPONSE_CACHE_SIZE = 4096
+
+
+class RankingServer:
+
+    # load_frame returns the decorated game infos to serve (see main.add_rankings). It's called once up front and
+    # again whenever one of watch_files changes, checked every reload_interval seconds. Requests keep being answered
+    # from the previous data while the new one loads, and if loading fails the previous data stays.
+    # port 0 picks a free port, see url.
+    def __init__(self, load_frame, watch_files = (), host = "127.0.0.1", port = 8000, reload_interval = 1.0):
+        self.load_frame = load_frame
+        self.watch_files = list(watch_files)
+        self.reload_interval = reload_interval
+        self.reload_count = 0
+        self.loaded_at = None
+        # The data and the responses computed from it, swapped together on reload
+        self._state: tuple[Optional[RankingDataset], dict[str, tuple[int, bytes]]] = (None, {})
+        self._signature = self.__files_signature()
+        self._stopped = threading.Event()
+        self._threads = []
+
+        self.reload()
+        self._server = ThreadingHTTPServer((host, port), self.__make_handler())
+        self._server.daemon_threads = True
+
+    @property
+    def dataset(self):
+        return self._state[0]
+
+    @property
+    def url(self):
+        host, port = self._server.server_address[:2]
+        if isinstance(host, bytes):
+            host = host.decode("ascii")
+        return f"http://{host}:{port}"
+
+    # Modification times and sizes of the watched files, SQLite's write-ahead log included
+    def __files_signature(self):
+        signature = []
+        for filename in self.watch_files:
+            for path in [filename, f"{filename}-wal"]:
+                if os.path.exists(path):
+                    stat = os.stat(path)
+                    signature.append((path, stat.st_mtime_ns, stat.st_size))
+        return signature
+
+    def reload(self):
+        start = time.perf_counter()
+        dataset = RankingDataset(self.load_frame())
+        # Swapping the reference is atomic, requests use either the old or the new data
+        self._state = (dataset, {})
+        self.loaded_at = time.time()
+        self.reload_count += 1
+        logging.info(f"Loaded {dataset.length} games in {time.perf_counter() - start:.2f} s")
+
+    def __watch(self):
+        while not self._stopped.wait(self.reload_interval):
+            signature = self.__files_signature()
+            if signature == self._signature:
+                continue
+            self._signature = signature
+            try:
+                self.reload()
+            except Exception:
+                logging.exception("Reload failed, still serving the previous data")
+
+    def start(self):
+        for target in [self._server.serve_forever, self.__watch]:
+            thread = threading.Thread(target = target, daemon = True)
+            thread.start()
+            self._threads.append(thread)
+        return self
+
+    def serve_forever(self):
+        self.start()
+        try:
+            while not self._stopped.wait(1.0):
+                pass
+        except KeyboardInterrupt:
+            pass
+        finally:
+            self.shutdown()
+
+    def shutdown(self):
+        self._stopped.set()
+        self._server.shutdown()
+        self._server.server_close()
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *args):
+        self.shutdown()
+
+    @staticmethod
+    def __top_k(query):
+        k = int(query.get("k", DEFAULT_TOP_K))
+        if k < 0 or k > MAX_TOP_K:
+            raise ValueError(f"k must be between 0 and {MAX_TOP_K}")
+        return k
+
+    # Returns the status and JSON body answering path (with its query string)
+    def handle(self, path):
+        dataset, responses = self._state
+        if dataset is None:
+            return 503, json.dumps({"error": "No data loaded"}).encode("utf-8")
+        cached = responses.get(path)
+        if cached is not None:
+            return cached
+
+        parsed = urlparse(path)
+        query = {key: values[0] for key, values in parse_qs(parsed.query).items()}
+        parts = parsed.path.strip("/").split("/")
+        try:
+            if parts == ["top"]:
+                status, payload = 200, dataset.top(query.get("metric", "BayesianAverage"), self.__top_k(query),
+                                                   query.get("filter", "all"))
+            elif parts == ["unplayed-best"]:
+                status, payload = 200, dataset.unplayed_best(query.get("metric", "BayesianAverage"),
+                                                             self.__top_k(query))
+            elif len(parts) == 2 and parts[0] == "app":
+                app = dataset.app(int(parts[1]))
+                status, payload = (200, app) if app is not None else (404, {"error": f"Unknown app {parts[1]}"})
+            elif parts == ["status"]:
+                return 200, json.dumps({"games": dataset.length, "loaded_at": self.loaded_at,
+                                        "reloads": self.reload_count}).encode("utf-8")
+            else:
+                status, payload = 404, {"error": f"Unknown path {parsed.path}"}
+        except ValueError as e:
+            status, payload = 400, {"error": str(e)}
+
+        response = (status, json.dumps(payload).encode("utf-8"))
+        if len(responses) >= RESPONSE_CACHE_SIZE:
+            responses.clear()
+        responses[path] = response
+        return response
+
+    def __make_handler(self):
+        server = self
+
+        class Handler(BaseHTTPRequestHandler):
+
+            # Keep-alive so clients can reuse their connections
+            protocol_version = "HTTP/1.1"
+            # Headers and body are written separately, without this the body waits on the client's delayed ACK
+            disable_nagle_algorithm = True
+
+            def log_message(self, format, *args):
+                pass
+
+            def do_GET(self):
+                status, body = server.handle(self.path)
+                self.send_response(status)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+        return Handler
@@ -1,35 +1,148 @@
-import requests
 import time
+import random
 import logging
-from requests.exceptions import SSLError
+import threading
+from email.utils import parsedate_to_datetime
+
+import requests
+from requests.adapters import HTTPAdapter
+from requests.exceptions import ConnectionError, Timeout
+
+
+class HttpClientStats:
+
+    # Upper bounds in seconds of the latency histogram buckets, slower requests fall in the last "inf" bucket
+    LATENCY_BUCKETS = (0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+    # Counters shared by every request made through a client, safe to update from several threads
+    def __init__(self):
+        self.request_count = 0
+        self.retry_count = 0
+        self.failure_count = 0
+        self.latencies = []
+        self._lock = threading.Lock()
+
+    def record_request(self, latency):
+        with self._lock:
+            self.request_count += 1
+            self.latencies.append(latency)
+
+    def record_retry(self):
+        with self._lock:
+            self.retry_count += 1
+
+    def record_failure(self):
+        with self._lock:
+            self.failure_count += 1
+
+    # Number of requests per latency bucket, keyed by the upper bound of the bucket
+    def latency_histogram(self):
+        with self._lock:
+            latencies = list(self.latencies)
+        histogram = dict.fromkeys([str(bound) for bound in self.LATENCY_BUCKETS] + ["inf"], 0)
+        for latency in latencies:
+            bucket = next((str(bound) for bound in self.LATENCY_BUCKETS if latency <= bound), "inf")
+            histogram[bucket] += 1
+        return histogram
+
+    def as_dict(self):
+        with self._lock:
+            latencies = sorted(self.latencies)
+        result = {
+            "requests": self.request_count,
+            "retries": self.retry_count,
+            "failures": self.failure_count
+        }
+        if latencies:
+            result["latency_mean"] = sum(latencies) / len(latencies)
+            result["latency_p50"] = latencies[len(latencies) // 2]
+            result["latency_p95"] = latencies[min(len(latencies) - 1, int(len(latencies) * 0.95))]
+            result["latency_max"] = latencies[-1]
+            result["latency_histogram"] = self.latency_histogram()
+        return result
 
 
 class SimpleHttpClient:
 
+    RETRY_STATUSES = (429, 500, 502, 503, 504)
+
+    # A client keeps a pool of keep-alive connections, share one instance between everything talking to the same hosts.
+    # Failed requests are retried at most max_retries times, waiting a random time up to backoff_base * 2^attempt
+    # seconds (capped by backoff_cap) or whatever the server asks for in Retry-After.
+    def __init__(self,
+                 max_retries = 5,
+                 backoff_base = 1.0,
+                 backoff_cap = 60.0,
+                 pool_size = 10):
+        self.max_retries = max_retries
+        self.backoff_base = backoff_base
+        self.backoff_cap = backoff_cap
+        self.stats = HttpClientStats()
+
+        self.session = requests.Session()
+        adapter = HTTPAdapter(pool_connections = pool_size, pool_maxsize = pool_size)
+        self.session.mount("http://", adapter)
+        self.session.mount("https://", adapter)
+
+    @staticmethod
+    def retry_after(response):
+        value = response.headers.get("Retry-After")
+        if value is None:
+            return None
+        try:
+            return max(0.0, float(value))
+        except ValueError:
+            pass
+        try:
+            return max(0.0, parsedate_to_datetime(value).timestamp() - time.time())
+        except (TypeError, ValueError):
+            return None
+
+    def __backoff(self, attempt, response = None):
+        if response is not None:
+            retry_after = self.retry_after(response)
+            if retry_after is not None:
+                return min(retry_after, self.backoff_cap)
+        return random.uniform(0, min(self.backoff_cap, self.backoff_base * 2 ** attempt))
+
+    def __get(self, url, parameters, timeout, stream, headers):
+        start = time.perf_counter()
+        try:
+            return self.session.get(url = url, params = parameters, timeout = timeout, stream = stream, headers = headers)
+        finally:
+            self.stats.record_request(time.perf_counter() - start)
+
     # Function for performing a GET request using requests library with retries
     # Sets a 5 second timeout by default
-    def get_request(self, url, parameters = None, timeout = 5):
-        try:
-            response = requests.get(url = url,
-                                    params = parameters,
-                                    timeout = timeout)
-        except SSLError as s:
-            logging.error('SSL Error:', s)
-
-            for i in range(5, 0, -1):
-                print('\rWaiting... ({})'.format(i), end = '')
-                time.sleep(1)
-            logging.warn('\rRetrying.' + ' ' * 10)
-
-            # Recusively try again
-            return self.get_request(url, parameters)
-
-        if response:
-            logging.debug(f'Got response {response.status_code}')
-            return response
-        else:
-            # Response is none usually means too many requests. Wait and try again
-            logging.warn('No response, waiting 10 seconds...')
-            time.sleep(10)
-            logging.warn('Retrying.')
-            return self.get_request(url, parameters)
+    # With retry set to False, the response is returned as is and errors are raised so the caller can handle them.
+    # Otherwise, a successful response is returned or an exception is raised once the retries are exhausted.
+    # 304 Not Modified counts as a success, see headers for conditional requests.
+    # headers are sent along with the session's, e.g. If-None-Match.
+    def get_request(self, url, parameters = None, timeout = 5, retry = True, stream = False, headers = None):
+        if retry is False:
+            return self.__get(url, parameters, timeout, stream, headers)
+
+        for attempt in range(self.max_retries + 1):
+            response = None
+            try:
+                response = self.__get(url, parameters, timeout, stream, headers)
+            except (ConnectionError, Timeout) as e:
+                logging.error(f'Request to {url} failed: {e}')
+                if attempt == self.max_retries:
+                    self.stats.record_failure()
+                    raise
+            else:
+                if response.ok:
+                    logging.debug(f'Got response {response.status_code}')
+                    return response
+                if response.status_code not in self.RETRY_STATUSES or attempt == self.max_retries:
+                    self.stats.record_failure()
+                    response.raise_for_status()
+                logging.warning(f'Got response {response.status_code} from {url}')
+
+            delay = self.__backoff(attempt, response)
+            logging.warning(f'Retrying in {delay:.1f} seconds')
+            self.stats.record_retry()
+            time.sleep(delay)
+
+        raise Exception(f"Request to {url} failed")
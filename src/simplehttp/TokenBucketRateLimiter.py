@@ -0,0 +1,64 @@
+import time
+import threading
+
+
+class TokenBucketRateLimiter:
+
+    # rate is the number of requests allowed per second and capacity the size of the burst allowed on top of it.
+    # On a throttled response, penalize() halves the rate (down to min_rate) and blocks every caller for a while,
+    # reward() then additively recovers the rate back up to the configured one.
+    def __init__(self,
+                 rate = 1.0,
+                 capacity = 1,
+                 min_rate = None,
+                 recovery_step = None):
+        if rate <= 0:
+            raise Exception("Rate must be positive")
+        if capacity < 1:
+            raise Exception("Capacity must be at least 1")
+
+        self.max_rate = float(rate)
+        self.rate = float(rate)
+        self.capacity = float(capacity)
+        self.min_rate = float(min_rate) if min_rate is not None else self.max_rate / 16
+        self.recovery_step = float(recovery_step) if recovery_step is not None else self.max_rate / 10
+
+        self._tokens = float(capacity)
+        self._last_refill = time.monotonic()
+        self._blocked_until = 0.0
+        self._lock = threading.Lock()
+
+    def __refill(self, now):
+        elapsed = now - self._last_refill
+        if elapsed > 0:
+            self._tokens = min(self.capacity, self._tokens + elapsed * self.rate)
+            self._last_refill = now
+
+    # Block until a request may be made
+    def acquire(self):
+        while True:
+            with self._lock:
+                now = time.monotonic()
+                self.__refill(now)
+                if now >= self._blocked_until and self._tokens >= 1:
+                    self._tokens -= 1
+                    return
+                wait = max(self._blocked_until - now,
+                           (1 - self._tokens) / self.rate)
+            time.sleep(wait)
+
+    # Called when the server throttled us (429) or failed. retry_after is the server's hint in seconds, if any.
+    def penalize(self, retry_after = None):
+        with self._lock:
+            now = time.monotonic()
+            self.rate = max(self.min_rate, self.rate / 2)
+            delay = retry_after if retry_after is not None else 1 / self.rate
+            self._blocked_until = max(self._blocked_until, now + delay)
+            self._tokens = 0.0
+            self._last_refill = max(now, self._blocked_until)
+
+    # Called on a successful request to slowly recover the rate after a penalty
+    def reward(self):
+        with self._lock:
+            if self.rate < self.max_rate:
+                self.rate = min(self.max_rate, self.rate + self.recovery_step)
@@ -0,0 +1,36 @@
+# Decides which of the games missing from the SteamSpy cache are fetched first, and how many are fetched in a run
+
+# Columns of the library the default priority reads, the games passed to the scheduler may have them
+PRIORITY_COLUMNS = ["HoursLast2Weeks", "HoursOnRecord"]
+
+
+# Games played in the last 2 weeks first, then the most played ones, then the games whose cache entry expired before
+# the games never fetched
+def default_priority(game):
+    return (game.get("HoursLast2Weeks", 0), game.get("HoursOnRecord", 0), game.get("Stale", False))
+
+
+class FetchScheduler:
+
+    # priority maps a game to a sort key, the largest keys are fetched first and ties keep the library order. A game is
+    # a dict with its Name, the PRIORITY_COLUMNS known for it and Stale, True when the cache has an expired entry for it.
+    # request_budget is the number of games fetched over the whole run at most, None for no limit. Games over the budget
+    # are left out and fetched by later runs since they're still missing from the cache, the most important first.
+    def __init__(self, priority = default_priority, request_budget = None):
+        self.priority = priority
+        self.request_budget = request_budget
+        self.scheduled = 0
+        self.deferred = 0
+
+    @property
+    def remaining(self):
+        return None if self.request_budget is None else max(0, self.request_budget - self.scheduled)
+
+    # Returns the appids of games (appid -> game) to fetch now, most important first
+    def schedule(self, games):
+        order = sorted(games, key = lambda appid: self.priority(games[appid]), reverse = True)
+        if self.request_budget is not None and len(order) > self.remaining:
+            self.deferred += len(order) - self.remaining
+            order = order[:self.remaining]
+        self.scheduled += len(order)
+        return order
@@ -0,0 +1,444 @@
+# Cache backends for data queried from SteamSpy
+import os
+import json
+import time
+import uuid
+import sqlite3
+import hashlib
+import logging
+from abc import ABC, abstractmethod
+from typing import Any
+
+from utils.FileLock import FileLock
+from utils.AtomicFile import AtomicFile
+from utils.FrameStorage import FrameStorage
+
+# pandas is imported where it is used so that checking the cache (see fingerprint()) stays cheap
+
+CACHE_COLUMNS = [
+    'AppId', 'Name', 'Positive', 'Negative', 'TotalRatings', 'RatingsRatio',
+    'UserScore', 'AvgForever', 'Avg2Weeks', 'MedForever', 'Med2Weeks'
+]
+
+# Counts fit in 32 bits and ratios don't need more than float32 precision, which halves the size of the frames
+CACHE_DTYPES = {
+    'AppId': "int32",
+    'Name': "object",
+    'Positive': "int32",
+    'Negative': "int32",
+    'TotalRatings': "int32",
+    'RatingsRatio': "float32",
+    'UserScore': "int32",
+    'AvgForever': "int32",
+    'Avg2Weeks': "int32",
+    'MedForever': "int32",
+    'Med2Weeks': "int32"
+}
+
+# Ratings change slowly, refresh them once a month
+DEFAULT_CACHE_TTL = 30 * 24 * 60 * 60
+
+# Apps SteamSpy has no data for are asked again after a week, apps whose requests failed after an hour, then twice
+# longer after every new failure up to a week (see SteamSpyQuery)
+DEFAULT_NEGATIVE_TTL = 7 * 24 * 60 * 60
+DEFAULT_ERROR_RETRY = 60 * 60
+
+# What is kept about an app that couldn't be fetched: NO_DATA or ERROR (see SteamSpyFetcher), the number of failures
+# in a row, the last error, when it happened and when to try again
+FAILURE_COLUMNS = ['AppId', 'Failure', 'Attempts', 'Message', 'FailedAt', 'RetryAt']
+
+# A claim on an app being fetched lasts 15 minutes, after that the app is fair game again in case its process died.
+# Claims are released as soon as the app is stored, so this only bounds the wait on a dead process.
+DEFAULT_CLAIM_TTL = 15 * 60
+
+# Seconds a write waits for another process to finish its own before failing
+DEFAULT_BUSY_TIMEOUT = 30
+
+# SQLite limits the number of parameters of a statement, appids are looked up this many at a time
+MAX_QUERY_APPIDS = 900
+
+# Meta key of the progress of a crawl, followed by the claims owner of the process crawling
+PROGRESS_KEY = "crawl_progress"
+
+
+def empty_cache_frame():
+    import pandas as pd
+    return pd.DataFrame(columns = CACHE_COLUMNS).astype(
+        dtype = CACHE_DTYPES).set_index("AppId")
+
+
+def records_to_cache_frame(records):
+    import pandas as pd
+    frame = pd.DataFrame.from_records(records, columns = CACHE_COLUMNS)
+    return frame.astype(dtype = CACHE_DTYPES).set_index("AppId")
+
+
+class SteamSpyCache(ABC):
+
+    # ttl is the age in seconds after which an entry is considered stale and is fetched again, None never expires.
+    # Stale entries are still returned until then, a game whose refresh is put off or fails keeps its last data.
+    def __init__(self, ttl = DEFAULT_CACHE_TTL):
+        self.ttl = ttl
+
+    # Returns the entries, stale ones included, as a data frame indexed by AppId, limited to appids if given
+    @abstractmethod
+    def load(self, appids = None):
+        pass
+
+    # Insert or replace entries, records are tuples ordered as CACHE_COLUMNS
+    @abstractmethod
+    def upsert(self, records, fetched_at = None):
+        pass
+
+    # Set of the appids which have a fresh entry
+    def fresh_appids(self, appids):
+        return set(int(appid) for appid in self.load(appids).index) - self.stale_appids(appids)
+
+    # Set of the appids which have an entry older than the TTL
+    def stale_appids(self, appids):
+        return set()
+
+    # Hash of the entries for appids and when they were fetched, it changes whenever one of them is added or
+    # refreshed. None if the backend can't tell.
+    def fingerprint(self, appids):
+        return None
+
+    @staticmethod
+    def _hash_entries(entries):
+        digest = hashlib.sha256()
+        for appid, fetched_at in sorted(entries):
+            digest.update(f"{appid}:{fetched_at!r};".encode("utf-8"))
+        return digest.hexdigest()
+
+    # Small bits of state kept along with the cache, e.g. when bulk pages were last fetched
+    def get_meta(self, key, default = None):
+        return default
+
+    def set_meta(self, key, value):
+        pass
+
+    # Progress of the crawl of this cache, a dict with the pending appids and counters. None when no crawl is running.
+    def load_progress(self):
+        return None
+
+    def save_progress(self, progress):
+        pass
+
+    # Progress left behind by crawls which died, taken over so it's only reported once
+    def take_abandoned_progress(self):
+        return []
+
+    # Apps that couldn't be fetched, appid -> dict of FAILURE_COLUMNS, limited to appids if given.
+    # A failure is forgotten once the app is upserted. Backends which don't keep failures never have any.
+    def load_failures(self, appids = None):
+        return {}
+
+    # Insert or replace failures, tuples ordered as FAILURE_COLUMNS
+    def save_failures(self, failures):
+        pass
+
+    # The appids of appids which failed and shouldn't be tried again before now
+    def blocked_appids(self, appids, now = None):
+        now = time.time() if now is None else now
+        return set(appid for appid, failure in self.load_failures(appids).items() if failure["RetryAt"] > now)
+
+    # Claims appids for this cache before fetching them, so that other processes sharing the cache don't fetch them too.
+    # Returns (claimed, busy): the appids this cache may fetch now, and the ones another process is fetching. The rest
+    # were settled by another process meanwhile, they're fresh or failed recently. Claims last claim_ttl seconds unless
+    # released, by release() or by storing the app (upsert() or save_failures()).
+    # Backends which aren't shared between processes claim everything.
+    def claim(self, appids, claim_ttl = DEFAULT_CLAIM_TTL):
+        return list(appids), []
+
+    # Releases the claims of this cache on appids, all of them if None
+    def release(self, appids = None):
+        pass
+
+    def close(self):
+        pass
+
+
+class SqliteSteamSpyCache(SteamSpyCache):
+
+    # Several processes can share the database: it is in WAL mode so reading never blocks on a writer, writes wait up
+    # to busy_timeout seconds for each other, and what one process stores is seen by the others on their next read.
+    # Apps being fetched are claimed in the claims table, see claim().
+    def __init__(self, filename, ttl = DEFAULT_CACHE_TTL, busy_timeout = DEFAULT_BUSY_TIMEOUT):
+        super().__init__(ttl)
+        self.filename = filename
+        # Identifies the claims of this cache among the processes sharing the database
+        self.owner = f"{os.getpid()}-{uuid.uuid4().hex[:8]}"
+        self.connection = sqlite3.connect(filename, timeout = busy_timeout)
+        self.connection.execute("PRAGMA journal_mode = WAL")
+        # Durable once checkpointed, a crash may only lose the last transactions, which are fetched again
+        self.connection.execute("PRAGMA synchronous = NORMAL")
+        with self.connection:
+            self.connection.execute("""
+                CREATE TABLE IF NOT EXISTS steam_spy (
+                    AppId INTEGER PRIMARY KEY,
+                    Name TEXT,
+                    Positive INTEGER NOT NULL,
+                    Negative INTEGER NOT NULL,
+                    TotalRatings INTEGER NOT NULL,
+                    RatingsRatio REAL NOT NULL,
+                    UserScore INTEGER NOT NULL,
+                    AvgForever INTEGER NOT NULL,
+                    Avg2Weeks INTEGER NOT NULL,
+                    MedForever INTEGER NOT NULL,
+                    Med2Weeks INTEGER NOT NULL,
+                    FetchedAt REAL NOT NULL
+                )""")
+            self.connection.execute("""
+                CREATE TABLE IF NOT EXISTS meta (
+                    Key TEXT PRIMARY KEY,
+                    Value TEXT
+                )""")
+            self.connection.execute("""
+                CREATE TABLE IF NOT EXISTS failures (
+                    AppId INTEGER PRIMARY KEY,
+                    Failure TEXT NOT NULL,
+                    Attempts INTEGER NOT NULL,
+                    Message TEXT,
+                    FailedAt REAL NOT NULL,
+                    RetryAt REAL NOT NULL
+                )""")
+            self.connection.execute("""
+                CREATE TABLE IF NOT EXISTS claims (
+                    AppId INTEGER PRIMARY KEY,
+                    Owner TEXT NOT NULL,
+                    ExpiresAt REAL NOT NULL
+                )""")
+
+    def get_meta(self, key, default = None):
+        row = self.connection.execute("SELECT Value FROM meta WHERE Key = ?",
+                                      (key, )).fetchone()
+        return row[0] if row is not None else default
+
+    def set_meta(self, key, value):
+        with self.connection:
+            self.connection.execute(
+                "INSERT OR REPLACE INTO meta (Key, Value) VALUES (?, ?)",
+                (key, str(value)))
+
+    # Entries fetched before this are stale
+    def __fresh_since(self):
+        return time.time() - self.ttl if self.ttl is not None else float("-inf")
+
+    # Rows of the query for appids, looked up a chunk at a time. All the rows matching condition when appids is None.
+    def __select(self, columns, table, appids, condition = "1", parameters = ()):
+        query = f"SELECT {', '.join(columns)} FROM {table} WHERE {condition}"
+        if appids is None:
+            return self.connection.execute(query, parameters).fetchall()
+
+        appids = list(dict.fromkeys(int(appid) for appid in appids))
+        rows: list[tuple[Any, ...]] = []
+        for start in range(0, len(appids), MAX_QUERY_APPIDS):
+            chunk = appids[start:start + MAX_QUERY_APPIDS]
+            rows.extend(self.connection.execute(f"{query} AND AppId IN ({', '.join(['?'] * len(chunk))})",
+                                                list(parameters) + chunk))
+        return rows
+
+    def load(self, appids = None):
+        return records_to_cache_frame(self.__select(CACHE_COLUMNS, "steam_spy", appids))
+
+    def fresh_appids(self, appids):
+        rows = self.__select(["AppId"], "steam_spy", appids, "FetchedAt >= ?", (self.__fresh_since(), ))
+        return set(row[0] for row in rows)
+
+    def stale_appids(self, appids):
+        if self.ttl is None:
+            return set()
+        rows = self.__select(["AppId"], "steam_spy", appids, "FetchedAt < ?", (self.__fresh_since(), ))
+        return set(row[0] for row in rows)
+
+    # Read without pandas
+    def fingerprint(self, appids):
+        return self._hash_entries(self.__select(["AppId", "FetchedAt"], "steam_spy", appids))
+
+    def upsert(self, records, fetched_at = None):
+        fetched_at = time.time() if fetched_at is None else fetched_at
+        placeholders = ", ".join(["?"] * (len(CACHE_COLUMNS) + 1))
+        records = [tuple(record) + (fetched_at, ) for record in records]
+        with self.connection:
+            self.connection.executemany(
+                f"INSERT OR REPLACE INTO steam_spy ({', '.join(CACHE_COLUMNS)}, FetchedAt) VALUES ({placeholders})",
+                records)
+            self.connection.executemany("DELETE FROM failures WHERE AppId = ?", [(record[0], ) for record in records])
+            self.connection.executemany("DELETE FROM claims WHERE AppId = ?", [(record[0], ) for record in records])
+
+    # Earlier versions wrote the appids in an unnamed first column and left the AppId column empty. The next writes of
+    # the file kept these rows as they were and only filled AppId for the new ones, so either column may hold an appid.
+    @staticmethod
+    def __read_legacy_csv(csv_file):
+        import pandas as pd
+        legacy = pd.read_csv(csv_file)
+        appids = legacy["AppId"] if "AppId" in legacy.columns else pd.Series(float("nan"), index = legacy.index)
+        for column in legacy.columns:
+            if column.startswith("Unnamed: "):
+                appids = appids.fillna(legacy[column])
+        legacy["AppId"] = appids
+        return legacy.dropna(subset = ["AppId"])
+
+    # Import a steam_spy_cache.csv written by earlier versions, only done once per database.
+    # The entries are dated with the modification time of the file so the TTL applies to them.
+    def import_csv(self, csv_file):
+        if self.get_meta("csv_imported") is not None or not os.path.exists(csv_file):
+            return 0
+
+        legacy = self.__read_legacy_csv(csv_file)
+        legacy = legacy.drop_duplicates(subset = "AppId", keep = "last")
+        legacy = legacy[CACHE_COLUMNS].astype(dtype = CACHE_DTYPES)
+        self.upsert(legacy.itertuples(index = False, name = None),
+                    fetched_at = os.path.getmtime(csv_file))
+        self.set_meta("csv_imported", csv_file)
+
+        logging.info(f"Imported {len(legacy)} entries from {csv_file}")
+        return len(legacy)
+
+    # Every process sharing the database has its own progress row, keyed by its claims owner
+    def load_progress(self):
+        progress = self.get_meta(f"{PROGRESS_KEY}:{self.owner}")
+        return json.loads(progress) if progress else None
+
+    def save_progress(self, progress):
+        key = f"{PROGRESS_KEY}:{self.owner}"
+        with self.connection:
+            if progress:
+                self.connection.execute("INSERT OR REPLACE INTO meta (Key, Value) VALUES (?, ?)",
+                                        (key, json.dumps(progress)))
+            else:
+                self.connection.execute("DELETE FROM meta WHERE Key = ?", (key, ))
+
+    # The progress rows of other owners which hold no claim, the row without owner of earlier versions included
+    def take_abandoned_progress(self):
+        with self.connection:
+            self.connection.execute("BEGIN IMMEDIATE")
+            live = set(row[0] for row in self.connection.execute(
+                "SELECT DISTINCT Owner FROM claims WHERE ExpiresAt >= ?", (time.time(), )))
+            rows = self.connection.execute("SELECT Key, Value FROM meta WHERE Key = ? OR Key LIKE ?",
+                                           (PROGRESS_KEY, f"{PROGRESS_KEY}:%")).fetchall()
+            abandoned = [(key, value) for key, value in rows
+                         if key.partition(":")[2] != self.owner and key.partition(":")[2] not in live]
+            self.connection.executemany("DELETE FROM meta WHERE Key = ?", [(key, ) for key, _ in abandoned])
+        return [json.loads(value) for _, value in abandoned if value]
+
+    def load_failures(self, appids = None):
+        rows = self.__select(FAILURE_COLUMNS, "failures", appids)
+        return {row[0]: dict(zip(FAILURE_COLUMNS, row)) for row in rows}
+
+    def save_failures(self, failures):
+        placeholders = ", ".join(["?"] * len(FAILURE_COLUMNS))
+        with self.connection:
+            self.connection.executemany(
+                f"INSERT OR REPLACE INTO failures ({', '.join(FAILURE_COLUMNS)}) VALUES ({placeholders})",
+                [tuple(failure) for failure in failures])
+            self.connection.executemany("DELETE FROM claims WHERE AppId = ?", [(failure[0], ) for failure in failures])
+
+    # appids are checked and claimed in a single transaction taking the write lock up front, two processes can't both
+    # see an app as unclaimed
+    def claim(self, appids, claim_ttl = DEFAULT_CLAIM_TTL):
+        appids = [int(appid) for appid in appids]
+        if not appids:
+            return [], []
+
+        now = time.time()
+        placeholders = ", ".join(["?"] * len(appids))
+        with self.connection:
+            self.connection.execute("BEGIN IMMEDIATE")
+            self.connection.execute("DELETE FROM claims WHERE ExpiresAt < ?", (now, ))
+            settled = set(row[0] for row in self.connection.execute(
+                f"SELECT AppId FROM steam_spy WHERE AppId IN ({placeholders}) AND FetchedAt >= ?",
+                appids + [now - self.ttl if self.ttl is not None else float("-inf")]))
+            settled.update(row[0] for row in self.connection.execute(
+                f"SELECT AppId FROM failures WHERE AppId IN ({placeholders}) AND RetryAt > ?", appids + [now]))
+            busy = set(row[0] for row in self.connection.execute(
+                f"SELECT AppId FROM claims WHERE AppId IN ({placeholders}) AND Owner != ?", appids + [self.owner]))
+
+            claimed = [appid for appid in appids if appid not in settled and appid not in busy]
+            self.connection.executemany(
+                "INSERT OR REPLACE INTO claims (AppId, Owner, ExpiresAt) VALUES (?, ?, ?)",
+                [(appid, self.owner, now + claim_ttl) for appid in claimed])
+        return claimed, [appid for appid in appids if appid in busy and appid not in settled]
+
+    def release(self, appids = None):
+        with self.connection:
+            if appids is None:
+                self.connection.execute("DELETE FROM claims WHERE Owner = ?", (self.owner, ))
+            else:
+                self.connection.executemany("DELETE FROM claims WHERE AppId = ? AND Owner = ?",
+                                            [(int(appid), self.owner) for appid in appids])
+
+    def close(self):
+        self.connection.close()
+
+
+class CsvSteamSpyCache(SteamSpyCache):
+
+    # Keeps the whole cache in a CSV file which is rewritten on every upsert.
+    # Processes sharing the file don't lose each other's entries: an upsert reads, merges and replaces the file under
+    # an exclusive lock on <filename>.lock, and readers only ever see whole files. Apps aren't claimed though, use the
+    # SQLite cache to have processes split the fetching.
+    def __init__(self, filename, ttl = DEFAULT_CACHE_TTL):
+        super().__init__(ttl)
+        self.filename = filename
+        self.lock = FileLock(f"{filename}.lock")
+
+    def _read_file(self):
+        import pandas as pd
+        return pd.read_csv(self.filename)
+
+    def _write_file(self, cache):
+        with AtomicFile(self.filename) as temp_file:
+            cache.to_csv(temp_file, index = False)
+
+    def _read(self):
+        import pandas as pd
+        if not os.path.exists(self.filename):
+            return pd.DataFrame(columns = CACHE_COLUMNS + ['FetchedAt'])
+
+        cache = self._read_file()
+        if 'FetchedAt' not in cache.columns:
+            cache['FetchedAt'] = os.path.getmtime(self.filename)
+        return cache.drop_duplicates(subset = "AppId", keep = "last")
+
+    def load(self, appids = None):
+        cache = self._read()
+        cache = cache[CACHE_COLUMNS].astype(dtype = CACHE_DTYPES).set_index("AppId")
+        if appids is not None:
+            cache = cache.loc[cache.index.intersection(appids)]
+        return cache
+
+    def stale_appids(self, appids):
+        if self.ttl is None:
+            return set()
+        cache = self._read()
+        cache = cache[cache['AppId'].isin(appids) & (cache['FetchedAt'] < time.time() - self.ttl)]
+        return set(int(appid) for appid in cache['AppId'])
+
+    def fingerprint(self, appids):
+        cache = self._read()
+        cache = cache[cache['AppId'].isin(appids)]
+        return self._hash_entries(zip(cache['AppId'].tolist(), cache['FetchedAt'].tolist()))
+
+    def upsert(self, records, fetched_at = None):
+        import pandas as pd
+        new_entries = pd.DataFrame.from_records(list(records), columns = CACHE_COLUMNS)
+        new_entries = new_entries.astype(dtype = CACHE_DTYPES)
+        new_entries['FetchedAt'] = time.time() if fetched_at is None else fetched_at
+
+        with self.lock:
+            cache = self._read()
+            cache = new_entries if cache.empty else pd.concat([cache, new_entries])
+            cache = cache.drop_duplicates(subset = "AppId", keep = "last")
+            self._write_file(cache.reset_index(drop = True))
+
+
+class ColumnarSteamSpyCache(CsvSteamSpyCache):
+
+    # Same as the CSV cache but stored as Arrow IPC (.arrow) or Parquet (.parquet), keeping the dtypes and loading
+    # without text parsing. Requires pyarrow.
+    def _read_file(self):
+        return FrameStorage.load(self.filename)
+
+    def _write_file(self, cache):
+        FrameStorage.save(cache, self.filename)
@@ -0,0 +1,138 @@
+# Concurrent, rate limited fetching of app details from SteamSpy
+import logging
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
+
+from requests.exceptions import RequestException
+
+from simplehttp.SimpleHttpClient import SimpleHttpClient
+from simplehttp.TokenBucketRateLimiter import TokenBucketRateLimiter
+
+STEAM_SPY_API_URL = "http://steamspy.com/api.php"
+
+# Why an app couldn't be fetched: SteamSpy kept answering without data for it (DLCs, tools and delisted apps), or the
+# requests kept failing
+NO_DATA = "no_data"
+ERROR = "error"
+
+
+class SteamSpyFetcher:
+
+    # Throughput is bound by the rate limiter, max_in_flight bounds the number of concurrent requests.
+    # A single app is tried at most max_attempts times before giving up on it.
+    def __init__(self,
+                 http_client = None,
+                 rate_limiter = None,
+                 max_in_flight = 4,
+                 max_attempts = 5,
+                 api_url = STEAM_SPY_API_URL):
+        self.httpClient = http_client if http_client is not None else SimpleHttpClient()
+        self.rate_limiter = rate_limiter if rate_limiter is not None else TokenBucketRateLimiter()
+        self.max_in_flight = max_in_flight
+        self.max_attempts = max_attempts
+        self.api_url = api_url
+
+    # Returns (json_data, None), or (None, (NO_DATA or ERROR, message)) once every attempt failed.
+    # With allow_empty, an empty JSON answer is a valid result instead of a sign of throttling.
+    # Only throttling (429), server errors and transport errors slow down the shared rate limiter. SteamSpy answers
+    # apps it doesn't know with {}, so an empty answer is asked again once and is then taken as NO_DATA.
+    def __request(self, parameters, allow_empty):
+        failure = (ERROR, "not attempted")
+        empty_answers = 0
+        for attempt in range(1, self.max_attempts + 1):
+            self.rate_limiter.acquire()
+            try:
+                response = self.httpClient.get_request(
+                    self.api_url, parameters = parameters, retry = False)
+            except RequestException as e:
+                logging.warning(f"Request {parameters} failed on attempt {attempt}: {e}")
+                failure = (ERROR, str(e))
+                self.rate_limiter.penalize()
+                continue
+
+            if response.status_code == 429:
+                logging.warning(f"Throttled on {parameters}, backing off")
+                failure = (ERROR, "throttled")
+                self.rate_limiter.penalize(self.httpClient.retry_after(response))
+                continue
+
+            if response.status_code >= 500:
+                logging.warning(f"Status {response.status_code} for {parameters}, backing off")
+                failure = (ERROR, f"status {response.status_code}")
+                self.rate_limiter.penalize(self.httpClient.retry_after(response))
+                continue
+
+            if not response.ok:
+                failure = (ERROR, f"status {response.status_code}")
+                break
+
+            json_data = None
+            if response.content:
+                try:
+                    json_data = response.json()
+                except ValueError:
+                    json_data = None
+
+            if allow_empty and json_data is not None:
+                self.rate_limiter.reward()
+                return json_data, None
+
+            if not json_data:
+                # Unknown apps, and now and then an overloaded SteamSpy, get an empty answer
+                failure = (NO_DATA, "empty response")
+                empty_answers += 1
+                if empty_answers > 1:
+                    break
+                logging.info(f"Empty response for {parameters}, asking once more")
+                continue
+
+            self.rate_limiter.reward()
+            return json_data, None
+
+        if failure[0] == NO_DATA:
+            logging.info(f"No data for {parameters}")
+        else:
+            logging.error(f"Giving up on {parameters} after {attempt} attempts: {failure[1]}")
+        return None, failure
+
+    # With allow_empty, an empty JSON answer is a valid result instead of a sign of throttling.
+    # Raises once every attempt failed.
+    def get_json(self, parameters, allow_empty = False):
+        json_data, failure = self.__request(parameters, allow_empty)
+        if failure is not None:
+            raise Exception(f"Giving up on {parameters}: {failure[1]}")
+        return json_data
+
+    def get_app_details(self, appid):
+        return self.get_json({"request": "appdetails", "appid": appid})
+
+    # A page of the "all" request, about 1000 apps keyed by appid. Empty once past the last page.
+    def get_all_page(self, page):
+        return self.get_json({"request": "all", "page": page}, allow_empty = True)
+
+    # Yields (appid, json_data, failure) for every appid in the order they complete. failure is None when the details
+    # were fetched, otherwise json_data is None and failure is (NO_DATA or ERROR, message): an app that can't be
+    # fetched doesn't stop the others.
+    # appids is only consumed as requests can be sent, max_in_flight ahead, so it may be a generator deciding what to
+    # fetch at the last moment (see SteamSpyQuery, which claims apps that way).
+    def fetch_app_details(self, appids):
+        appids = iter(appids)
+        executor = ThreadPoolExecutor(max_workers = self.max_in_flight)
+        futures = {}
+
+        def submit_next():
+            appid = next(appids, None)
+            if appid is not None:
+                futures[executor.submit(self.__request, {"request": "appdetails", "appid": appid}, False)] = appid
+
+        try:
+            for _ in range(self.max_in_flight):
+                submit_next()
+            while futures:
+                done, _ = wait(futures, return_when = FIRST_COMPLETED)
+                for future in done:
+                    appid = futures.pop(future)
+                    submit_next()
+                    json_data, failure = future.result()
+                    yield appid, json_data, failure
+        finally:
+            executor.shutdown(wait = True, cancel_futures = True)
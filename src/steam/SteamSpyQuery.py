@@ -1,29 +1,95 @@
 # Small module for querying data from SteamSpy
-import os
 import time
 import logging
-
-import pandas as pd
+from typing import Any
 
 from simplehttp.SimpleHttpClient import SimpleHttpClient
+from simplehttp.TokenBucketRateLimiter import TokenBucketRateLimiter
+from steam.SteamSpyFetcher import SteamSpyFetcher, STEAM_SPY_API_URL, NO_DATA, ERROR
+from steam.FetchScheduler import FetchScheduler, PRIORITY_COLUMNS
+from steam.SteamSpyCache import (SqliteSteamSpyCache, DEFAULT_CACHE_TTL, DEFAULT_NEGATIVE_TTL, DEFAULT_ERROR_RETRY,
+                                 DEFAULT_CLAIM_TTL, empty_cache_frame)
 
 
 class SteamSpyQuery:
 
-    def __init__(self, output_directory = "."):
-        self.httpClient = SimpleHttpClient()
+    # Per SteamSpy documentation, don't make more than 1 appdetails request per second.
+    # requests_per_second and burst configure the token bucket, max_in_flight the number of concurrent requests.
+    # cache is a SteamSpyCache backend, by default a SQLite database in output_directory expiring entries after cache_ttl
+    # seconds. A steam_spy_cache.csv left by earlier versions is imported into it once.
+    # Fetched data is committed to the cache every checkpoint_batch_size games along with the progress of the crawl.
+    # http_client allows sharing a SimpleHttpClient, and its connection pool, with other queries.
+    # Bulk "all" pages are limited to 1 request per minute, see bulk_requests_per_second.
+    # An app that can't be fetched doesn't stop the crawl, it's recorded in the cache and skipped until it's due again:
+    # negative_ttl seconds later when SteamSpy has no data for it, error_retry seconds later when its requests failed,
+    # doubled after every failure in a row up to negative_ttl.
+    # scheduler orders the games to fetch and limits how many are fetched over the whole run, see FetchScheduler. By
+    # default, recently played and most played games are fetched first and there is no limit.
+    # Processes sharing the cache split the fetching: every game is claimed in the cache right before it's requested
+    # and games claimed by another process are left to it, then read from the cache once it stored them. They're
+    # checked again every claim_poll_interval seconds, a claim not released after claim_ttl seconds is taken over.
+    def __init__(self,
+                 output_directory = ".",
+                 requests_per_second = 1.0,
+                 burst = 1,
+                 max_in_flight = 4,
+                 api_url = STEAM_SPY_API_URL,
+                 cache = None,
+                 cache_ttl = DEFAULT_CACHE_TTL,
+                 checkpoint_batch_size = 10,
+                 http_client = None,
+                 bulk_requests_per_second = 1 / 60,
+                 negative_ttl = DEFAULT_NEGATIVE_TTL,
+                 error_retry = DEFAULT_ERROR_RETRY,
+                 scheduler = None,
+                 claim_ttl = DEFAULT_CLAIM_TTL,
+                 claim_poll_interval = 1.0):
+        self.httpClient = http_client if http_client is not None else SimpleHttpClient()
         self.output_directory = output_directory
+        self.fetcher = SteamSpyFetcher(
+            self.httpClient,
+            TokenBucketRateLimiter(rate = requests_per_second, capacity = burst),
+            max_in_flight = max_in_flight,
+            api_url = api_url)
+        self.bulk_fetcher = SteamSpyFetcher(
+            self.httpClient,
+            TokenBucketRateLimiter(rate = bulk_requests_per_second, capacity = 1),
+            max_in_flight = 1,
+            api_url = api_url)
+        self._cache = cache
+        self.cache_ttl = cache_ttl
+        self.checkpoint_batch_size = checkpoint_batch_size
+        self.negative_ttl = negative_ttl
+        self.error_retry = error_retry
+        self.scheduler = scheduler if scheduler is not None else FetchScheduler()
+        self.claim_ttl = claim_ttl
+        self.claim_poll_interval = claim_poll_interval
 
-    def __get_data_for_game(self, appid: str, name: str):
-        logging.info(f"Request {name} from SteamSpy")
-        url = "http://steamspy.com/api.php"
-        parameters = {"request": "appdetails", "appid": appid}
-        json_data = self.httpClient.get_request(
-            url, parameters = parameters).json()
+        # Totals over every get_data_for_games() call, the time spent in the cache is included in the report.
+        # failed counts the apps that couldn't be fetched, skipped the ones not tried since they failed recently and
+        # deferred the ones left for later runs by the request budget and shared the ones other processes fetched
+        # meanwhile.
+        self.stats = {"cache_hits": 0, "cache_misses": 0, "fetched": 0, "failed": 0, "skipped": 0, "deferred": 0,
+                      "shared": 0, "cache_read_seconds": 0.0, "cache_write_seconds": 0.0}
 
-        # Only look at the first game that is returned as a result
-        logging.debug(f"Finished request for {name}")
+    @property
+    def cache(self):
+        # Created lazily so queries with use_cache = False never touch the disk. Only kept once the CSV of earlier
+        # versions is imported, a failed import is tried again on the next access.
+        if self._cache is None:
+            cache = SqliteSteamSpyCache(
+                f"{self.output_directory}/steam_spy_cache.sqlite",
+                ttl = self.cache_ttl)
+            try:
+                cache.import_csv(f"{self.output_directory}/steam_spy_cache.csv")
+            except Exception:
+                cache.close()
+                raise
+            self._cache = cache
+        return self._cache
 
+    @staticmethod
+    def __parse_game_data(appid, name: str, json_data):
         positive = int(json_data["positive"])
         negative = int(json_data["negative"])
         total_ratings = positive + negative
@@ -39,78 +105,267 @@ class SteamSpyQuery:
                 int(json_data["median_forever"]),
                 int(json_data["median_2weeks"]))
 
+    # (record, None), or (None, (ERROR, message)) when json_data isn't what SteamSpy usually answers
+    def __parse_or_fail(self, appid, name, json_data):
+        try:
+            return self.__parse_game_data(appid, name, json_data), None
+        except (KeyError, TypeError, ValueError, AttributeError) as e:
+            logging.error(f"Unexpected data for {name} ({appid}): {e!r}")
+            return None, (ERROR, f"unexpected data: {e!r}")
+
+    # Pull the paginated "all" request into the cache, about 1000 apps per request.
+    # Pages are only pulled again once the previous pull is older than the cache TTL, an interrupted pull resumes
+    # from the page it stopped at. Returns the number of apps stored.
+    def prefetch_all_pages(self, max_pages = None):
+        completed_at = self.cache.get_meta("bulk_completed_at")
+        if completed_at and (self.cache_ttl is None or float(completed_at) >= time.time() - self.cache_ttl):
+            logging.info("Bulk pages are up to date")
+            return 0
+
+        page = int(self.cache.get_meta("bulk_next_page", 0))
+        stored = 0
+        while max_pages is None or page < max_pages:
+            logging.info(f"Request page {page} of all apps from SteamSpy")
+            json_data = self.bulk_fetcher.get_all_page(page)
+            if not json_data:
+                break
+
+            records = []
+            for appid, app_data in json_data.items():
+                # Bad entries are skipped, these apps are left to the appdetails requests
+                if not str(appid).isdigit() or not isinstance(app_data, dict):
+                    logging.error(f"Unexpected data for app {appid!r} in page {page}")
+                    continue
+                record, failure = self.__parse_or_fail(int(appid), app_data.get("name"), app_data)
+                if failure is None:
+                    records.append(record)
+            self.cache.upsert(records)
+            stored += len(records)
+            page += 1
+            self.cache.set_meta("bulk_next_page", page)
+        else:
+            # Stopped by max_pages, keep going from there next time
+            return stored
+
+        self.cache.set_meta("bulk_next_page", 0)
+        self.cache.set_meta("bulk_completed_at", time.time())
+        return stored
+
+    # Saves the failures of a batch, a list of (appid, (NO_DATA or ERROR, message)), along with when to try again
+    def __record_failures(self, failures):
+        now = time.time()
+        previous = self.cache.load_failures([appid for appid, _ in failures])
+        records = []
+        for appid, (failure, message) in failures:
+            attempts = previous[appid]["Attempts"] + 1 if appid in previous else 1
+            if failure == NO_DATA:
+                delay = self.negative_ttl
+            else:
+                delay = min(self.negative_ttl, self.error_retry * 2 ** (attempts - 1))
+            records.append((appid, failure, attempts, message, now, now + delay))
+        self.cache.save_failures(records)
+
+    # The games of to_fetch (appid -> game, a dict with at least a Name) the scheduler picks for now, in order.
+    # Games which failed recently are left out. Without use_cache the cache isn't looked at, nor created.
+    def __schedule(self, to_fetch, use_cache = True):
+        blocked = self.cache.blocked_appids(to_fetch) if use_cache and to_fetch else set()
+        if blocked:
+            logging.info(f"Skipping {len(blocked)} games which failed recently")
+            self.stats["skipped"] += len(blocked)
+        stale = self.cache.stale_appids(to_fetch) if use_cache and to_fetch else set()
+        games = {appid: dict(game, Stale = appid in stale) for appid, game in to_fetch.items() if appid not in blocked}
+
+        deferred = self.scheduler.deferred
+        order = self.scheduler.schedule(games)
+        if self.scheduler.deferred > deferred:
+            logging.info(f"Request budget reached, {self.scheduler.deferred - deferred} games are left for later runs")
+            self.stats["deferred"] += self.scheduler.deferred - deferred
+        return order
+
+    # Yields the appids of order to fetch, claimed in the cache a few at a time right before they're requested.
+    # The ones another process is fetching are appended to busy, the ones another process stored meanwhile to shared.
+    def __claim_in_turn(self, order, busy, shared):
+        chunk_size = self.fetcher.max_in_flight
+        for start in range(0, len(order), chunk_size):
+            chunk = order[start:start + chunk_size]
+            claimed, chunk_busy = self.cache.claim(chunk, self.claim_ttl)
+            busy.extend(chunk_busy)
+            taken = set(claimed).union(chunk_busy)
+            shared.extend(appid for appid in chunk if appid not in taken)
+            yield from claimed
+
+    # Fetch the games of to_fetch (appid -> game, see __schedule) in the scheduler's order, committing them to the cache
+    # in batches. Returns how many were fetched and the appids other processes stored instead (see __init__). The
+    # records are also appended to buffer if given (see SteamSpyRecordBuffer).
+    # The pending appids are recorded with every batch, if the crawl dies the next one fetches what was left along with
+    # anything else missing. Games which fail are recorded, see __init__.
+    def __crawl_with_checkpoints(self, to_fetch, buffer = None):
+        order = self.__schedule(to_fetch)
+
+        # Nothing is written when nothing is fetched, so reading the cache doesn't change it (see RankingServer)
+        if not order:
+            return 0, []
+        for progress in self.cache.take_abandoned_progress():
+            logging.info(f"Resuming an interrupted crawl, {progress['completed']} of {progress['total']} games were "
+                         f"fetched, {len(progress['pending'])} left over")
+
+        pending = dict.fromkeys(order)
+        progress = {"total": len(order), "completed": 0, "pending": order}
+        fetched = 0
+        batch: list[Any] = []
+        failures: list[tuple[int, Any]] = []
+        shared: list[int] = []
+
+        def checkpoint():
+            start = time.perf_counter()
+            self.cache.upsert(batch)
+            if failures:
+                self.__record_failures(failures)
+            for appid in [record[0] for record in batch] + [appid for appid, _ in failures] + shared:
+                pending.pop(appid, None)
+            progress["completed"] = progress["total"] - len(pending)
+            progress["pending"] = list(pending)
+            self.cache.save_progress(progress if pending else None)
+            self.stats["cache_write_seconds"] += time.perf_counter() - start
+            logging.debug(f"Checkpoint, {progress['completed']} of {progress['total']} games done")
+            batch.clear()
+            failures.clear()
+
+        self.cache.save_progress(progress if pending else None)
+        try:
+            while order:
+                busy: list[int] = []
+                claimed = self.__claim_in_turn(order, busy, shared)
+                for appid, json_data, failure in self.fetcher.fetch_app_details(claimed):
+                    name = to_fetch[appid]["Name"]
+                    logging.debug(f"Finished request for {name}")
+                    record = None
+                    if failure is None:
+                        record, failure = self.__parse_or_fail(appid, name, json_data)
+                    if failure is not None:
+                        self.stats["failed"] += 1
+                        failures.append((appid, failure))
+                    else:
+                        if buffer is not None:
+                            buffer.append(record)
+                        fetched += 1
+                        batch.append(record)
+                    if len(batch) + len(failures) >= self.checkpoint_batch_size:
+                        checkpoint()
+
+                # Claimed by other processes, whatever they don't store is fetched here once their claims are gone.
+                # What was fetched is stored first, the claims on it might be what the other processes wait for.
+                if busy:
+                    if batch or failures:
+                        checkpoint()
+                    logging.info(f"Waiting for {len(busy)} games other processes are fetching")
+                    time.sleep(self.claim_poll_interval)
+                order = busy
+        finally:
+            # Also runs on errors and Ctrl-C so whatever was fetched is kept, and other processes don't wait for games
+            # this one won't fetch
+            if batch or failures or shared:
+                checkpoint()
+            self.cache.release()
+
+        if shared:
+            logging.info(f"{len(shared)} games were fetched by other processes")
+            self.stats["shared"] += len(shared)
+        return fetched, shared
+
+    # The appids of appids a fetch would request now: missing from the cache or stale, and not failed recently. Read
+    # without pandas, so callers can tell cheaply whether there's anything left to fetch, e.g. games left over by the
+    # request budget of an earlier run or failures whose retry time has come.
+    def pending_appids(self, appids):
+        fresh = self.cache.fresh_appids(appids)
+        missing = [int(appid) for appid in appids if int(appid) not in fresh]
+        blocked = self.cache.blocked_appids(missing) if missing else set()
+        return [appid for appid in missing if appid not in blocked]
+
+    # Fetch the games of games (appid -> name, or appid -> dict with a Name and the PRIORITY_COLUMNS known) missing from
+    # the cache into it and return how many were fetched.
+    # Unlike get_data_for_games, this doesn't need pandas so fetch-only runs start fast. See get_data_for_games for
+    # bulk_prefetch.
+    def fetch_missing(self, games, bulk_prefetch = False):
+        fresh = self.cache.fresh_appids(games)
+        if bulk_prefetch is True and len(fresh) < len(games):
+            self.prefetch_all_pages()
+            fresh = self.cache.fresh_appids(games)
+        logging.info(f"Found {len(fresh)} of {len(games)} games in cache")
+        self.stats["cache_hits"] += len(fresh)
+        self.stats["cache_misses"] += len(games) - len(fresh)
+
+        to_fetch = {int(appid): game if isinstance(game, dict) else {"Name": game}
+                    for appid, game in games.items() if int(appid) not in fresh}
+        fetched, _ = self.__crawl_with_checkpoints(to_fetch)
+        self.stats["fetched"] += fetched
+        return fetched
+
     # Get data from SteamSpy for each game
     # The structure of game_infos must be at least two columns named 'AppId' and 'Name', with AppId being the index.
-    # Setting 'in_place' to true will modify the input game_infos preserving any other existing columns.
-    # Otherwise, they are discarded.
+    # Returns a new frame with the other columns of game_infos followed by the SteamSpy ones, game_infos is left as is.
+    # The games missing from the cache are fetched in the order of the scheduler, which reads the PRIORITY_COLUMNS
+    # of game_infos (e.g. HoursOnRecord) when it has them.
     # pull_first_n allows limiting the number of queries to the first N found.
+    # With bulk_prefetch, the bulk pages are pulled into the cache first (see prefetch_all_pages) and only the apps
+    # they don't cover are requested one by one. It requires use_cache.
+    # With fetch_missing set to False, only the cached games get SteamSpy data and nothing is requested.
     def get_data_for_games(self,
                            game_infos_df,
                            pull_first_n = None,
-                           use_cache = True):
+                           use_cache = True,
+                           bulk_prefetch = False,
+                           fetch_missing = True):
+
+        requested = game_infos_df
+        if pull_first_n is not None:
+            requested = game_infos_df.iloc[:pull_first_n]
+
+        # Stale entries are loaded too, they're used for the games whose refresh doesn't happen or fails
+        start = time.perf_counter()
+        cache = self.cache.load(requested.index) if use_cache is True else empty_cache_frame()
+        fresh = self.cache.fresh_appids(requested.index) if use_cache is True else set()
+        self.stats["cache_read_seconds"] += time.perf_counter() - start
 
-        cache_columns = [
-            'AppId', 'Name', 'Positive', 'Negative', 'TotalRatings',
-            'RatingsRatio', 'UserScore', 'AvgForever', 'Avg2Weeks',
-            'MedForever', 'Med2Weeks'
-        ]
+        # Only the apps missing from the cache or stale go to the network
+        missing = requested.index.difference(list(fresh), sort = False)
+        if bulk_prefetch is True and use_cache is True and len(missing) > 0:
+            self.prefetch_all_pages()
+            cache = self.cache.load(requested.index)
+            missing = requested.index.difference(list(self.cache.fresh_appids(requested.index)), sort = False)
+        logging.info(f"Found {len(requested) - len(missing)} of {len(requested)} games in cache")
+        self.stats["cache_hits"] += len(requested) - len(missing)
+        self.stats["cache_misses"] += len(missing)
+        to_fetch = {}
+        if fetch_missing is True:
+            columns = ["Name"] + [column for column in PRIORITY_COLUMNS if column in requested.columns]
+            for appid, *values in requested.loc[missing, columns].itertuples(name = None):
+                to_fetch[int(appid)] = dict(zip(columns, values))
 
-        cache = pd.DataFrame(columns = cache_columns)
+        import pandas as pd
+        from steam.SteamSpyRecordBuffer import SteamSpyRecordBuffer
+
+        # Fetched games go straight into typed columns as they arrive
+        buffer = SteamSpyRecordBuffer(len(to_fetch))
         if use_cache is True:
-            cache_file = f"{self.output_directory}/steam_spy_cache.csv"
-            if os.path.exists(cache_file):
-                cache = pd.read_csv(cache_file, index_col = "AppId")
+            _, shared = self.__crawl_with_checkpoints(to_fetch, buffer)
+            if shared:
+                # Stored by other processes while this one was fetching
+                cache = self.cache.load(requested.index)
         else:
-            cache_file = ""
-
-        new_cache_data = []
-        pulled = 0
-        for index, row in game_infos_df.iterrows():
-            name = row['Name']
-            appid = index
-
-            cache_found = False
-            if cache.empty is False:
-                cache_row = cache.loc[cache['Name'] == name]
-                if cache_row.empty is False:
-                    logging.info(f"Found {name} in cache")
-                    cache_found = True
-
-            if cache_found is False:
-                new_cache_data.append(self.__get_data_for_game(appid, name))
-                # Per documentation, don't make more than 1 request per second
-                time.sleep(2)
-
-            pulled = pulled + 1
-            if pull_first_n is not None:
-                logging.debug(f"Pulled {pulled} of {pull_first_n}")
-                if pulled == pull_first_n:
-                    break
-
-        # Turn newly queried cache info into a data frame
-        new_cache = pd.DataFrame.from_records(new_cache_data,
-                                              columns = cache_columns)
-        new_cache = new_cache.astype(
-            dtype = {
-                'AppId': "int64",
-                'Name': "object",
-                'Positive': "int64",
-                'Negative': "int64",
-                'TotalRatings': "int64",
-                'RatingsRatio': "float64",
-                'UserScore': "int64",
-                'AvgForever': "int64",
-                'Avg2Weeks': "int64",
-                'MedForever': "int64",
-                'Med2Weeks': "int64"
-            })
-        new_cache.set_index("AppId", inplace = True)
-
-        # Merge new cache and existing cache data
-        final_cache = pd.concat([cache, new_cache])
-        if use_cache is True:
-            final_cache.to_csv(cache_file)
+            for appid, json_data, failure in self.fetcher.fetch_app_details(self.__schedule(to_fetch, use_cache = False)):
+                record = None
+                if failure is None:
+                    record, failure = self.__parse_or_fail(appid, to_fetch[appid]["Name"], json_data)
+                if failure is not None:
+                    self.stats["failed"] += 1
+                    continue
+                buffer.append(record)
+
+        self.stats["fetched"] += len(buffer)
 
-        # Add the new columns to the existing game_infos, drop Names since they're duplicated otherwise
-        game_infos_df.drop("Name", axis = 1, inplace = True)
-        return game_infos_df.join(final_cache, on = "AppId", how = 'left')
+        # The other columns of game_infos followed by the SteamSpy ones, Names are dropped since they're duplicated
+        # otherwise. Built in one go from the aligned columns rather than by a join.
+        column_data = {column: game_infos_df[column].to_numpy() for column in game_infos_df.columns if column != "Name"}
+        column_data.update(buffer.align(game_infos_df.index, cache))
+        return pd.DataFrame(column_data, index = game_infos_df.index)
@@ -0,0 +1,60 @@
+# Typed columns SteamSpy records are written into as they're fetched, instead of a list of tuples turned into a frame,
+# cast and concatenated with the cache afterwards
+import numpy as np
+import pandas as pd
+
+from steam.SteamSpyCache import CACHE_COLUMNS, CACHE_DTYPES
+
+
+class SteamSpyRecordBuffer:
+
+    # capacity is the number of records expected, the buffer grows past it if needed.
+    # The columns are the fields of one structured array so a record is written in a single assignment.
+    def __init__(self, capacity = 1024):
+        self.length = 0
+        self._records = np.empty(max(capacity, 1), dtype = [(column, CACHE_DTYPES[column]) for column in CACHE_COLUMNS])
+
+    def __len__(self):
+        return self.length
+
+    def __grow(self):
+        grown = np.empty(len(self._records) * 2, dtype = self._records.dtype)
+        grown[:self.length] = self._records[:self.length]
+        self._records = grown
+
+    # record is a tuple ordered as CACHE_COLUMNS
+    def append(self, record):
+        if self.length == len(self._records):
+            self.__grow()
+        self._records[self.length] = record
+        self.length += 1
+
+    # The values of column in the records appended so far, a view of the buffer
+    def column(self, name):
+        return self._records[name][:self.length]
+
+    # Columns of the records appended so far and of cache (a frame indexed by AppId like SteamSpyCache.load()) lined
+    # up with index, an index of AppIds. Every value is copied once, straight to its row. Apps in neither have missing
+    # values, which makes integer columns float like a left join would.
+    def align(self, index, cache):
+        fetched = {column: self.column(column) for column in CACHE_COLUMNS[1:]}
+        sources = [(cache.index.get_indexer(index), {column: cache[column].to_numpy() for column in cache.columns}),
+                   (pd.Index(self.column("AppId")).get_indexer(index), fetched)]
+        found = np.zeros(len(index), dtype = bool)
+        for indexer, _ in sources:
+            found |= indexer >= 0
+        complete = bool(found.all())
+
+        aligned = {}
+        for column in CACHE_COLUMNS[1:]:
+            dtype = np.dtype(CACHE_DTYPES[column])
+            if not complete and dtype.kind in "iub":
+                dtype = np.dtype(np.float64)
+            values = np.empty(len(index), dtype = dtype)
+            if not complete:
+                values[~found] = np.nan
+            for indexer, source in sources:
+                rows = np.flatnonzero(indexer >= 0)
+                values[rows] = source[column][indexer[rows]]
+            aligned[column] = values
+        return aligned
@@ -1,97 +1,272 @@
 import os
+import sys
+import json
+import shutil
+import logging
+from typing import Any, Callable
 from simplehttp.SimpleHttpClient import SimpleHttpClient
-import pandas as pd
+from utils.AtomicFile import AtomicFile
 import xml.etree.ElementTree as ET
 
+# numpy and pandas are only imported to build data frames, see get_game_names() for reading a library without them
+
+
+STEAM_COMMUNITY_URL = "http://steamcommunity.com"
+
+# The ETag and Last-Modified of a downloaded library are kept in <cache file><VALIDATORS_SUFFIX>
+VALIDATORS_SUFFIX = ".http.json"
+VALIDATOR_HEADERS = {"ETag": "If-None-Match", "Last-Modified": "If-Modified-Since"}
+
+
+def _text(text):
+    return text if text is not None else ""
+
+
+# Hours above 1000 are written with a thousands separator, e.g. 1,234.5
+def _hours(text):
+    return float(text.replace(",", "")) if text else 0.0
+
+
+# Headers making the download of cache_file conditional on the library having changed since, none without validators
+def _conditional_headers(cache_file):
+    validators_file = cache_file + VALIDATORS_SUFFIX
+    if not os.path.exists(cache_file) or not os.path.exists(validators_file):
+        return {}
+    try:
+        with open(validators_file, "r", encoding = "utf-8") as json_file:
+            validators = json.load(json_file)
+    except (OSError, ValueError):
+        logging.warning(f"Ignoring unreadable {validators_file}")
+        return {}
+    return {VALIDATOR_HEADERS[header]: value for header, value in validators.items() if header in VALIDATOR_HEADERS}
+
+
+def _save_validators(cache_file, response):
+    validators = {header: response.headers[header] for header in VALIDATOR_HEADERS if header in response.headers}
+    validators_file = cache_file + VALIDATORS_SUFFIX
+    if validators:
+        with AtomicFile(validators_file) as temp_file:
+            with open(temp_file, "w", encoding = "utf-8") as json_file:
+                json.dump(validators, json_file)
+    elif os.path.exists(validators_file):
+        os.remove(validators_file)
+
+
+# XML element for each column, with the default used when the element is missing (None when it is required) and the
+# conversion of its text. Names are interned so libraries sharing games share the strings.
+# The links of the XML are not kept, they all derive from the AppId, see add_links().
+GAME_ELEMENTS: dict[str, tuple[str, Any, Callable[..., Any]]] = {
+    'appID': ('AppId', None, int),
+    'name': ('Name', None, lambda text: sys.intern(_text(text))),
+    'hoursLast2Weeks': ('HoursLast2Weeks', 0.0, _hours),
+    'hoursOnRecord': ('HoursOnRecord', 0.0, _hours),
+    'statsLink': ('HasStats', False, bool)
+}
+
+GAME_COLUMNS = [column for column, _, _ in GAME_ELEMENTS.values()]
+
+GAME_DTYPES = {
+    'AppId': "int32",
+    'Name': "object",
+    'HoursLast2Weeks': "int32",
+    'HoursOnRecord': "int32",
+    'HasStats': "bool"
+}
+
+# steam_id is the steamID64 of the profile, stats links are only built for games with stats
+LINK_TEMPLATES = {
+    'LogoLink': 'https://cdn.cloudflare.steamstatic.com/steam/apps/{appid}/capsule_184x69.jpg',
+    'StoreLink': 'https://steamcommunity.com/app/{appid}',
+    'StatsLink': 'https://steamcommunity.com/profiles/{steam_id}/stats/{appid}',
+    'GlobalStatsLink': 'https://steamcommunity.com/stats/{appid}/achievements/'
+}
+
 
 class SteamXmlProcessor:
 
-    def __init__(self, data):
+    # data is the whole XML as a string. Alternatively, source is a filename or a binary file handle (e.g. an HTTP
+    # stream) which is parsed incrementally without ever holding the whole document.
+    # steam_id is set to the steamID64 of the profile once the XML is parsed.
+    def __init__(self, data = None, source = None):
         self.data = data
+        self.source = source
+        self.steam_id = None
 
     @classmethod
-    def from_file(cls, filename: str):
+    def from_file(cls, filename: str, streaming = False):
         if os.path.exists(filename):
+            if streaming:
+                return cls(source = filename)
             with open(filename, "r", encoding = "utf-8") as games_file:
                 return cls(games_file.read())
         else:
             raise Exception(f"{filename} does not exist")
 
     @classmethod
-    def from_username(cls, username: str, cache_file: str = ""):
-        xml_url = f'http://steamcommunity.com/id/{username}/games?tab=all&xml=1'
-        httpClient = SimpleHttpClient()
-        xml_contents = httpClient.get_request(xml_url, timeout = 5)
+    def from_stream(cls, stream):
+        return cls(source = stream)
 
+    # The XML is requested gzipped. When cache_file is already there, the request is conditional on the validators
+    # (ETag, Last-Modified) saved with it, an unchanged library is then answered with 304 Not Modified and cache_file
+    # is reused as is. With streaming, the response is decompressed on the fly into cache_file, or into the parser
+    # without cache_file, instead of being held in memory.
+    @classmethod
+    def from_username(cls, username: str, cache_file: str = "", http_client = None, streaming = False,
+                      community_url = STEAM_COMMUNITY_URL):
+        xml_url = f'{community_url}/id/{username}/games?tab=all&xml=1'
+        httpClient = http_client if http_client is not None else SimpleHttpClient()
+        headers = {"Accept-Encoding": "gzip"}
         if cache_file:
-            with open(cache_file, "w", encoding = "utf-8") as games_file:
-                games_file.write(xml_contents.text)
+            headers.update(_conditional_headers(cache_file))
+        xml_contents = httpClient.get_request(xml_url, timeout = 5, stream = streaming, headers = headers)
+
+        if xml_contents.status_code == 304:
+            xml_contents.close()
+            logging.info(f"{cache_file} is up to date")
+            return cls.from_file(cache_file, streaming = streaming)
+
+        if streaming:
+            xml_contents.raw.decode_content = True
+            if not cache_file:
+                return cls.from_stream(xml_contents.raw)
+            # Written aside first so an interrupted download never replaces a complete library
+            with AtomicFile(cache_file) as partial_file:
+                with open(partial_file, "wb") as games_file:
+                    shutil.copyfileobj(xml_contents.raw, games_file)
+            _save_validators(cache_file, xml_contents)
+            logging.info(f"Downloaded {cache_file}, {os.path.getsize(cache_file)} bytes "
+                         f"({xml_contents.raw.tell()} transferred)")
+            return cls.from_file(cache_file, streaming = True)
+
+        if cache_file:
+            with AtomicFile(cache_file) as temp_file:
+                with open(temp_file, "w", encoding = "utf-8") as games_file:
+                    games_file.write(xml_contents.text)
+            _save_validators(cache_file, xml_contents)
 
         return cls(xml_contents.text)
 
+    # Parses the XML incrementally and yields the games in batches of at most batch_size, each batch being a dict of
+    # column name -> list of values. Parsed elements are discarded as we go so memory use doesn't grow with the XML.
+    def iter_game_batches(self, batch_size = 10000):
+        columns: dict[str, list[Any]] = {column: [] for column in GAME_COLUMNS}
+        count = 0
+        stack = []
+
+        for event, element in ET.iterparse(self.source, events = ("start", "end")):
+            if event == "start":
+                stack.append(element)
+                continue
+
+            stack.pop()
+            depth = len(stack)
+            tag = element.tag
+
+            if depth == 1 and tag == 'error':
+                raise Exception("Root not found")
+
+            if depth == 1 and tag == 'steamID64':
+                self.steam_id = element.text
+            elif depth >= 2 and stack[-1].tag == 'game' and tag in GAME_ELEMENTS:
+                column_name, _, convert = GAME_ELEMENTS[tag]
+                column = columns[column_name]
+                # Ignore repeated elements, the first one wins like with find()
+                if len(column) == count:
+                    column.append(convert(element.text))
+            elif tag == 'game':
+                for child_tag, (column_name, default, _) in GAME_ELEMENTS.items():
+                    column = columns[column_name]
+                    if len(column) == count:
+                        if default is None:
+                            raise Exception(f"Missing {column_name} Node for game")
+                        column.append(default)
+                count += 1
+                # Drop the parsed games from the tree
+                stack[-1].clear()
+
+                if count == batch_size:
+                    yield columns
+                    columns = {column: [] for column in GAME_COLUMNS}
+                    count = 0
+
+        if count > 0:
+            yield columns
+
+    # AppId -> Name of every game, read incrementally without building a data frame
+    def get_game_names(self):
+        return {appid: game["Name"] for appid, game in self.get_game_details(["Name"]).items()}
+
+    # AppId -> dict of columns (see GAME_COLUMNS) of every game, read incrementally without building a data frame
+    def get_game_details(self, columns):
+        processor = self
+        if self.source is None:
+            import io
+            processor = SteamXmlProcessor(source = io.BytesIO(self.data.encode("utf-8")))
+
+        games = {}
+        for batch in processor.iter_game_batches():
+            for appid, *values in zip(batch["AppId"], *[batch[column] for column in columns]):
+                games[appid] = dict(zip(columns, values))
+        self.steam_id = processor.steam_id
+        return games
+
+    @staticmethod
+    def __to_frame(columns):
+        import pandas as pd
+
+        df = pd.DataFrame(columns)
+        df = df.astype(dtype = GAME_DTYPES)
+        df.set_index('AppId', inplace = True)
+        return df
+
+    def __get_game_infos_streaming(self):
+        columns: dict[str, list[Any]] = {column: [] for column in GAME_COLUMNS}
+        for batch in self.iter_game_batches():
+            for column, values in batch.items():
+                columns[column].extend(values)
+        return self.__to_frame(columns)
+
     # Reads the games XML returned from get_steam_xml() and outputs a pandas dataframe
     def get_game_infos(self):
+        if self.source is not None:
+            return self.__get_game_infos_streaming()
 
-        tree = ET.ElementTree(ET.fromstring(self.data))
-        root = tree.getroot()
+        root = ET.fromstring(self.data)
 
         if root.find('error') is not None:
             raise Exception("Root not found")
 
-        game_infos = []
+        steam_id_node = root.find('steamID64')
+        if steam_id_node is not None:
+            self.steam_id = steam_id_node.text
 
+        columns: dict[str, list[Any]] = {column: [] for column in GAME_COLUMNS}
         for game in root.iter('game'):
-            app_id_node = game.find('appID')
-            if app_id_node is None:
-                raise Exception("Missing AppId Node for game")
-            app_id = app_id_node.text
-
-            name_node = game.find('name')
-            if name_node is None:
-                raise Exception("Missing Name Node for game")
-            name = name_node.text
-
-            def propertyOrDefault(name, default: str) -> str:
-                name_node = game.find(name)
-                if name_node is None:
-                    return default
-
-                result = name_node.text
-                if result is None:
-                    return ""
-                return result
-
-            # Rest of these are optional
-            logo_link = propertyOrDefault('logo', '')
-            store_link = propertyOrDefault('storeLink', '')
-            hours_last_2_weeks = float(
-                propertyOrDefault('hoursLast2Weeks', '0.0'))
-            hours_on_record = float(propertyOrDefault('hoursOnRecord', '0.0'))
-            stats_link = propertyOrDefault('statsLink', '')
-            global_stats_link = propertyOrDefault('globalStatsLink', '')
-
-            game_infos.append(
-                (app_id, name, logo_link, store_link, hours_last_2_weeks,
-                 hours_on_record, stats_link, global_stats_link))
-
-        df = pd.DataFrame.from_records(game_infos,
-                                       columns = [
-                                           'AppId', 'Name', 'LogoLink',
-                                           'StoreLink', 'HoursLast2Weeks',
-                                           'HoursOnRecord', 'StatsLink',
-                                           'GlobalStatsLink'
-                                       ])
-        df = df.astype(
-            dtype = {
-                'AppId': "int64",
-                'Name': "object",
-                'LogoLink': "object",
-                'StoreLink': "object",
-                'HoursLast2Weeks': "int64",
-                'HoursOnRecord': "int64",
-                'StatsLink': "object",
-                'GlobalStatsLink': "object"
-            })
-        df.set_index('AppId', inplace = True)
+            for tag, (column_name, default, convert) in GAME_ELEMENTS.items():
+                node = game.find(tag)
+                if node is not None:
+                    columns[column_name].append(convert(node.text))
+                elif default is None:
+                    raise Exception(f"Missing {column_name} Node for game")
+                else:
+                    columns[column_name].append(default)
 
-        return df
+        return self.__to_frame(columns)
+
+    # Copy of game_infos with the link columns of the XML, built from the AppIds.
+    # Stats links are left empty for games without stats or when steam_id is unknown.
+    @staticmethod
+    def add_links(game_infos, steam_id = None):
+        import numpy as np
+
+        with_links = game_infos.copy()
+        has_stats = game_infos["HasStats"].to_numpy()
+        for column, template in LINK_TEMPLATES.items():
+            links = np.array([template.format(appid = appid, steam_id = steam_id) for appid in game_infos.index],
+                             dtype = object)
+            if column == 'StatsLink':
+                links = np.where(has_stats & (steam_id is not None), links, "")
+            elif column == 'GlobalStatsLink':
+                links = np.where(has_stats, links, "")
+            with_links[column] = links
+        return with_links
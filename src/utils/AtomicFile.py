@@ -0,0 +1,26 @@
+# Writes a file through a temporary file next to it, renamed over it once complete: readers never see a half written
+# file and processes writing the same file at once never write into each other's temporary file
+import os
+import tempfile
+
+
+class AtomicFile:
+
+    def __init__(self, filename):
+        self.filename = filename
+        self.temp_file = ""
+
+    # Gives the path of a new temporary file to write to, in the same directory so the rename stays on one file system
+    def __enter__(self):
+        directory, basename = os.path.split(self.filename)
+        descriptor, self.temp_file = tempfile.mkstemp(prefix = f"{basename}.", suffix = ".tmp", dir = directory or ".")
+        os.close(descriptor)
+        return self.temp_file
+
+    # The file is only replaced if the with block succeeded, the temporary file is removed either way
+    def __exit__(self, exc_type, exc_value, traceback):
+        if exc_type is None:
+            os.replace(self.temp_file, self.filename)
+        elif os.path.exists(self.temp_file):
+            os.remove(self.temp_file)
+        self.temp_file = ""
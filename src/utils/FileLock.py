@@ -0,0 +1,46 @@
+# Exclusive lock shared between processes, held by a with statement on a lock file next to what it protects
+import os
+import sys
+import time
+from typing import IO, Optional
+
+if sys.platform == "win32":
+    import msvcrt
+else:
+    import fcntl
+
+
+class FileLock:
+
+    # filename is the lock file, created if needed and left in place afterwards
+    def __init__(self, filename):
+        self.filename = filename
+        self._file: Optional[IO[bytes]] = None
+
+    def __enter__(self):
+        lock_file = open(self.filename, "a+b")
+        self._file = lock_file
+        if sys.platform == "win32":
+            # msvcrt gives up after 10 attempts in a row, keep trying until the lock is free
+            while True:
+                try:
+                    lock_file.seek(0, os.SEEK_SET)
+                    msvcrt.locking(lock_file.fileno(), msvcrt.LK_LOCK, 1)
+                    return self
+                except OSError:
+                    time.sleep(0.05)
+        else:
+            fcntl.flock(lock_file.fileno(), fcntl.LOCK_EX)
+            return self
+
+    def __exit__(self, *args):
+        lock_file = self._file
+        if lock_file is None:
+            return
+        if sys.platform == "win32":
+            lock_file.seek(0, os.SEEK_SET)
+            msvcrt.locking(lock_file.fileno(), msvcrt.LK_UNLCK, 1)
+        else:
+            fcntl.flock(lock_file.fileno(), fcntl.LOCK_UN)
+        lock_file.close()
+        self._file = None
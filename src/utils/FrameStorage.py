@@ -0,0 +1,80 @@
+# Saves and loads data frames as Parquet, Arrow IPC or CSV
+import os
+import importlib.util
+
+from utils.AtomicFile import AtomicFile
+
+FORMAT_EXTENSIONS = {"parquet": ".parquet", "arrow": ".arrow", "csv": ".csv"}
+
+# The columnar formats are asked for explicitly, what is written never depends on whether pyarrow is installed
+DEFAULT_FORMAT = "csv"
+
+
+class FrameStorage:
+
+    # pyarrow is optional, without it only CSV is available.
+    # pandas and pyarrow are only imported when a frame is saved or loaded.
+    @staticmethod
+    def columnar_available():
+        return importlib.util.find_spec("pyarrow") is not None
+
+    @staticmethod
+    def format_of(filename):
+        extension = os.path.splitext(filename)[1]
+        for format, format_extension in FORMAT_EXTENSIONS.items():
+            if extension == format_extension:
+                return format
+        raise Exception(f"Unknown storage format for {filename}")
+
+    @classmethod
+    def filename(cls, basename, format):
+        return f"{basename}{FORMAT_EXTENSIONS[format]}"
+
+    @classmethod
+    def __require_pyarrow(cls, format):
+        if not cls.columnar_available():
+            raise Exception(f"pyarrow is required to use the {format} format")
+
+    # Writes to a temporary file first so readers never see a half written file.
+    # The index and dtypes are preserved by the columnar formats.
+    @classmethod
+    def save(cls, frame, filename):
+        format = cls.format_of(filename)
+        if format != "csv":
+            cls.__require_pyarrow(format)
+        with AtomicFile(filename) as temp_file:
+            if format == "csv":
+                frame.to_csv(temp_file)
+            elif format == "parquet":
+                frame.to_parquet(temp_file)
+            else:
+                import pyarrow as pa
+                import pyarrow.ipc  # noqa: F401 (makes pa.ipc available)
+
+                # Uncompressed IPC file so it can be memory-mapped and read without copies
+                table = pa.Table.from_pandas(frame)
+                with pa.OSFile(temp_file, "wb") as sink:
+                    with pa.ipc.new_file(sink, table.schema) as writer:
+                        writer.write_table(table)
+
+    # index_col is only used for CSV, the columnar formats remember their index
+    @classmethod
+    def load(cls, filename, columns = None, index_col = 0):
+        import pandas as pd
+        format = cls.format_of(filename)
+        if format == "csv":
+            frame = pd.read_csv(filename, index_col = index_col)
+            return frame if columns is None else frame[columns]
+
+        cls.__require_pyarrow(format)
+        if format == "parquet":
+            return pd.read_parquet(filename, columns = columns, memory_map = True)
+
+        import pyarrow as pa
+        import pyarrow.ipc  # noqa: F401
+
+        table = pa.ipc.open_file(pa.memory_map(filename, "r")).read_all()
+        if columns is not None:
+            index_columns = [c for c in table.schema.pandas_metadata["index_columns"] if isinstance(c, str)]
+            table = table.select(index_columns + list(columns))
+        return table.to_pandas(split_blocks = True)
@@ -0,0 +1,113 @@
+# Collects where a run spends its time and memory and writes it as a JSON report
+import os
+import sys
+import json
+import time
+import logging
+import cProfile
+import contextlib
+from typing import Any
+
+from utils.AtomicFile import AtomicFile
+
+if sys.platform == "win32":
+    import ctypes
+    from ctypes import wintypes
+
+    # PROCESS_MEMORY_COUNTERS of GetProcessMemoryInfo
+    class _ProcessMemoryCounters(ctypes.Structure):
+        _fields_ = [("cb", wintypes.DWORD),
+                    ("PageFaultCount", wintypes.DWORD),
+                    ("PeakWorkingSetSize", ctypes.c_size_t),
+                    ("WorkingSetSize", ctypes.c_size_t),
+                    ("QuotaPeakPagedPoolUsage", ctypes.c_size_t),
+                    ("QuotaPagedPoolUsage", ctypes.c_size_t),
+                    ("QuotaPeakNonPagedPoolUsage", ctypes.c_size_t),
+                    ("QuotaNonPagedPoolUsage", ctypes.c_size_t),
+                    ("PagefileUsage", ctypes.c_size_t),
+                    ("PeakPagefileUsage", ctypes.c_size_t)]
+
+    _kernel32 = ctypes.WinDLL("kernel32")
+    _kernel32.GetCurrentProcess.restype = wintypes.HANDLE
+    _psapi = ctypes.WinDLL("psapi")
+    _psapi.GetProcessMemoryInfo.argtypes = [wintypes.HANDLE, ctypes.POINTER(_ProcessMemoryCounters), wintypes.DWORD]
+    _psapi.GetProcessMemoryInfo.restype = wintypes.BOOL
+else:
+    import resource
+
+
+class Instrumentation:
+
+    # Stages named in profile_stages (or every stage with "all") are also run under cProfile, their profiles are
+    # written to profile_directory/<stage>.prof and can be read with pstats or snakeviz. A stage run again is written
+    # to <stage>-2.prof, <stage>-3.prof...
+    def __init__(self, profile_stages = (), profile_directory = "."):
+        self.profile_stages = set(profile_stages)
+        self.profile_directory = profile_directory
+        self.stages: dict[str, dict[str, Any]] = {}
+        self.sections: dict[str, Any] = {}
+        self._profile_counts: dict[str, int] = {}
+        self._profiling = False
+        self._started = time.perf_counter()
+
+    def __should_profile(self, name):
+        # Only one profiler can run at a time, a stage nested in a profiled stage is part of its profile
+        return not self._profiling and ("all" in self.profile_stages or name in self.profile_stages)
+
+    # Times the body of the with block. Running the same stage again adds to its total.
+    @contextlib.contextmanager
+    def stage(self, name):
+        profiler = None
+        if self.__should_profile(name):
+            profiler = cProfile.Profile()
+            self._profiling = True
+            profiler.enable()
+
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.add_time(name, time.perf_counter() - start)
+            if profiler is not None:
+                profiler.disable()
+                self._profiling = False
+                count = self._profile_counts[name] = self._profile_counts.get(name, 0) + 1
+                suffix = f"-{count}" if count > 1 else ""
+                profile_file = os.path.join(self.profile_directory, f"{name.replace(':', '_')}{suffix}.prof")
+                profiler.dump_stats(profile_file)
+                logging.info(f"Profile of {name} written to {profile_file}")
+
+    # For stages timed elsewhere, e.g. charts rendered in other processes
+    def add_time(self, name, seconds):
+        entry = self.stages.setdefault(name, {"seconds": 0.0, "calls": 0})
+        entry["seconds"] += seconds
+        entry["calls"] += 1
+
+    # Any JSON serializable statistics, e.g. the counters of the HTTP client
+    def add_section(self, name, values):
+        self.sections[name] = values
+
+    # Peak resident memory of the process so far, None if the system doesn't tell
+    @staticmethod
+    def peak_memory_mb():
+        if sys.platform == "win32":
+            counters = _ProcessMemoryCounters()
+            counters.cb = ctypes.sizeof(counters)
+            if not _psapi.GetProcessMemoryInfo(_kernel32.GetCurrentProcess(), ctypes.byref(counters), counters.cb):
+                return None
+            return counters.PeakWorkingSetSize / (1024 * 1024)
+        else:
+            # ru_maxrss is in kilobytes on Linux and bytes on macOS
+            peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+            return peak / (1024 * 1024) if sys.platform == "darwin" else peak / 1024
+
+    def report(self):
+        return dict(self.sections,
+                    total_seconds = time.perf_counter() - self._started,
+                    peak_memory_mb = self.peak_memory_mb(),
+                    stages = self.stages)
+
+    def save(self, filename):
+        with AtomicFile(filename) as temp_file:
+            with open(temp_file, "w", encoding = "utf-8") as report_file:
+                json.dump(self.report(), report_file, indent = 2)
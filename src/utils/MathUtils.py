@@ -1,31 +1,65 @@
+import numpy as np
+
+
 class MathUtils:
 
-    # Add a Bayesian average to better rank the games
+    # Add a Bayesian average to better rank the games.
+    # Works on whole arrays: each item's ratio is pulled towards prior_mean, the less ratings it has compared to
+    # prior_weight the stronger the pull.
     @classmethod
-    def __calculate_bayesian_average(cls, item_num_ratings, item_ratio_ratings,
-                                     system_avg_num_ratings,
-                                     system_ratio_ratings):
-        b_avg = (((item_num_ratings) /
-                  (item_num_ratings + system_avg_num_ratings)) *
-                 item_ratio_ratings) + (
-                     ((system_avg_num_ratings) /
-                      (item_num_ratings + system_avg_num_ratings)) *
-                     system_ratio_ratings)
+    def calculate_bayesian_average(cls, item_num_ratings, item_ratio_ratings,
+                                   prior_weight, prior_mean):
+        item_num_ratings = np.asarray(item_num_ratings, dtype = np.float64)
+        item_ratio_ratings = np.asarray(item_ratio_ratings, dtype = np.float64)
+        with np.errstate(divide = "ignore", invalid = "ignore"):
+            total = item_num_ratings + prior_weight
+            b_avg = ((item_num_ratings / total) * item_ratio_ratings) + (
+                (prior_weight / total) * prior_mean)
         return b_avg
 
+    # Default priors are the system averages: the mean ratio and the mean number of ratings.
+    # prior_mean overrides the ratio items are pulled towards, prior_weight the number of ratings an item needs before
+    # its own ratio counts as much as the prior (a confidence threshold).
     @classmethod
-    def add_bayesian_average_to_gamespy_dataframe(cls, to_decorate):
+    def add_bayesian_average_to_gamespy_dataframe(cls, to_decorate,
+                                                  prior_mean = None,
+                                                  prior_weight = None):
         # Calculate an overall average for the system
-        system_ratings_avg = to_decorate["RatingsRatio"].mean()
-        system_num_ratings_avg = to_decorate["TotalRatings"].mean()
-
-        # Calculate Bayesian average
-        b_averages = list(
-            to_decorate.apply(lambda row: cls.__calculate_bayesian_average(
-                row["TotalRatings"], row["RatingsRatio"],
-                system_num_ratings_avg, system_ratings_avg),
-                              axis = 1))
+        if prior_mean is None:
+            prior_mean = to_decorate["RatingsRatio"].mean()
+        if prior_weight is None:
+            prior_weight = to_decorate["TotalRatings"].mean()
 
         # Add the new averages to the data frame
-        to_decorate['BayesianAverage'] = b_averages
+        to_decorate['BayesianAverage'] = cls.calculate_bayesian_average(
+            to_decorate["TotalRatings"].to_numpy(),
+            to_decorate["RatingsRatio"].to_numpy(), prior_weight, prior_mean)
         return to_decorate
+
+    # System averages over data frames too large for memory, returns (prior_mean, prior_weight).
+    # Missing values are skipped like pandas' mean() does.
+    @classmethod
+    def calculate_system_priors(cls, chunks):
+        ratio_sum = 0.0
+        ratio_count = 0
+        num_sum = 0.0
+        num_count = 0
+        for chunk in chunks:
+            ratios = chunk["RatingsRatio"].to_numpy(dtype = np.float64)
+            nums = chunk["TotalRatings"].to_numpy(dtype = np.float64)
+            ratio_sum += np.nansum(ratios)
+            ratio_count += np.count_nonzero(~np.isnan(ratios))
+            num_sum += np.nansum(nums)
+            num_count += np.count_nonzero(~np.isnan(nums))
+
+        prior_mean = ratio_sum / ratio_count if ratio_count else np.nan
+        prior_weight = num_sum / num_count if num_count else np.nan
+        return prior_mean, prior_weight
+
+    # Decorate an iterator of data frames, e.g. pd.read_csv(..., chunksize = N).
+    # The priors have to be known up front, use calculate_system_priors() on a first pass for the system averages.
+    @classmethod
+    def add_bayesian_average_to_chunks(cls, chunks, prior_mean, prior_weight):
+        for chunk in chunks:
+            yield cls.add_bayesian_average_to_gamespy_dataframe(
+                chunk, prior_mean = prior_mean, prior_weight = prior_weight)
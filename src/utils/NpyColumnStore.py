@@ -0,0 +1,60 @@
+# Stores a data frame as one .npy file per column so other processes can memory-map it instead of unpickling it
+import os
+import json
+from typing import Any
+
+import numpy as np
+import pandas as pd
+
+INDEX_FILE = "__index__.npy"
+LAYOUT_FILE = "columns.json"
+
+
+class NpyColumnStore:
+
+    @staticmethod
+    def __to_array(series):
+        if series.dtype == object:
+            # Strings are stored as fixed width unicode so they can be mapped, missing values are kept in a mask
+            return series.fillna("").astype(str).to_numpy(dtype = str), series.isna().to_numpy()
+        return series.to_numpy(), None
+
+    @classmethod
+    def save(cls, frame, directory):
+        os.makedirs(directory, exist_ok = True)
+        layout: dict[str, Any] = {"index": frame.index.name, "columns": [], "masked": []}
+
+        index, _ = cls.__to_array(frame.index.to_series())
+        np.save(os.path.join(directory, INDEX_FILE), index)
+
+        for position, column in enumerate(frame.columns):
+            values, mask = cls.__to_array(frame.iloc[:, position])
+            np.save(os.path.join(directory, f"{position}.npy"), values)
+            if mask is not None and mask.any():
+                np.save(os.path.join(directory, f"{position}.mask.npy"), mask)
+                layout["masked"].append(column)
+            layout["columns"].append(column)
+
+        with open(os.path.join(directory, LAYOUT_FILE), "w", encoding = "utf-8") as layout_file:
+            json.dump(layout, layout_file)
+
+    # Loads the columns (all by default) memory-mapped, only the pages actually read are loaded from disk
+    @classmethod
+    def load(cls, directory, columns = None):
+        with open(os.path.join(directory, LAYOUT_FILE), "r", encoding = "utf-8") as layout_file:
+            layout = json.load(layout_file)
+
+        data = {}
+        for position, column in enumerate(layout["columns"]):
+            if columns is not None and column not in columns:
+                continue
+            values = np.load(os.path.join(directory, f"{position}.npy"), mmap_mode = "r")
+            if values.dtype.kind == "U":
+                values = values.astype(object)
+                if column in layout["masked"]:
+                    mask = np.load(os.path.join(directory, f"{position}.mask.npy"))
+                    values[mask] = None
+            data[column] = values
+
+        index = np.load(os.path.join(directory, INDEX_FILE), mmap_mode = "r")
+        return pd.DataFrame(data, index = pd.Index(index, name = layout["index"]), copy = False)
@@ -0,0 +1,92 @@
+# Answers "top K games by metric among these" without sorting the whole library
+import numpy as np
+import numpy.typing as npt
+
+RANKED_METRICS = ["BayesianAverage", "RatingsRatio", "HoursOnRecord", "HoursLast2Weeks"]
+
+
+class RankingIndex:
+
+    # Rows are identified by their position in frame. With precompute, the descending order of every metric is
+    # computed up front and each query only filters it, which pays off when many queries are made on the same frame
+    # (e.g. a server). Otherwise each query selects its top K with a partial selection, linear in the candidates.
+    # Either way, ties keep the row order and missing values are never ranked, like pandas' nlargest().
+    def __init__(self, frame, metrics = RANKED_METRICS, precompute = False):
+        self.length = len(frame)
+        self._values = {metric: frame[metric].to_numpy() for metric in metrics if metric in frame}
+        self._orders: dict[str, tuple[npt.NDArray[np.intp], int]] = {}
+        if precompute:
+            for metric in self._values:
+                self.order(metric)
+
+    def __values(self, metric):
+        if metric not in self._values:
+            raise Exception(f"{metric} is not ranked")
+        return self._values[metric]
+
+    @staticmethod
+    def __valid(values):
+        return ~np.isnan(values) if values.dtype.kind == "f" else np.ones(len(values), dtype = bool)
+
+    # Positions of every row in descending order of metric, missing values last.
+    # Computed once per metric and kept.
+    def order(self, metric):
+        if metric not in self._orders:
+            values = self.__values(metric)
+            # Stable so ties keep the row order, NaN sort last
+            order = np.argsort(-values, kind = "stable")
+            self._orders[metric] = (order, int(np.count_nonzero(self.__valid(values))))
+        return self._orders[metric][0]
+
+    def is_precomputed(self, metric):
+        return metric in self._orders
+
+    # Positions of the k rows with the largest metric among mask (a boolean array, all rows when None), in
+    # descending order. k = None returns every row of mask with a value.
+    def top_k(self, metric, k = None, mask = None):
+        values = self.__values(metric)
+        if mask is not None and len(mask) != self.length:
+            raise Exception(f"Mask of {len(mask)} rows for {self.length} rows")
+
+        if metric in self._orders:
+            order, valid_count = self._orders[metric]
+            order = order[:valid_count]
+            if mask is not None:
+                order = order[mask[order]] if k is None else self.__filter_head(order, mask, k)
+            return order if k is None else order[:k]
+
+        valid = self.__valid(values)
+        candidates = np.flatnonzero(valid if mask is None else valid & mask)
+        return self.__select(values, candidates, k)
+
+    # The first k positions of order in mask. The order is read in growing chunks since the top rows of a mask are
+    # usually found long before the end.
+    @staticmethod
+    def __filter_head(order, mask, k):
+        found = []
+        count = 0
+        start = 0
+        chunk = max(4 * k, 1024)
+        while start < len(order) and count < k:
+            part = order[start:start + chunk]
+            part = part[mask[part]]
+            found.append(part)
+            count += len(part)
+            start += chunk
+            chunk *= 2
+        return np.concatenate(found) if found else order[:0]
+
+    @staticmethod
+    def __select(values, candidates, k):
+        candidate_values = values[candidates]
+        if k is not None and len(candidates) > k:
+            if k <= 0:
+                return candidates[:0]
+            # Everything above the k-th largest value is in, values equal to it are taken in row order
+            threshold = np.partition(candidate_values, len(candidate_values) - k)[len(candidate_values) - k]
+            keep = candidate_values > threshold
+            ties = np.flatnonzero(candidate_values == threshold)[:k - np.count_nonzero(keep)]
+            keep[ties] = True
+            candidates = candidates[keep]
+            candidate_values = candidate_values[keep]
+        return candidates[np.argsort(-candidate_values, kind = "stable")]
@@ -0,0 +1,56 @@
+# Remembers the fingerprints of the inputs each stage of the last run was computed from
+import os
+import json
+import hashlib
+
+from utils.AtomicFile import AtomicFile
+
+
+class RunManifest:
+
+    def __init__(self, filename):
+        self.filename = filename
+        self.stages = {}
+        if os.path.exists(filename):
+            with open(filename, "r", encoding = "utf-8") as manifest_file:
+                self.stages = json.load(manifest_file)
+
+    # Hash of any JSON serializable values
+    @staticmethod
+    def fingerprint(*parts):
+        return hashlib.sha256(json.dumps(parts, sort_keys = True, default = str).encode("utf-8")).hexdigest()
+
+    @staticmethod
+    def file_fingerprint(filename):
+        digest = hashlib.sha256()
+        with open(filename, "rb") as input_file:
+            for chunk in iter(lambda: input_file.read(1024 * 1024), b""):
+                digest.update(chunk)
+        return digest.hexdigest()
+
+    # Hash of the index, column names and values of a data frame
+    @staticmethod
+    def frame_fingerprint(frame):
+        import pandas as pd
+
+        digest = hashlib.sha256(json.dumps([str(c) for c in frame.columns]).encode("utf-8"))
+        digest.update(pd.util.hash_pandas_object(frame, index = True).to_numpy().tobytes())
+        return digest.hexdigest()
+
+    def get(self, stage):
+        return self.stages.get(stage)
+
+    # True when the stage last ran with the same fingerprint and its outputs are still there
+    def is_fresh(self, stage, fingerprint, outputs = ()):
+        entry = self.stages.get(stage)
+        if entry is None or entry["fingerprint"] != fingerprint:
+            return False
+        return all(os.path.exists(output) for output in outputs)
+
+    def record(self, stage, fingerprint, **extra):
+        self.stages[stage] = dict(extra, fingerprint = fingerprint)
+
+    def save(self):
+        with AtomicFile(self.filename) as temp_file:
+            with open(temp_file, "w", encoding = "utf-8") as manifest_file:
+                json.dump(self.stages, manifest_file)
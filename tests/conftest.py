@@ -0,0 +1,5 @@
+import os
+import sys
+
+# The steam, utils and graphing packages are not installed, make them importable from src
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "src"))
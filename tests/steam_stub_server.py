@@ -0,0 +1,260 @@
+# Local stand-in for the SteamSpy API and the Steam Community games XML used by the tests and benchmarks
+import gzip
+import json
+import time
+import hashlib
+import threading
+from email.utils import formatdate, parsedate_to_datetime
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import urlparse, parse_qs
+
+
+def make_app_details(appid):
+    appid = int(appid)
+    return {
+        "appid": appid,
+        "name": f"Game {appid}",
+        "positive": appid * 10,
+        "negative": appid,
+        "userscore": 0,
+        "average_forever": appid,
+        "average_2weeks": 0,
+        "median_forever": appid,
+        "median_2weeks": 0
+    }
+
+
+GAME_TEMPLATE = """        <game>
+            <appID>{appid}</appID>
+            <name><![CDATA[Synthetic Game {appid}]]></name>
+            <logo><![CDATA[https://cdn.cloudflare.steamstatic.com/steam/apps/{appid}/capsule_184x69.jpg]]></logo>
+            <storeLink><![CDATA[https://steamcommunity.com/app/{appid}]]></storeLink>
+            <hoursLast2Weeks>{recent}</hoursLast2Weeks>
+            <hoursOnRecord>{hours}</hoursOnRecord>
+            <statsLink><![CDATA[https://steamcommunity.com/id/someone/stats/{appid}]]></statsLink>
+            <globalStatsLink><![CDATA[https://steamcommunity.com/stats/{appid}/achievements/]]></globalStatsLink>
+        </game>
+"""
+
+PROFILE_NOT_FOUND_XML = "<response><error><![CDATA[The specified profile could not be found.]]></error></response>"
+
+
+# Synthetic games XML of a library with games games, AppIds are multiples of 10 and about a third are unplayed
+def iter_games_xml(games):
+    yield '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>\n<gamesList>\n'
+    yield "    <steamID64>76561197960287930</steamID64>\n    <games>\n"
+    for appid in range(10, (games + 1) * 10, 10):
+        hours = 0 if appid % 30 == 0 else appid % 997 * 1.1
+        yield GAME_TEMPLATE.format(appid = appid, recent = appid % 7 * 0.5, hours = hours)
+    yield "    </games>\n</gamesList>\n"
+
+
+def make_games_xml(games):
+    return "".join(iter_games_xml(games))
+
+
+class SteamStubServer:
+
+    # Allows at most quota_requests in every quota_window seconds, anything above gets a 429
+    # Requests for failing_appids always get a 500, empty_appids get {} like apps SteamSpy doesn't know and
+    # malformed_appids get details without any of the usual fields
+    # bulk_appids are served by the paginated "all" request, page_size apps per page, malformed_bulk_appids among them
+    # without any of the usual fields
+    # libraries maps usernames to the games XML served at /id/<username>/games, like the Steam Community does. It's
+    # served with an ETag and a Last-Modified, honors conditional requests and is gzipped when the client accepts it.
+    # Every response is delayed by latency seconds
+    def __init__(self,
+                 quota_requests = None,
+                 quota_window = 1.0,
+                 failing_appids = (),
+                 empty_appids = (),
+                 malformed_appids = (),
+                 bulk_appids = (),
+                 malformed_bulk_appids = (),
+                 page_size = 1000,
+                 libraries = None,
+                 latency = 0.0):
+        self.quota_requests = quota_requests
+        self.quota_window = quota_window
+        self.failing_appids = set(str(appid) for appid in failing_appids)
+        self.empty_appids = set(str(appid) for appid in empty_appids)
+        self.malformed_appids = set(str(appid) for appid in malformed_appids)
+        self.bulk_appids = list(bulk_appids)
+        self.malformed_bulk_appids = set(malformed_bulk_appids)
+        self.page_size = page_size
+        self.libraries = {}
+        self.latency = latency
+        self.not_modified_count = 0
+        self.gzipped_count = 0
+        self.library_bytes_sent = 0
+        self.all_requests = 0
+        self.request_count = 0
+        self.throttled_count = 0
+        self.max_in_flight = 0
+        self.app_details_requests = {}
+        self.connections = set()
+
+        self._in_flight = 0
+        self._window = []
+        self._lock = threading.Lock()
+        # username -> ETag, modification time and the gzipped XML once it's been asked for
+        self._library_versions = {}
+        for username, xml in (libraries or {}).items():
+            self.set_library(username, xml)
+        self._server = ThreadingHTTPServer(("127.0.0.1", 0), self.__make_handler())
+        self._server.daemon_threads = True
+        self._thread = None
+
+    @property
+    def url(self):
+        return f"http://127.0.0.1:{self._server.server_address[1]}"
+
+    @property
+    def api_url(self):
+        return f"{self.url}/api.php"
+
+    def __enter__(self):
+        self._thread = threading.Thread(target = self._server.serve_forever, daemon = True)
+        self._thread.start()
+        return self
+
+    def __exit__(self, *args):
+        self._server.shutdown()
+        self._server.server_close()
+
+    # Replaces the library of username, clients holding the previous validators get it again
+    def set_library(self, username, xml):
+        body = xml.encode("utf-8") if isinstance(xml, str) else xml
+        with self._lock:
+            self.libraries[username] = body
+            previous = self._library_versions.get(username)
+            # Last-Modified only has a one second resolution, make sure it moves
+            modified = int(time.time()) if previous is None else max(int(time.time()), previous[1] + 1)
+            self._library_versions[username] = [f'"{hashlib.sha1(body).hexdigest()}"', modified, None]
+
+    @staticmethod
+    def _not_modified(headers, etag, modified):
+        if_none_match = headers.get("If-None-Match")
+        # If-None-Match wins over If-Modified-Since when both are sent
+        if if_none_match is not None:
+            return if_none_match.strip() == "*" or etag in [tag.strip() for tag in if_none_match.split(",")]
+        if_modified_since = headers.get("If-Modified-Since")
+        if if_modified_since is not None:
+            try:
+                return modified <= parsedate_to_datetime(if_modified_since).timestamp()
+            except (TypeError, ValueError):
+                return False
+        return False
+
+    def _over_quota(self):
+        if self.quota_requests is None:
+            return False
+        now = time.monotonic()
+        self._window = [t for t in self._window if now - t < self.quota_window]
+        if len(self._window) >= self.quota_requests:
+            return True
+        self._window.append(now)
+        return False
+
+    def __make_handler(self):
+        stub = self
+
+        class Handler(BaseHTTPRequestHandler):
+
+            # Keep connections alive like the real servers do
+            protocol_version = "HTTP/1.1"
+
+            def log_message(self, format, *args):
+                pass
+
+            def _send_json(self, status, payload, headers = None):
+                self._send(status, json.dumps(payload).encode("utf-8"), "application/json", headers)
+
+            def _send(self, status, body, content_type, headers = None):
+                self.send_response(status)
+                self.send_header("Content-Type", content_type)
+                self.send_header("Content-Length", str(len(body)))
+                for key, value in (headers or {}).items():
+                    self.send_header(key, value)
+                self.end_headers()
+                self.wfile.write(body)
+
+            def _send_library(self, username):
+                with stub._lock:
+                    body = stub.libraries.get(username)
+                    version = stub._library_versions.get(username)
+                if body is None:
+                    self._send(200, PROFILE_NOT_FOUND_XML.encode("utf-8"), "text/xml; charset=utf-8")
+                    return
+
+                etag, modified = version[0], version[1]
+                validators = {"ETag": etag, "Last-Modified": formatdate(modified, usegmt = True)}
+                if stub._not_modified(self.headers, etag, modified):
+                    with stub._lock:
+                        stub.not_modified_count += 1
+                    self.send_response(304)
+                    for key, value in validators.items():
+                        self.send_header(key, value)
+                    self.end_headers()
+                    return
+
+                gzipped = "gzip" in self.headers.get("Accept-Encoding", "")
+                if gzipped:
+                    # Compressed once per version, two requests racing for it both compress the same thing
+                    if version[2] is None:
+                        version[2] = gzip.compress(body, compresslevel = 6)
+                    body = version[2]
+                    validators["Content-Encoding"] = "gzip"
+                with stub._lock:
+                    stub.gzipped_count += gzipped
+                    stub.library_bytes_sent += len(body)
+                self._send(200, body, "text/xml; charset=utf-8", validators)
+
+            def do_GET(self):
+                parsed = urlparse(self.path)
+                query = {k: v[0] for k, v in parse_qs(parsed.query).items()}
+
+                with stub._lock:
+                    stub.request_count += 1
+                    stub.connections.add(self.client_address)
+                    stub._in_flight += 1
+                    stub.max_in_flight = max(stub.max_in_flight, stub._in_flight)
+                    throttled = stub._over_quota()
+                    if throttled:
+                        stub.throttled_count += 1
+                try:
+                    if stub.latency:
+                        time.sleep(stub.latency)
+                    path = parsed.path.strip("/").split("/")
+
+                    if throttled:
+                        self._send_json(429, {}, {"Retry-After": str(stub.quota_window)})
+                    elif parsed.path == "/api.php" and query.get("request") == "appdetails":
+                        appid = query["appid"]
+                        with stub._lock:
+                            stub.app_details_requests[appid] = stub.app_details_requests.get(appid, 0) + 1
+                        if appid in stub.failing_appids:
+                            self._send_json(500, {})
+                        elif appid in stub.empty_appids:
+                            self._send_json(200, {})
+                        elif appid in stub.malformed_appids:
+                            self._send_json(200, {"appid": int(appid)})
+                        else:
+                            self._send_json(200, make_app_details(appid))
+                    elif parsed.path == "/api.php" and query.get("request") == "all":
+                        page = int(query.get("page", 0))
+                        with stub._lock:
+                            stub.all_requests += 1
+                        appids = stub.bulk_appids[page * stub.page_size:(page + 1) * stub.page_size]
+                        self._send_json(200, {str(appid): make_app_details(appid)
+                                              if appid not in stub.malformed_bulk_appids else {"appid": appid}
+                                              for appid in appids})
+                    elif len(path) == 3 and path[0] == "id" and path[2] == "games" and query.get("xml") == "1":
+                        self._send_library(path[1])
+                    else:
+                        self._send_json(404, {})
+                finally:
+                    with stub._lock:
+                        stub._in_flight -= 1
+
+        return Handler
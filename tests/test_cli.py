@@ -0,0 +1,72 @@
+import os
+import sys
+import functools
+import subprocess
+
+import pytest
+
+import steam.SteamSpyQuery
+from main import parse_arguments, library_file_for_user, main_batch, decorated_file
+from steam.SteamXmlProcessor import SteamXmlProcessor
+from steam_stub_server import SteamStubServer, make_games_xml
+
+SRC_DIRECTORY = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "src")
+
+
+def test_run_is_the_default_command():
+    assert parse_arguments([]).command == "run"
+    args = parse_arguments(["user1", "user2", "--no-charts"])
+    assert args.command == "run"
+    assert args.usernames == ["user1", "user2"]
+    assert args.no_charts
+
+    args = parse_arguments(["fetch", "--bulk"])
+    assert args.command == "fetch"
+    assert args.bulk
+
+    args = parse_arguments(["serve", "--port", "0"])
+    assert args.command == "serve"
+    assert args.port == 0
+
+
+def test_fetch_path_does_not_import_pandas_or_bokeh():
+    code = ("import sys; import main; import steam.SteamSpyQuery, steam.SteamXmlProcessor; "
+            "print(sorted(m for m in ['pandas', 'numpy', 'bokeh'] if m in sys.modules))")
+    output = subprocess.run([sys.executable, "-c", code], cwd = SRC_DIRECTORY,
+                            check = True, capture_output = True, text = True).stdout
+    assert output.strip() == "[]"
+
+
+def test_main_does_not_import_requests():
+    # render and report never make a request
+    code = "import sys; import main; print('requests' in sys.modules)"
+    output = subprocess.run([sys.executable, "-c", code], cwd = SRC_DIRECTORY,
+                            check = True, capture_output = True, text = True).stdout
+    assert output.strip() == "False"
+
+
+def test_missing_library_is_not_downloaded_without_download(tmp_path):
+    with pytest.raises(Exception, match = "run the fetch command first"):
+        library_file_for_user(str(tmp_path), username = "someone", download = False)
+
+
+def test_batch_queries_shared_games_once(tmp_path, monkeypatch):
+    # setup() works from the data folder of the current directory, which joins paths with backslashes like Windows
+    work_directory = tmp_path / "work"
+    work_directory.mkdir()
+    monkeypatch.chdir(work_directory)
+    data_directory = f"{os.getcwd()}\\data"
+    os.makedirs(data_directory)
+    with SteamStubServer(libraries = {"alice": make_games_xml(8), "bob": make_games_xml(5)}) as server:
+        monkeypatch.setattr(SteamXmlProcessor, "from_username",
+                            functools.partial(SteamXmlProcessor.from_username, community_url = server.url))
+        monkeypatch.setattr(steam.SteamSpyQuery, "SteamSpyQuery",
+                            functools.partial(steam.SteamSpyQuery.SteamSpyQuery, api_url = server.api_url,
+                                              requests_per_second = 1000))
+        # A profile that can't be read doesn't stop the others
+        main_batch(["alice", "ghost", "bob"], charts = False)
+
+    assert server.app_details_requests == {str(appid): 1 for appid in range(10, 90, 10)}
+    for username in ["alice", "bob"]:
+        assert os.path.exists(decorated_file(os.path.join(data_directory, username), "csv"))
+    assert not os.path.exists(os.path.join(data_directory, "ghost"))
@@ -0,0 +1,20 @@
+from steam.FetchScheduler import FetchScheduler
+
+
+def test_recent_then_most_played_then_stale_first():
+    games = {
+        1: {"Name": "Never played", "HoursLast2Weeks": 0, "HoursOnRecord": 0, "Stale": False},
+        2: {"Name": "Played long ago", "HoursLast2Weeks": 0, "HoursOnRecord": 50, "Stale": False},
+        3: {"Name": "Played this week", "HoursLast2Weeks": 2, "HoursOnRecord": 10, "Stale": False},
+        4: {"Name": "Never played, stale", "HoursLast2Weeks": 0, "HoursOnRecord": 0, "Stale": True},
+        5: {"Name": "Never played either", "HoursLast2Weeks": 0, "HoursOnRecord": 0, "Stale": False}
+    }
+    assert FetchScheduler().schedule(games) == [3, 2, 4, 1, 5]
+
+
+def test_budget_spans_the_run():
+    scheduler = FetchScheduler(priority = lambda game: -game["Order"], request_budget = 3)
+    assert scheduler.schedule({appid: {"Order": appid} for appid in [5, 1, 3, 2]}) == [1, 2, 3]
+    assert scheduler.schedule({6: {"Order": 6}}) == []
+    assert scheduler.deferred == 2
+    assert scheduler.remaining == 0
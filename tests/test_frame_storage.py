@@ -0,0 +1,52 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+from utils.AtomicFile import AtomicFile
+from utils.FrameStorage import FrameStorage
+
+
+def make_frame():
+    return pd.DataFrame({
+        "AppId": [10, 20, 30],
+        "Name": ["Counter-Strike", None, "Day of Defeat"],
+        "HoursOnRecord": np.array([250, 0, 3], dtype = np.int32),
+        "RatingsRatio": np.array([97.5, np.nan, 80.25], dtype = np.float32)
+    }).set_index("AppId")
+
+
+@pytest.mark.parametrize("format", ["arrow", "parquet"])
+def test_columnar_round_trip_keeps_dtypes(tmp_path, format):
+    pytest.importorskip("pyarrow")
+    frame = make_frame()
+    filename = FrameStorage.filename(str(tmp_path / "games"), format)
+    FrameStorage.save(frame, filename)
+
+    pd.testing.assert_frame_equal(FrameStorage.load(filename), frame)
+    pd.testing.assert_frame_equal(FrameStorage.load(filename, columns = ["RatingsRatio"]), frame[["RatingsRatio"]])
+
+
+def test_csv_round_trip(tmp_path):
+    frame = make_frame()
+    filename = str(tmp_path / "games.csv")
+    FrameStorage.save(frame, filename)
+
+    loaded = FrameStorage.load(filename)
+    assert list(loaded.index) == [10, 20, 30]
+    assert list(loaded["HoursOnRecord"]) == [250, 0, 3]
+
+
+def test_failed_writes_leave_the_file_as_is(tmp_path):
+    filename = str(tmp_path / "frame.csv")
+    FrameStorage.save(make_frame(), filename)
+
+    # Every write has its own temporary file, which is gone whatever happens
+    with pytest.raises(ValueError):
+        with AtomicFile(filename) as first, AtomicFile(filename) as second:
+            assert first != second
+            with open(first, "w", encoding = "utf-8") as partial:
+                partial.write("AppId,Na")
+            raise ValueError()
+
+    assert sorted(path.name for path in tmp_path.iterdir()) == ["frame.csv"]
+    assert list(FrameStorage.load(filename).index) == [10, 20, 30]
@@ -0,0 +1,78 @@
+import os
+
+import numpy as np
+import pandas as pd
+
+from graphing.SteamDataBokehGraphGenerator import SteamDataBokehGraphGenerator
+
+CHARTS = [
+    "MostPlayed.html", "MostPlayedLast2Weeks.html", "MostPlayedVsRating.html",
+    "UnplayedPlainRating.html", "UnplayedBayesian.html"
+]
+
+
+def make_decorated_game_infos(games):
+    rng = np.random.default_rng(0)
+    appids = np.arange(10, (games + 1) * 10, 10)
+    hours = rng.integers(0, 300, size = games)
+    hours[::3] = 0
+    return pd.DataFrame({
+        "AppId": appids,
+        "Name": [f"Game {appid}" for appid in appids],
+        "HoursOnRecord": hours,
+        "HoursLast2Weeks": np.where(np.arange(games) % 5 == 0, hours // 10, 0),
+        "RatingsRatio": rng.uniform(0, 100, size = games),
+        "BayesianAverage": rng.uniform(0, 100, size = games)
+    }).set_index("AppId")
+
+
+def test_render_all(tmp_path):
+    games = make_decorated_game_infos(200)
+    SteamDataBokehGraphGenerator(games, str(tmp_path)).render_all()
+
+    for chart in CHARTS:
+        assert os.path.exists(tmp_path / chart)
+
+    # Played games never show up as unplayed
+    unplayed = (tmp_path / "UnplayedBayesian.html").read_text(encoding = "utf-8")
+    played_name = games[games["HoursOnRecord"] > 0]["Name"].iloc[0]
+    assert f'"{played_name}"' not in unplayed
+
+
+def test_top_games_are_kept(tmp_path):
+    games = make_decorated_game_infos(200)
+    generator = SteamDataBokehGraphGenerator(games, str(tmp_path))
+    generator.generate_most_played_games_graph()
+
+    html = (tmp_path / "MostPlayed.html").read_text(encoding = "utf-8")
+    for name in games.nlargest(50, "HoursOnRecord")["Name"]:
+        assert f'"{name}"' in html
+
+
+def test_recent_games_are_capped(tmp_path):
+    games = make_decorated_game_infos(2000)
+    SteamDataBokehGraphGenerator(games, str(tmp_path)).generate_most_played_games_2weeks_graph()
+
+    html = (tmp_path / "MostPlayedLast2Weeks.html").read_text(encoding = "utf-8")
+    recent = games[games["HoursLast2Weeks"] > 0]
+    ordered = recent.sort_values("HoursLast2Weeks", ascending = False, kind = "stable")
+    assert f'"{ordered["Name"].iloc[0]}"' in html
+    assert f'"{ordered["Name"].iloc[-1]}"' not in html
+
+
+def test_large_library_is_binned(tmp_path):
+    games = make_decorated_game_infos(20000)
+    os.makedirs(tmp_path / "binned")
+    os.makedirs(tmp_path / "glyphs")
+    SteamDataBokehGraphGenerator(games, str(tmp_path / "binned"),
+                                 density_threshold = 1000).generate_most_played_games_versus_rating_graph()
+    SteamDataBokehGraphGenerator(games, str(tmp_path / "glyphs"),
+                                 density_threshold = len(games)).generate_most_played_games_versus_rating_graph()
+
+    binned = tmp_path / "binned" / "MostPlayedVsRating.html"
+    html = binned.read_text(encoding = "utf-8")
+    assert "webgl" in html
+    # Only the most played games are drawn one by one, the others are part of the density image
+    assert f'"{games.loc[games["HoursOnRecord"].idxmax(), "Name"]}"' in html
+    assert f'"{games[games["HoursOnRecord"] == 0]["Name"].iloc[0]}"' not in html
+    assert os.path.getsize(binned) < os.path.getsize(tmp_path / "glyphs" / "MostPlayedVsRating.html") / 2
@@ -1,8 +1,49 @@
+import time
+
+import pytest
+from requests.exceptions import HTTPError
+
 from simplehttp.SimpleHttpClient import SimpleHttpClient
+from steam_stub_server import SteamStubServer
 
 
 def test_client():
     client = SimpleHttpClient()
-    query = client.get_request(url = "http://www.google.com")
-    print(query)
+    with SteamStubServer() as server:
+        query = client.get_request(url = server.api_url, parameters = {"request": "appdetails", "appid": 1})
+
     assert query is not None
+    assert query.json()["appid"] == 1
+
+
+def test_connections_are_reused():
+    client = SimpleHttpClient()
+    with SteamStubServer() as server:
+        for appid in range(5):
+            client.get_request(server.api_url, {"request": "appdetails", "appid": appid})
+
+    assert len(server.connections) == 1
+    assert client.stats.request_count == 5
+
+
+def test_retry_after_is_honored():
+    client = SimpleHttpClient(backoff_base = 0)
+    with SteamStubServer(quota_requests = 1, quota_window = 0.3) as server:
+        client.get_request(server.api_url, {"request": "appdetails", "appid": 1})
+        start = time.monotonic()
+        response = client.get_request(server.api_url, {"request": "appdetails", "appid": 2})
+
+    assert response.json()["appid"] == 2
+    assert time.monotonic() - start >= 0.25
+    assert client.stats.retry_count == 1
+
+
+def test_retries_are_bounded():
+    client = SimpleHttpClient(max_retries = 2, backoff_base = 0.01)
+    with SteamStubServer(failing_appids = [1]) as server:
+        with pytest.raises(HTTPError):
+            client.get_request(server.api_url, {"request": "appdetails", "appid": 1})
+
+    assert server.request_count == 3
+    assert client.stats.as_dict()["retries"] == 2
+    assert client.stats.failure_count == 1
@@ -0,0 +1,41 @@
+import json
+import pstats
+
+from simplehttp.SimpleHttpClient import HttpClientStats
+from utils.Instrumentation import Instrumentation
+
+
+def test_stages_are_timed_and_profiled(tmp_path):
+    instrumentation = Instrumentation(profile_stages = ["parse"], profile_directory = str(tmp_path))
+    for _ in range(2):
+        with instrumentation.stage("parse"):
+            sum(range(1000))
+    with instrumentation.stage("fetch"):
+        pass
+    instrumentation.add_time("chart:most_played", 0.5)
+    instrumentation.add_section("steam_spy", {"cache_hits": 3})
+
+    report_file = tmp_path / "report.json"
+    instrumentation.save(str(report_file))
+    report = json.loads(report_file.read_text(encoding = "utf-8"))
+
+    assert report["stages"]["parse"]["calls"] == 2
+    assert report["stages"]["chart:most_played"]["seconds"] == 0.5
+    assert report["steam_spy"]["cache_hits"] == 3
+    assert report["peak_memory_mb"] > 0
+    assert pstats.Stats(str(tmp_path / "parse.prof")).total_calls > 0
+    assert pstats.Stats(str(tmp_path / "parse-2.prof")).total_calls > 0
+    assert not (tmp_path / "fetch.prof").exists()
+
+
+def test_latency_histogram():
+    stats = HttpClientStats()
+    for latency in [0.01, 0.07, 0.3, 30.0]:
+        stats.record_request(latency)
+
+    histogram = stats.as_dict()["latency_histogram"]
+    assert histogram["0.05"] == 1
+    assert histogram["0.1"] == 1
+    assert histogram["0.5"] == 1
+    assert histogram["inf"] == 1
+    assert sum(histogram.values()) == 4
@@ -0,0 +1,52 @@
+import numpy as np
+import pandas as pd
+
+from utils.MathUtils import MathUtils
+
+
+def reference_bayesian_average(frame):
+    # Row by row implementation the vectorized one replaces
+    system_ratings_avg = frame["RatingsRatio"].mean()
+    system_num_ratings_avg = frame["TotalRatings"].mean()
+
+    def calculate(row):
+        n = row["TotalRatings"]
+        return ((n / (n + system_num_ratings_avg)) * row["RatingsRatio"]) + (
+            (system_num_ratings_avg / (n + system_num_ratings_avg)) * system_ratings_avg)
+
+    return list(frame.apply(calculate, axis = 1))
+
+
+def make_frame(rows, seed = 0):
+    rng = np.random.default_rng(seed)
+    frame = pd.DataFrame({
+        "TotalRatings": rng.integers(0, 100000, size = rows),
+        "RatingsRatio": rng.uniform(0, 100, size = rows)
+    })
+    frame.loc[3, "RatingsRatio"] = np.nan
+    frame.loc[5, "TotalRatings"] = 0
+    return frame
+
+
+def test_vectorized_matches_row_by_row():
+    frame = make_frame(200)
+    expected = reference_bayesian_average(frame)
+    result = MathUtils.add_bayesian_average_to_gamespy_dataframe(frame.copy())
+    np.testing.assert_array_equal(result["BayesianAverage"].to_numpy(), np.array(expected))
+
+
+def test_explicit_prior():
+    frame = pd.DataFrame({"TotalRatings": [0, 10, 90], "RatingsRatio": [0.0, 100.0, 50.0]})
+    result = MathUtils.add_bayesian_average_to_gamespy_dataframe(frame, prior_mean = 50, prior_weight = 10)
+    assert list(result["BayesianAverage"]) == [50.0, 75.0, 50.0]
+
+
+def test_chunks_match_whole_frame():
+    frame = make_frame(1000)
+    chunks = [frame.iloc[start:start + 300].copy() for start in range(0, len(frame), 300)]
+
+    prior_mean, prior_weight = MathUtils.calculate_system_priors(chunks)
+    decorated = pd.concat(MathUtils.add_bayesian_average_to_chunks(chunks, prior_mean, prior_weight))
+
+    expected = MathUtils.add_bayesian_average_to_gamespy_dataframe(frame.copy())
+    np.testing.assert_allclose(decorated["BayesianAverage"], expected["BayesianAverage"], rtol = 1e-12)
@@ -0,0 +1,29 @@
+import os
+
+import pandas as pd
+
+from graphing.ParallelChartRenderer import ParallelChartRenderer
+from utils.NpyColumnStore import NpyColumnStore
+from test_graph_generator import CHARTS, make_decorated_game_infos
+
+
+def test_column_store_round_trip(tmp_path):
+    games = make_decorated_game_infos(20)
+    games.loc[30, "Name"] = None
+    NpyColumnStore.save(games, str(tmp_path))
+
+    pd.testing.assert_frame_equal(NpyColumnStore.load(str(tmp_path)), games)
+    assert list(NpyColumnStore.load(str(tmp_path), columns = ["Name"]).columns) == ["Name"]
+
+
+def test_render_libraries_in_parallel(tmp_path):
+    libraries = {}
+    for user in ["a", "b"]:
+        os.makedirs(tmp_path / user)
+        libraries[str(tmp_path / user)] = make_decorated_game_infos(100)
+
+    ParallelChartRenderer(max_workers = 2).render(libraries)
+
+    for output_directory in libraries:
+        for chart in CHARTS:
+            assert os.path.exists(os.path.join(output_directory, chart))
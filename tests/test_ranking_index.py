@@ -0,0 +1,38 @@
+import numpy as np
+import pandas as pd
+
+from utils.RankingIndex import RankingIndex
+
+
+def make_frame(rows = 500):
+    rng = np.random.default_rng(1)
+    ratings = rng.integers(0, 20, size = rows).astype(np.float64)
+    ratings[::17] = np.nan
+    return pd.DataFrame({
+        "BayesianAverage": ratings,
+        "HoursOnRecord": rng.integers(0, 5, size = rows).astype(np.int32)
+    })
+
+
+def largest(series, k):
+    return list(series.dropna().sort_values(ascending = False, kind = "stable").index[:k])
+
+
+def test_top_k_matches_stable_sort():
+    frame = make_frame()
+    mask = frame["HoursOnRecord"].to_numpy() == 0
+    for precompute in [False, True]:
+        index = RankingIndex(frame, precompute = precompute)
+        assert index.is_precomputed("BayesianAverage") == precompute
+        for k in [0, 1, 10, 50, 1000]:
+            assert list(index.top_k("BayesianAverage", k)) == largest(frame["BayesianAverage"], k)
+            assert list(index.top_k("BayesianAverage", k, mask)) == largest(frame["BayesianAverage"][mask], k)
+
+
+def test_order_puts_missing_values_last():
+    frame = make_frame(50)
+    order = RankingIndex(frame).order("BayesianAverage")
+    expected = frame.sort_values("BayesianAverage", ascending = False, kind = "stable").index.to_numpy()
+    assert list(order) == list(expected)
+    assert list(RankingIndex(frame).top_k("HoursOnRecord", k = None)) == \
+        list(frame["HoursOnRecord"].sort_values(ascending = False, kind = "stable").index)
@@ -0,0 +1,77 @@
+import json
+import time
+import urllib.error
+import urllib.request
+
+import numpy as np
+
+from server.RankingServer import RankingServer
+from test_graph_generator import make_decorated_game_infos
+
+
+def get(server, path):
+    try:
+        with urllib.request.urlopen(server.url + path, timeout = 5) as response:
+            return response.status, json.loads(response.read())
+    except urllib.error.HTTPError as e:
+        return e.code, json.loads(e.read())
+
+
+def test_queries():
+    games = make_decorated_game_infos(300)
+    games.loc[games.index[0], "BayesianAverage"] = np.nan
+
+    with RankingServer(lambda: games, port = 0) as server:
+        status, top = get(server, "/top?metric=BayesianAverage&k=5")
+        assert status == 200
+        expected = games["BayesianAverage"].dropna().sort_values(ascending = False, kind = "stable")
+        assert [row["AppId"] for row in top] == list(expected.index[:5])
+        assert top[0]["Name"] == games.loc[expected.index[0], "Name"]
+
+        status, unplayed = get(server, "/unplayed-best?k=10")
+        assert status == 200
+        assert len(unplayed) == 10
+        assert all(row["HoursOnRecord"] == 0 for row in unplayed)
+
+        status, played = get(server, "/top?metric=HoursOnRecord&k=3&filter=played")
+        assert [row["AppId"] for row in played] == list(games["HoursOnRecord"].nlargest(3).index)
+
+        # The game without a rating is still found, just not ranked by it
+        appid = int(games.index[0])
+        status, app = get(server, f"/app/{appid}")
+        assert status == 200
+        assert app["BayesianAverage"] is None
+        assert app["Ranks"]["BayesianAverage"] is None
+        assert get(server, f"/app/{expected.index[0]}")[1]["Ranks"]["BayesianAverage"] == 1
+
+        assert get(server, "/app/1")[0] == 404
+        assert get(server, "/top?metric=Nope")[0] == 400
+        assert get(server, "/top?filter=nope")[0] == 400
+        assert get(server, "/top?k=-1")[0] == 400
+        assert get(server, "/nowhere")[0] == 404
+        assert get(server, "/status")[1]["games"] == 300
+
+
+def test_reloads_when_a_watched_file_changes(tmp_path):
+    watched = tmp_path / "steam_spy_cache.sqlite"
+    watched.write_text("1")
+    frames = [make_decorated_game_infos(100), make_decorated_game_infos(200)]
+    loads = []
+
+    def load_frame():
+        loads.append(1)
+        return frames[min(len(loads), len(frames)) - 1]
+
+    with RankingServer(load_frame, [str(watched)], port = 0, reload_interval = 0.05) as server:
+        assert get(server, "/status")[1]["games"] == 100
+        get(server, "/top?k=1000")
+
+        # Bigger so the size changes even if the modification time doesn't
+        watched.write_text("22")
+        deadline = time.time() + 5
+        while server.reload_count < 2 and time.time() < deadline:
+            time.sleep(0.05)
+
+        assert server.reload_count == 2
+        # Responses cached before the reload aren't served anymore
+        assert len(get(server, "/top?k=1000")[1]) == 200
@@ -0,0 +1,71 @@
+import os
+
+import pandas as pd
+
+from main import render_charts, generate_reports, decorated_file, load_decorated_game_infos, MANIFEST_FILE
+from utils.RunManifest import RunManifest
+from utils.FrameStorage import FrameStorage
+from test_graph_generator import make_decorated_game_infos
+
+
+def test_manifest_round_trip(tmp_path):
+    output = tmp_path / "output.txt"
+    output.write_text("x")
+    manifest = RunManifest(str(tmp_path / MANIFEST_FILE))
+    fingerprint = RunManifest.fingerprint(1, "library")
+    manifest.record("rank", fingerprint, appids = [10, 20])
+    manifest.save()
+
+    manifest = RunManifest(str(tmp_path / MANIFEST_FILE))
+    assert manifest.get("rank")["appids"] == [10, 20]
+    assert manifest.is_fresh("rank", fingerprint, [str(output)])
+    assert not manifest.is_fresh("rank", RunManifest.fingerprint(2, "library"))
+
+    output.unlink()
+    assert not manifest.is_fresh("rank", fingerprint, [str(output)])
+
+
+def test_only_changed_charts_are_rendered(tmp_path):
+    games = make_decorated_game_infos(100)
+    libraries = {str(tmp_path): games}
+    manifests = {str(tmp_path): RunManifest(str(tmp_path / MANIFEST_FILE))}
+    render_charts(libraries, manifests)
+
+    modified = {chart: os.path.getmtime(tmp_path / chart) for chart in os.listdir(tmp_path) if chart.endswith(".html")}
+    assert len(modified) == 5
+    for chart in modified:
+        os.utime(tmp_path / chart, (0, 0))
+
+    # Only the 2 weeks chart reads HoursLast2Weeks
+    games.iloc[0, games.columns.get_loc("HoursLast2Weeks")] += 1
+    render_charts(libraries, manifests)
+
+    changed = [chart for chart in modified if os.path.getmtime(tmp_path / chart) != 0]
+    assert changed == ["MostPlayedLast2Weeks.html"]
+
+
+def test_outputs_have_the_links_of_the_xml(tmp_path):
+    games = make_decorated_game_infos(10)
+    games["HasStats"] = [appid % 20 == 0 for appid in games.index]
+    generate_reports({str(tmp_path): games}, output_format = "csv", charts = False,
+                     steam_ids = {str(tmp_path): "76561197960287930"})
+
+    saved = pd.read_csv(decorated_file(str(tmp_path), "csv"), index_col = "AppId", keep_default_na = False)
+    assert saved.loc[20, "StoreLink"] == "https://steamcommunity.com/app/20"
+    assert saved.loc[20, "StatsLink"] == "https://steamcommunity.com/profiles/76561197960287930/stats/20"
+    assert saved.loc[10, "StatsLink"] == ""
+    assert list(games.columns) == ["Name", "HoursOnRecord", "HoursLast2Weeks", "RatingsRatio", "BayesianAverage",
+                                   "HasStats"]
+
+
+def test_later_commands_read_the_format_of_the_run(tmp_path):
+    format = "arrow" if FrameStorage.columnar_available() else "csv"
+    games = make_decorated_game_infos(10)
+    games["HasStats"] = False
+    generate_reports({str(tmp_path): games}, output_format = format, charts = False)
+    os.remove(decorated_file(str(tmp_path), format))
+    generate_reports({str(tmp_path): games}, charts = False)
+
+    loaded = load_decorated_game_infos(str(tmp_path), RunManifest(str(tmp_path / MANIFEST_FILE)))
+    assert list(loaded.index) == list(games.index)
+    assert sorted(os.listdir(tmp_path)) == sorted([f"decorated_game_infos.{format}", MANIFEST_FILE])
@@ -0,0 +1,138 @@
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+import pandas as pd
+import pytest
+
+from steam.SteamSpyCache import SqliteSteamSpyCache, CsvSteamSpyCache, ColumnarSteamSpyCache, CACHE_COLUMNS
+from utils.FrameStorage import FrameStorage
+
+
+def make_record(appid, positive = 10):
+    return (appid, f"Game {appid}", positive, 0, positive, 100.0, 0, 1, 0, 1, 0)
+
+
+def test_sqlite_upsert_replaces_entries(tmp_path):
+    cache = SqliteSteamSpyCache(str(tmp_path / "cache.sqlite"))
+    cache.upsert([make_record(1), make_record(2)])
+    cache.upsert([make_record(1, positive = 20)])
+
+    loaded = cache.load()
+    assert sorted(loaded.index) == [1, 2]
+    assert loaded.loc[1, "Positive"] == 20
+    assert list(cache.load([2, 3]).index) == [2]
+
+
+def test_stale_entries_are_loaded_until_refreshed(tmp_path):
+    caches = [SqliteSteamSpyCache(str(tmp_path / "cache.sqlite"), ttl = 60),
+              CsvSteamSpyCache(str(tmp_path / "cache.csv"), ttl = 60)]
+    if FrameStorage.columnar_available():
+        caches.append(ColumnarSteamSpyCache(str(tmp_path / "cache.arrow"), ttl = 60))
+
+    for cache in caches:
+        cache.upsert([make_record(1)], fetched_at = time.time() - 120)
+        cache.upsert([make_record(2)])
+        assert sorted(cache.load().index) == [1, 2]
+        assert cache.fresh_appids([1, 2, 3]) == {2}
+        assert cache.stale_appids([1, 2, 3]) == {1}
+
+
+def test_sqlite_lookups_of_many_appids(tmp_path):
+    cache = SqliteSteamSpyCache(str(tmp_path / "cache.sqlite"), ttl = 60)
+    cache.upsert([make_record(appid) for appid in range(0, 3000, 2)])
+    cache.upsert([make_record(appid) for appid in range(1, 3000, 2)], fetched_at = time.time() - 120)
+    cache.save_failures([(appid, "ERROR", 1, "Timeout", 0.0, 0.0) for appid in range(3000, 3010)])
+
+    appids = list(range(3010))
+    assert len(cache.load(appids)) == 3000
+    assert cache.fresh_appids(appids) == set(range(0, 3000, 2))
+    assert cache.stale_appids(appids) == set(range(1, 3000, 2))
+    assert set(cache.load_failures(appids)) == set(range(3000, 3010))
+    assert set(cache.load_failures([3000, 1])) == {3000}
+
+
+def test_csv_cache_is_imported_once(tmp_path):
+    csv_file = tmp_path / "steam_spy_cache.csv"
+    legacy = pd.DataFrame.from_records([make_record(1), make_record(2), make_record(2, 30)],
+                                       columns = CACHE_COLUMNS)
+    legacy.to_csv(csv_file, index = False)
+
+    cache = SqliteSteamSpyCache(str(tmp_path / "cache.sqlite"), ttl = None)
+    assert cache.import_csv(str(csv_file)) == 2
+    assert cache.import_csv(str(csv_file)) == 0
+    assert cache.load().loc[2, "Positive"] == 30
+
+
+# Writes records to a steam_spy_cache.csv the way SteamSpyQuery did before the SQLite cache
+def write_baseline_csv(csv_file, records):
+    cache = pd.DataFrame(columns = CACHE_COLUMNS)
+    if os.path.exists(csv_file):
+        cache = pd.read_csv(csv_file, index_col = "AppId")
+    new_cache = pd.DataFrame.from_records(records, columns = CACHE_COLUMNS).set_index("AppId")
+    pd.concat([cache, new_cache]).to_csv(csv_file)
+
+
+# The baseline concatenated with an empty frame, which pandas now warns about
+@pytest.mark.filterwarnings("ignore::FutureWarning")
+def test_csv_of_the_baseline_is_imported(tmp_path):
+    csv_file = str(tmp_path / "steam_spy_cache.csv")
+    write_baseline_csv(csv_file, [make_record(1), make_record(2)])
+    write_baseline_csv(csv_file, [make_record(3, positive = 30)])
+
+    cache = SqliteSteamSpyCache(str(tmp_path / "cache.sqlite"), ttl = None)
+    assert cache.import_csv(csv_file) == 3
+    loaded = cache.load()
+    assert sorted(loaded.index) == [1, 2, 3]
+    assert loaded.loc[3, "Positive"] == 30
+    assert loaded.loc[1, "Name"] == "Game 1"
+
+
+def test_claims_are_exclusive_between_processes(tmp_path):
+    first = SqliteSteamSpyCache(str(tmp_path / "cache.sqlite"))
+    second = SqliteSteamSpyCache(str(tmp_path / "cache.sqlite"))
+    assert first.connection.execute("PRAGMA journal_mode").fetchone()[0] == "wal"
+
+    assert first.claim([1, 2, 3]) == ([1, 2, 3], [])
+    assert second.claim([2, 3, 4]) == ([4], [2, 3])
+
+    # Stored apps are released and settled, the other process doesn't fetch them
+    first.upsert([make_record(2)])
+    assert second.claim([2, 3]) == ([], [3])
+    first.release()
+    assert second.claim([3]) == ([3], [])
+
+    # Claims of a process which died expire
+    first.claim([5], claim_ttl = -1)
+    assert second.claim([5]) == ([5], [])
+
+
+def test_progress_is_kept_per_process(tmp_path):
+    first = SqliteSteamSpyCache(str(tmp_path / "cache.sqlite"))
+    second = SqliteSteamSpyCache(str(tmp_path / "cache.sqlite"))
+    first.save_progress({"total": 3, "completed": 1, "pending": [2, 3]})
+    second.save_progress({"total": 1, "completed": 0, "pending": [4]})
+    assert first.load_progress()["pending"] == [2, 3]
+    assert second.load_progress()["pending"] == [4]
+
+    # The progress of a process still fetching isn't taken, once it holds no claim it's taken over once
+    first.claim([2])
+    assert second.take_abandoned_progress() == []
+    first.release()
+    assert second.take_abandoned_progress() == [{"total": 3, "completed": 1, "pending": [2, 3]}]
+    assert second.take_abandoned_progress() == []
+    assert second.load_progress()["pending"] == [4]
+
+
+def upsert_range(filename, start):
+    cache = CsvSteamSpyCache(filename)
+    for appid in range(start, start + 10):
+        cache.upsert([make_record(appid)])
+
+
+def test_csv_upserts_of_processes_are_all_kept(tmp_path):
+    filename = str(tmp_path / "cache.csv")
+    with ProcessPoolExecutor(max_workers = 4) as executor:
+        list(executor.map(upsert_range, [filename] * 4, [0, 10, 20, 30]))
+
+    assert sorted(CsvSteamSpyCache(filename).load().index) == list(range(40))
@@ -0,0 +1,258 @@
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+import pandas as pd
+import pytest
+
+from simplehttp.TokenBucketRateLimiter import TokenBucketRateLimiter
+from steam.FetchScheduler import FetchScheduler
+from steam.SteamSpyQuery import SteamSpyQuery
+from steam.SteamSpyCache import CACHE_COLUMNS
+from steam_stub_server import SteamStubServer
+
+
+def make_game_infos(appids):
+    df = pd.DataFrame({
+        "AppId": appids,
+        "Name": [f"Game {appid}" for appid in appids],
+        "HoursOnRecord": [0] * len(appids)
+    })
+    return df.set_index("AppId")
+
+
+def test_failed_csv_import_is_tried_again(tmp_path):
+    (tmp_path / "steam_spy_cache.csv").write_text(",".join(CACHE_COLUMNS) + "\n1,Game 1,many,0,0,0,0,0,0,0,0\n")
+    query = SteamSpyQuery(tmp_path)
+    for _ in range(2):
+        with pytest.raises(ValueError):
+            query.cache
+
+
+def test_rate_limiter_bounds_throughput():
+    limiter = TokenBucketRateLimiter(rate = 50, capacity = 1)
+    start = time.monotonic()
+    for _ in range(11):
+        limiter.acquire()
+    # The first token is free, the next 10 take 1/50s each
+    assert time.monotonic() - start >= 0.18
+
+
+def test_concurrent_fetch_against_quota(tmp_path):
+    appids = list(range(1, 31))
+    with SteamStubServer(quota_requests = 10, quota_window = 0.5) as server:
+        query = SteamSpyQuery(tmp_path,
+                              requests_per_second = 100,
+                              burst = 5,
+                              max_in_flight = 4,
+                              api_url = server.api_url)
+        result = query.get_data_for_games(make_game_infos(appids),
+                                          use_cache = False)
+
+    assert server.max_in_flight <= 4
+    assert server.throttled_count > 0
+    # Nothing is written without the cache
+    assert list(tmp_path.iterdir()) == []
+    assert sorted(server.app_details_requests) == sorted(str(a) for a in appids)
+    assert list(result.index) == appids
+    assert list(result["Positive"]) == [a * 10 for a in appids]
+    assert list(result["TotalRatings"]) == [a * 11 for a in appids]
+
+
+def test_only_cache_misses_are_fetched(tmp_path):
+    with SteamStubServer() as server:
+        query = SteamSpyQuery(tmp_path, requests_per_second = 100, api_url = server.api_url)
+        query.get_data_for_games(make_game_infos([1, 2, 3]))
+        game_infos = make_game_infos([3, 4, 1, 5])
+        result = query.get_data_for_games(game_infos)
+
+    assert server.app_details_requests == {"1": 1, "2": 1, "3": 1, "4": 1, "5": 1}
+    assert list(result.index) == [3, 4, 1, 5]
+    assert list(result["Positive"]) == [30, 40, 10, 50]
+    # The other columns are kept and the input isn't modified
+    assert list(result.columns[:2]) == ["HoursOnRecord", "Name"]
+    assert list(game_infos.columns) == ["Name", "HoursOnRecord"]
+
+
+def test_fetch_missing_without_data_frames(tmp_path):
+    with SteamStubServer() as server:
+        query = SteamSpyQuery(tmp_path, requests_per_second = 100, api_url = server.api_url)
+        assert query.fetch_missing({1: "Game 1", 2: "Game 2"}) == 2
+        assert query.fetch_missing({1: "Game 1", 2: "Game 2", 3: "Game 3"}) == 1
+
+        # Nothing is requested when fetching is off, uncached games just get no data
+        result = query.get_data_for_games(make_game_infos([1, 4]), fetch_missing = False)
+
+    assert server.app_details_requests == {"1": 1, "2": 1, "3": 1}
+    assert query.stats["cache_hits"] == 3
+    assert list(result["Positive"].isna()) == [False, True]
+
+
+def test_crawl_resumes_after_interruption(tmp_path):
+    appids = list(range(1, 11))
+    with SteamStubServer() as server:
+        query = SteamSpyQuery(tmp_path, requests_per_second = 1000, max_in_flight = 1,
+                              api_url = server.api_url, checkpoint_batch_size = 3)
+        fetch_app_details = query.fetcher.fetch_app_details
+
+        # The process dies after 5 games
+        def interrupted(order):
+            for i, result in enumerate(fetch_app_details(order)):
+                if i == 5:
+                    raise KeyboardInterrupt()
+                yield result
+
+        query.fetcher.fetch_app_details = interrupted
+        with pytest.raises(KeyboardInterrupt):
+            query.get_data_for_games(make_game_infos(appids))
+
+    assert sorted(query.cache.load().index) == [1, 2, 3, 4, 5]
+    assert query.cache.load_progress()["pending"] == [6, 7, 8, 9, 10]
+
+    with SteamStubServer() as server:
+        query.fetcher.fetch_app_details = fetch_app_details
+        query.fetcher.api_url = server.api_url
+        result = query.get_data_for_games(make_game_infos(appids))
+
+    assert sorted(server.app_details_requests) == ["10", "6", "7", "8", "9"]
+    assert list(result["Positive"]) == [a * 10 for a in appids]
+    assert query.cache.load_progress() is None
+
+
+def test_failed_apps_are_recorded_and_skipped(tmp_path):
+    appids = list(range(1, 11))
+    with SteamStubServer(failing_appids = [3], empty_appids = [5], malformed_appids = [7]) as server:
+        query = SteamSpyQuery(tmp_path, requests_per_second = 1000, api_url = server.api_url,
+                              checkpoint_batch_size = 3, error_retry = 60)
+        # One bad app doesn't stop the crawl
+        result = query.get_data_for_games(make_game_infos(appids))
+        assert list(result["Positive"].isna()) == [appid in (3, 5, 7) for appid in appids]
+        assert query.stats["failed"] == 3
+        assert query.cache.load_progress() is None
+
+        failures = query.cache.load_failures()
+        assert sorted(failures) == [3, 5, 7]
+        assert [failures[appid]["Failure"] for appid in [3, 5, 7]] == ["error", "no_data", "error"]
+        assert failures[5]["RetryAt"] - failures[5]["FailedAt"] == pytest.approx(query.negative_ttl)
+        assert failures[3]["RetryAt"] - failures[3]["FailedAt"] == pytest.approx(60)
+
+        # Known failures cost no request until they're due
+        assert query.pending_appids(appids) == []
+        requests = dict(server.app_details_requests)
+        query.get_data_for_games(make_game_infos(appids))
+        assert server.app_details_requests == requests
+        assert query.stats["skipped"] == 3
+
+    # Once due, errors are tried again and wait twice longer after failing again, a success forgets them
+    with SteamStubServer(failing_appids = [3]) as server:
+        query.fetcher.api_url = server.api_url
+        query.cache.save_failures([(appid, failure["Failure"], failure["Attempts"], failure["Message"],
+                                    failure["FailedAt"], 0) for appid, failure in failures.items()])
+        assert query.pending_appids(appids) == [3, 5, 7]
+        result = query.get_data_for_games(make_game_infos(appids))
+
+    assert sorted(server.app_details_requests, key = int) == ["3", "5", "7"]
+    assert list(result["Positive"].isna()) == [appid == 3 for appid in appids]
+    failures = query.cache.load_failures()
+    assert list(failures) == [3]
+    assert failures[3]["Attempts"] == 2
+    assert failures[3]["RetryAt"] - failures[3]["FailedAt"] == pytest.approx(120)
+
+
+def test_stale_data_is_kept_until_refreshed(tmp_path):
+    appids = [1, 2, 3]
+    with SteamStubServer(failing_appids = [2]) as server:
+        query = SteamSpyQuery(tmp_path, requests_per_second = 1000, api_url = server.api_url)
+        query.cache.upsert([(appid, f"Game {appid}", 1, 0, 1, 100.0, 0, 0, 0, 0, 0) for appid in appids],
+                           fetched_at = time.time() - 40 * 24 * 60 * 60)
+
+        # Nothing is refreshed without fetching, the last data is used
+        result = query.get_data_for_games(make_game_infos(appids), fetch_missing = False)
+        assert list(result["Positive"]) == [1, 1, 1]
+        assert not server.app_details_requests
+
+        # A failed refresh keeps the last data
+        result = query.get_data_for_games(make_game_infos(appids))
+
+    assert sorted(server.app_details_requests) == ["1", "2", "3"]
+    assert list(result["Positive"]) == [10, 1, 30]
+
+
+def test_unknown_apps_do_not_slow_down_the_others(tmp_path):
+    appids = list(range(1, 11))
+    with SteamStubServer(empty_appids = appids[:5]) as server:
+        query = SteamSpyQuery(tmp_path, requests_per_second = 1000, api_url = server.api_url)
+        result = query.get_data_for_games(make_game_infos(appids))
+
+    # Asked once more in case SteamSpy was overloaded, then recorded as having no data
+    assert [server.app_details_requests[str(appid)] for appid in appids] == [2] * 5 + [1] * 5
+    assert query.fetcher.rate_limiter.rate == query.fetcher.rate_limiter.max_rate
+    assert list(result["Positive"].isna()) == [True] * 5 + [False] * 5
+    assert set(failure["Failure"] for failure in query.cache.load_failures().values()) == {"no_data"}
+
+
+def test_budget_fetches_the_most_played_games_first(tmp_path):
+    appids = list(range(1, 11))
+    game_infos = make_game_infos(appids)
+    game_infos["HoursOnRecord"] = [appid % 4 * 10 + appid for appid in appids]
+    by_hours = [str(appid) for appid in game_infos["HoursOnRecord"].sort_values(ascending = False).index]
+
+    with SteamStubServer() as server:
+        query = SteamSpyQuery(tmp_path, requests_per_second = 1000, max_in_flight = 1, api_url = server.api_url,
+                              scheduler = FetchScheduler(request_budget = 4))
+        result = query.get_data_for_games(game_infos)
+        assert list(server.app_details_requests) == by_hours[:4]
+        assert query.stats["deferred"] == 6
+        assert result["Positive"].notna().sum() == 4
+        # What's left is known without fetching, runs can tell they have more to do
+        assert sorted(query.pending_appids(appids)) == sorted(int(appid) for appid in by_hours[4:])
+
+        # The next run picks up where the budget stopped
+        query.scheduler = FetchScheduler(request_budget = 4)
+        query.get_data_for_games(game_infos)
+        assert list(server.app_details_requests) == by_hours[:8]
+
+
+def crawl_library(directory, api_url, appids):
+    query = SteamSpyQuery(directory, requests_per_second = 1000, api_url = api_url, claim_poll_interval = 0.05)
+    result = query.get_data_for_games(make_game_infos(appids))
+    return list(result["Positive"]), query.stats
+
+
+def test_processes_sharing_the_cache_fetch_each_game_once(tmp_path):
+    appids = list(range(1, 41))
+    libraries = [appids, appids[::-1], appids[10:30]]
+    with SteamStubServer(latency = 0.01) as server:
+        with ProcessPoolExecutor(max_workers = len(libraries)) as executor:
+            results = list(executor.map(crawl_library, [tmp_path] * 3, [server.api_url] * 3, libraries))
+
+    assert sorted(server.app_details_requests, key = int) == [str(appid) for appid in appids]
+    assert set(server.app_details_requests.values()) == {1}
+    # Games fetched by another process are read back from the cache
+    for library, (positive, stats) in zip(libraries, results):
+        assert positive == [appid * 10 for appid in library]
+        assert stats["cache_hits"] + stats["fetched"] + stats["shared"] == len(library)
+
+
+def test_bulk_prefetch_covers_most_apps(tmp_path):
+    appids = list(range(1, 31))
+    with SteamStubServer(bulk_appids = range(1, 26), page_size = 10) as server:
+        query = SteamSpyQuery(tmp_path, requests_per_second = 100, bulk_requests_per_second = 100,
+                              api_url = server.api_url)
+        result = query.get_data_for_games(make_game_infos(appids), bulk_prefetch = True)
+        # Pages are not pulled again while they are fresh
+        query.get_data_for_games(make_game_infos([31]), bulk_prefetch = True)
+
+    assert server.all_requests == 4
+    assert sorted(server.app_details_requests, key = int) == ["26", "27", "28", "29", "30", "31"]
+    assert list(result["Positive"]) == [a * 10 for a in appids]
+
+
+def test_bad_bulk_entries_are_left_to_appdetails(tmp_path):
+    appids = list(range(1, 11))
+    with SteamStubServer(bulk_appids = appids, malformed_bulk_appids = [5]) as server:
+        query = SteamSpyQuery(tmp_path, requests_per_second = 100, bulk_requests_per_second = 100,
+                              api_url = server.api_url)
+        result = query.get_data_for_games(make_game_infos(appids), bulk_prefetch = True)
+
+    assert server.app_details_requests == {"5": 1}
+    assert list(result["Positive"]) == [a * 10 for a in appids]
@@ -0,0 +1,36 @@
+import numpy as np
+import pandas as pd
+
+from steam.SteamSpyCache import CACHE_DTYPES, records_to_cache_frame
+from steam.SteamSpyRecordBuffer import SteamSpyRecordBuffer
+
+
+def make_record(appid):
+    return (appid, f"Game {appid}", appid * 10, appid, appid * 11, 10 / 11 * 100, 0, appid, 0, appid, 0)
+
+
+def test_buffers_grow_and_keep_their_types():
+    buffer = SteamSpyRecordBuffer(2)
+    for appid in range(1, 6):
+        buffer.append(make_record(appid))
+
+    assert len(buffer) == 5
+    assert list(buffer.column("AppId")) == [1, 2, 3, 4, 5]
+    assert list(buffer.column("Name")) == [f"Game {appid}" for appid in range(1, 6)]
+    for column, dtype in CACHE_DTYPES.items():
+        assert buffer.column(column).dtype == np.dtype(dtype)
+
+
+def test_align_matches_a_left_join():
+    cache = records_to_cache_frame([make_record(appid) for appid in [3, 1]])
+    buffer = SteamSpyRecordBuffer()
+    buffer.append(make_record(4))
+
+    index = pd.Index([4, 1, 3, 7], name = "AppId")
+    expected = pd.DataFrame(index = index).join(pd.concat([cache, records_to_cache_frame([make_record(4)])]))
+    pd.testing.assert_frame_equal(pd.DataFrame(buffer.align(index, cache), index = index), expected)
+
+    # Nothing missing, the columns keep their compact types
+    aligned = buffer.align(index[:3], cache)
+    assert aligned["Positive"].dtype == np.int32
+    assert list(aligned["Positive"]) == [40, 10, 30]
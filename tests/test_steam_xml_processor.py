@@ -0,0 +1,127 @@
+import io
+import os
+
+import pandas as pd
+import pytest
+
+from simplehttp.SimpleHttpClient import SimpleHttpClient
+from steam.SteamXmlProcessor import SteamXmlProcessor, VALIDATORS_SUFFIX
+from steam_stub_server import SteamStubServer, make_games_xml
+
+GAMES_XML = """<?xml version="1.0" encoding="UTF-8" standalone="yes"?>
+<gamesList>
+    <steamID64>76561197960287930</steamID64>
+    <steamID><![CDATA[someone]]></steamID>
+    <games>
+        <game>
+            <appID>10</appID>
+            <name><![CDATA[Counter-Strike]]></name>
+            <logo><![CDATA[https://example.com/10/logo.jpg]]></logo>
+            <storeLink><![CDATA[https://steamcommunity.com/app/10]]></storeLink>
+            <hoursLast2Weeks>1.5</hoursLast2Weeks>
+            <hoursOnRecord>250.3</hoursOnRecord>
+            <statsLink><![CDATA[https://steamcommunity.com/id/someone/stats/10]]></statsLink>
+            <globalStatsLink><![CDATA[https://steamcommunity.com/stats/10/achievements/]]></globalStatsLink>
+        </game>
+        <game>
+            <appID>20</appID>
+            <name><![CDATA[Team Fortress Classic]]></name>
+            <logo></logo>
+            <storeLink><![CDATA[https://steamcommunity.com/app/20]]></storeLink>
+        </game>
+        <game>
+            <appID>30</appID>
+            <name><![CDATA[Day of Defeat]]></name>
+            <hoursOnRecord>3</hoursOnRecord>
+        </game>
+    </games>
+</gamesList>
+"""
+
+
+def test_streaming_matches_legacy_parser():
+    legacy = SteamXmlProcessor(GAMES_XML).get_game_infos()
+    streamed = SteamXmlProcessor.from_stream(io.BytesIO(GAMES_XML.encode("utf-8"))).get_game_infos()
+    pd.testing.assert_frame_equal(legacy, streamed)
+
+
+def test_streaming_from_file_in_batches(tmp_path):
+    xml_file = tmp_path / "games.xml"
+    xml_file.write_text(GAMES_XML, encoding = "utf-8")
+
+    processor = SteamXmlProcessor.from_file(str(xml_file), streaming = True)
+    batches = list(processor.iter_game_batches(batch_size = 2))
+
+    assert [batch["AppId"] for batch in batches] == [[10, 20], [30]]
+    assert batches[0]["HoursOnRecord"] == [250.3, 0.0]
+    assert batches[0]["HasStats"] == [True, False]
+    assert processor.steam_id == "76561197960287930"
+
+
+def test_compact_game_infos_and_links():
+    processor = SteamXmlProcessor(GAMES_XML)
+    game_infos = processor.get_game_infos()
+    assert list(game_infos.columns) == ["Name", "HoursLast2Weeks", "HoursOnRecord", "HasStats"]
+    assert game_infos.index.dtype == "int32"
+    assert game_infos["HoursOnRecord"].dtype == "int32"
+
+    with_links = SteamXmlProcessor.add_links(game_infos, processor.steam_id)
+    assert "LogoLink" not in game_infos
+    assert with_links.loc[10, "StoreLink"] == "https://steamcommunity.com/app/10"
+    assert with_links.loc[10, "StatsLink"] == "https://steamcommunity.com/profiles/76561197960287930/stats/10"
+    assert with_links.loc[10, "GlobalStatsLink"] == "https://steamcommunity.com/stats/10/achievements/"
+    assert with_links.loc[20, "StatsLink"] == ""
+
+
+def test_streaming_raises_on_error():
+    error_xml = b"<response><error><![CDATA[The specified profile could not be found.]]></error></response>"
+    with pytest.raises(Exception, match = "Root not found"):
+        SteamXmlProcessor.from_stream(io.BytesIO(error_xml)).get_game_infos()
+
+
+def test_from_username_against_stub(tmp_path):
+    xml_file = tmp_path / "someone_steam_games.xml"
+    with SteamStubServer(libraries = {"someone": make_games_xml(50)}) as stub:
+        client = SimpleHttpClient(max_retries = 0)
+        processor = SteamXmlProcessor.from_username("someone", str(xml_file), client, streaming = True,
+                                                    community_url = stub.url)
+        assert len(processor.get_game_infos()) == 50
+
+        with pytest.raises(Exception, match = "Root not found"):
+            SteamXmlProcessor.from_username("nobody", http_client = client, community_url = stub.url).get_game_infos()
+
+
+def test_refresh_with_conditional_requests(tmp_path):
+    xml_file = tmp_path / "someone_steam_games.xml"
+    with SteamStubServer(libraries = {"someone": make_games_xml(50)}) as stub:
+        client = SimpleHttpClient(max_retries = 0)
+
+        def refresh(streaming = True):
+            return SteamXmlProcessor.from_username("someone", str(xml_file), client, streaming = streaming,
+                                                   community_url = stub.url).get_game_infos()
+
+        # The first download is gzipped and its validators are kept
+        assert len(refresh()) == 50
+        assert stub.gzipped_count == 1
+        assert stub.library_bytes_sent < len(make_games_xml(50)) / 4
+        assert xml_file.read_text(encoding = "utf-8") == make_games_xml(50)
+        assert os.path.exists(str(xml_file) + VALIDATORS_SUFFIX)
+
+        # Unchanged, the file is reused without a body being sent
+        modified = os.stat(xml_file).st_mtime_ns
+        bytes_sent = stub.library_bytes_sent
+        assert len(refresh()) == 50
+        assert len(refresh(streaming = False)) == 50
+        assert stub.not_modified_count == 2
+        assert stub.library_bytes_sent == bytes_sent
+        assert os.stat(xml_file).st_mtime_ns == modified
+
+        stub.set_library("someone", make_games_xml(60))
+        assert len(refresh()) == 60
+        assert stub.not_modified_count == 2
+        assert not os.path.exists(f"{xml_file}.part")
+
+        # Without the file, the validators alone don't make the request conditional
+        os.remove(xml_file)
+        assert len(refresh()) == 60
+        assert stub.not_modified_count == 2